@@ -1,56 +1,222 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for
-from datamanager.sqlite_data_manager import SQLiteDataManager
+from flask import (Blueprint, Flask, Response, abort, current_app, request, jsonify, make_response, render_template,
+                   redirect, send_file, url_for, stream_with_context)
+from datamanager.sqlite_data_manager import MOVIE_FIELDS, SQLiteDataManager, MovieNotFoundError, UserNotFoundError
+from datamanager.memory_data_manager import InMemoryDataManager
 from datamanager.models import db
+from datamanager.migrations import migrate, get_schema_version
+from datamanager.compaction import compact_movies
+from datamanager import versions
 from services.omdb_service import OMDBService
+from services.cache import LookupCache, SQLiteStore
+from services import encoding, movie_batch, movie_import
+from services.lazy import Lazy
+from services.poster_store import PosterStore, POSTER_SIZES, DEFAULT_ALLOWED_HOSTS
+from services.suggest import SuggestService
+from services.metrics import Metrics, SharedMetricsStore
+from services.enrichment import EnrichmentWorker
+from services.recommender import SimilarityRefresher
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from werkzeug.local import LocalProxy
 import os
+import threading
+import time
+import click
 from werkzeug.exceptions import HTTPException
 from sqlalchemy.exc import SQLAlchemyError
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Create Flask app
-app = Flask(__name__, instance_relative_config=True)
-
-# Ensure the instance folder exists
-try:
-    os.makedirs(app.instance_path)
-except OSError:
-    pass
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, "movieweb.db")}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize database and data manager
-db.init_app(app)
-data_manager = SQLiteDataManager()
-
-with app.app_context():
+# Routes, error handlers and CLI commands; create_app() registers them on each app
+bp = Blueprint('main', __name__, cli_group=None)
+
+def _service(name):
+    """The current app's instance of a service built by create_app()"""
+    return LocalProxy(lambda: current_app.extensions['movieweb'][name])
+
+data_manager = _service('data_manager')
+omdb_service = _service('omdb_service')
+metrics = _service('metrics')
+poster_store = _service('poster_store')
+page_cache = _service('page_cache')
+suggest_service = _service('suggest')
+enrichment_worker = _service('enrichment_worker')
+similarity_refresher = _service('similarity_refresher')
+
+def create_app(config=None):
+    """
+    Build the app. Settings are read from the environment (and .env), and any
+    keys in config override them. Nothing slow happens here, so a worker is ready
+    to serve as soon as its modules are imported: the schema is only created or
+    migrated when its version stamp is behind, the OMDB client is created on first
+    use, and background threads only start with the first request.
+    Run with `flask --app app run` or `gunicorn 'app:create_app()'`.
+    """
+    load_dotenv()
+    app = Flask(__name__, instance_relative_config=True)
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    app.config.from_mapping(
+        SQLALCHEMY_DATABASE_URI=os.getenv(
+            'DATABASE_URL', f'sqlite:///{os.path.join(app.instance_path, "movieweb.db")}'),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # SQLite connection profile (see datamanager/engine.py): "wal" for concurrent workers, "default" for stock settings
+        SQLITE_PROFILE=os.getenv('SQLITE_PROFILE', 'wal'),
+        # "memory" serves reads from an in-memory copy kept in sync with SQLite; writes always go to SQLite
+        DATA_BACKEND=os.getenv('DATA_BACKEND', 'sqlite'),
+        # Request, SQL and OMDB metrics, served at /metrics summed over all workers.
+        # Set SLOW_REQUEST_SECONDS to log slower requests together with their SQL.
+        METRICS_PATH=os.getenv('METRICS_PATH', os.path.join(app.instance_path, "metrics.db")),
+        SLOW_REQUEST_SECONDS=float(os.environ['SLOW_REQUEST_SECONDS']) if os.getenv('SLOW_REQUEST_SECONDS') else None,
+        POSTER_CACHE_PATH=os.getenv('POSTER_CACHE_PATH', os.path.join(app.instance_path, "posters")),
+        POSTER_ALLOWED_HOSTS=os.getenv('POSTER_ALLOWED_HOSTS', ','.join(DEFAULT_ALLOWED_HOSTS)).split(','),
+        # Background threads (enrichment worker, similarity refresher, suggest index build) start with
+        # a worker's first request, so CLI commands and apps that never serve start none.
+        # Set BACKGROUND_THREADS=0 to never start them; the suggest index is then built on first use.
+        BACKGROUND_THREADS=os.getenv('BACKGROUND_THREADS', '1') == '1',
+        # Set ENRICHMENT_WORKER=0 to run it as a separate process with `flask enrich` instead
+        ENRICHMENT_WORKER=os.getenv('ENRICHMENT_WORKER', '1') == '1',
+        ENRICHMENT_THREADS=int(os.getenv('ENRICHMENT_THREADS', 1)),
+        RATING_REFRESH_DAYS=float(os.getenv('RATING_REFRESH_DAYS', 7)),
+        # Set SIMILARITY_REFRESH_SECONDS=0 to only rebuild with `flask rebuild-similar`
+        SIMILARITY_REFRESH_SECONDS=float(os.getenv('SIMILARITY_REFRESH_SECONDS', 3600)),
+        SIMILARITY_TOP_K=int(os.getenv('SIMILARITY_TOP_K', 20)),
+        # Set PAGE_CACHE_PATH to share the page cache between workers through a SQLite file
+        PAGE_CACHE_TTL=float(os.getenv('PAGE_CACHE_TTL', 3600)),
+        PAGE_CACHE_SIZE=int(os.getenv('PAGE_CACHE_SIZE', 512)),
+        PAGE_CACHE_MAX_BYTES=int(os.getenv('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+        PAGE_CACHE_PATH=os.getenv('PAGE_CACHE_PATH'),
+        SUGGEST_RECHECK_SECONDS=float(os.getenv('SUGGEST_RECHECK_SECONDS', 30)),
+    )
+    app.config.from_mapping(config or {})
+
+    app_metrics = Metrics(
+        shared_store=SharedMetricsStore(app.config['METRICS_PATH']),
+        slow_request_seconds=app.config['SLOW_REQUEST_SECONDS']
+    )
+
+    # Initialize database and data manager (creates or migrates the schema if its version stamp is behind)
+    db.init_app(app)
+    with app.app_context():
+        app_metrics.instrument_app(app, db.engine)
+    app_data_manager = InMemoryDataManager() if app.config['DATA_BACKEND'] == 'memory' else SQLiteDataManager()
     try:
-        db.create_all()
-        data_manager.init_app(app)
+        app_data_manager.init_app(app)
         print("Database initialized successfully!")
     except Exception as e:
         print(f"Error initializing database: {str(e)}")
 
-# Initialize OMDB service
-try:
-    omdb_service = OMDBService.create_from_env()
-    print("OMDB service initialized successfully!")
-except Exception as e:
-    print(f"Error initializing OMDB service: {str(e)}")
+    def create_omdb_service():
+        service = OMDBService.create_from_env(cache_path=os.path.join(app.instance_path, "omdb_cache.db"))
+        service.metrics = app_metrics
+        app_metrics.watch_cache('omdb', service.cache)
+        app.logger.info("OMDB service initialized")
+        return service
+
+    # Rendered HTML of the user pages, keyed by data version so writes invalidate it precisely
+    app_page_cache = LookupCache(
+        ttl=app.config['PAGE_CACHE_TTL'],
+        max_entries=app.config['PAGE_CACHE_SIZE'],
+        max_bytes=app.config['PAGE_CACHE_MAX_BYTES'],
+        shared_store=SQLiteStore(app.config['PAGE_CACHE_PATH']) if app.config['PAGE_CACHE_PATH'] else None
+    )
+    app_metrics.watch_cache('pages', app_page_cache)
+
+    app_omdb_service = Lazy(create_omdb_service)
+    services = app.extensions['movieweb'] = {
+        'data_manager': app_data_manager,
+        'omdb_service': app_omdb_service,
+        'metrics': app_metrics,
+        # Local poster cache (downloads each OMDB poster once and serves resized copies)
+        'poster_store': PosterStore(app.config['POSTER_CACHE_PATH'],
+                                    allowed_hosts=app.config['POSTER_ALLOWED_HOSTS']),
+        'page_cache': app_page_cache,
+        # Typeahead index over titles and directors
+        'suggest': SuggestService(app, app_data_manager, versions.CATALOG,
+                                  recheck_seconds=app.config['SUGGEST_RECHECK_SECONDS']),
+        # Background completion of movie details from OMDB (see services/enrichment.py)
+        'enrichment_worker': EnrichmentWorker(
+            app, app_data_manager, app_omdb_service,
+            threads=app.config['ENRICHMENT_THREADS'],
+            refresh_max_age=app.config['RATING_REFRESH_DAYS'] * 24 * 3600
+        ),
+        # Similar movies and per-user recommendations, rebuilt in the background when lists changed
+        'similarity_refresher': SimilarityRefresher(
+            app, app_data_manager,
+            interval=app.config['SIMILARITY_REFRESH_SECONDS'],
+            top_k=app.config['SIMILARITY_TOP_K']
+        ),
+    }
+    app.register_blueprint(bp)
+    return app
+
+_background_lock = threading.Lock()
+
+def start_background(app):
+    """Start the app's background threads, once; runs on its first request unless BACKGROUND_THREADS is off"""
+    services = app.extensions['movieweb']
+    with _background_lock:
+        if services.get('background_started'):
+            return
+        services['background_started'] = True
+    services['suggest'].start()
+    if app.config['ENRICHMENT_WORKER'] and os.getenv('OMDB_API_KEY'):
+        services['enrichment_worker'].start()
+    if services['similarity_refresher'].interval > 0:
+        services['similarity_refresher'].start()
+
+@bp.before_app_request
+def start_background_on_first_request():
+    if current_app.config['BACKGROUND_THREADS'] and not current_app.extensions['movieweb'].get('background_started'):
+        start_background(current_app._get_current_object())
+
+def shutdown(app):
+    """Stop the app's background threads and detach its data manager, e.g. at the end of a test"""
+    services = app.extensions['movieweb']
+    services['enrichment_worker'].stop()
+    services['similarity_refresher'].stop()
+    services['data_manager'].close()
+
+POSTER_MAX_AGE = 365 * 24 * 3600  # poster URLs are immutable, so clients may cache for a year
+
+@bp.app_template_global()
+def poster_url(url, size='thumb'):
+    """URL of the locally cached poster, or the placeholder image if there is none"""
+    if url and url != 'N/A':
+        return url_for('main.poster', size=size, url=url)
+    return url_for('static', filename='images/no-poster.jpg')
+
+def version_tag(scope):
+    """
+    (tag, updated_at) of the current version of a data scope, for ETags and cache keys.
+    The timestamp guards against a recreated or restored database reusing old version numbers.
+    """
+    version, updated_at = data_manager.get_data_version(scope)
+    return f"{scope}-{version}.{int(updated_at or 0)}", updated_at
+
+def render_cached(page, scope, render):
+    """
+    Return the cached HTML of a page for the current version of its data scope,
+    or render and cache it. render() may return None for pages that must not be cached.
+    """
+    tag, _ = version_tag(scope)
+    key = f"{page}:{tag}"
+    found, html = page_cache.get(key)
+    if found:
+        return html
+    html = render()
+    if html is not None:
+        page_cache.set(key, html)
+    return html
 
 # Error Handler
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('error.html',
                          code=404,
                          message="Page Not Found",
                          description="The requested page could not be found."), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()  # Rollback on database errors
     return render_template('error.html',
@@ -58,54 +224,60 @@ def internal_error(error):
                          message="Internal Server Error",
                          description="An unexpected error has occurred."), 500
 
-@app.errorhandler(HTTPException)
+@bp.app_errorhandler(HTTPException)
 def handle_http_error(error):
     return render_template('error.html',
                          code=error.code,
                          message=error.name,
                          description=error.description), error.code
 
-@app.errorhandler(SQLAlchemyError)
+@bp.app_errorhandler(SQLAlchemyError)
 def handle_db_error(error):
     db.session.rollback()  # Rollback on database errors
-    app.logger.error(f"Database error: {str(error)}")
+    current_app.logger.error(f"Database error: {str(error)}")
     return render_template('error.html',
                          code=500,
                          message="Database Error",
                          description="An error occurred during the database operation."), 500
 
-@app.route('/')
+@bp.route('/')
 def home():
     """Homepage/Dashboard with overview of app features"""
     return render_template('index.html')
 
-@app.route('/users')
+@bp.route('/users')
 def users_list():
     """Display list of all users"""
-    users = data_manager.get_all_users()
-    return render_template('users_list.html', users=users)
+    return render_cached('users_list', versions.USERS, lambda: render_template(
+        'users_list.html', users=data_manager.get_all_users()))
 
-@app.route('/users/<int:user_id>')
+@bp.route('/users/<int:user_id>')
 def user_movies(user_id):
     """Display a specific user's movie list"""
-    user = data_manager.get_user(user_id)
-    if not user:
+    def render():
+        result = data_manager.get_user_with_movies(user_id)
+        if not result:
+            return None
+        user, movies = result
+        return render_template('user_movies.html', user=user, movies=movies)
+
+    html = render_cached('user_movies', versions.user_scope(user_id), render)
+    if html is None:
         return render_template('error.html', message="User not found"), 404
-    movies = data_manager.get_user_movies(user_id)
-    return render_template('user_movies.html', user=user, movies=movies)
+    return html
 
-@app.route('/add_user', methods=['GET', 'POST'])
+@bp.route('/add_user', methods=['GET', 'POST'])
 def add_user():
     """Add a new user"""
     if request.method == 'POST':
         name = request.form.get('name')
         if name:
             user_id = data_manager.add_user(name)
-            return redirect(url_for('users_list'))
+            return redirect(url_for('main.users_list'))
         return render_template('add_user.html', error="Username is required")
     return render_template('add_user.html')
 
-@app.route('/api/search_movie')
+@bp.route('/api/search_movie')
 def search_movie():
     """Search for a movie using OMDB API"""
     try:
@@ -118,10 +290,10 @@ def search_movie():
             return jsonify(movie_data)
         return jsonify({"error": "Movie not found"}), 404
     except Exception as e:
-        app.logger.error(f"OMDB API error: {str(e)}")
+        current_app.logger.error(f"OMDB API error: {str(e)}")
         return jsonify({"error": "An error occurred while searching for the movie"}), 500
 
-@app.route('/users/<int:user_id>/add_movie', methods=['GET', 'POST'])
+@bp.route('/users/<int:user_id>/add_movie', methods=['GET', 'POST'])
 def add_user_movie(user_id):
     """Add a movie to user's list"""
     try:
@@ -134,22 +306,27 @@ def add_user_movie(user_id):
 
         if request.method == 'POST':
             try:
-                # Create the movie first
-                movie_id = data_manager.add_movie(
-                    name=request.form['name'],
-                    director=request.form['director'],
-                    year=int(request.form['year']),
-                    rating=float(request.form['rating']),
-                    poster=request.form.get('poster', '')  # Save the poster URL
-                )
-
-                # Add the movie to user's list
-                if data_manager.add_user_movie(user_id, movie_id):
-                    return redirect(url_for('user_movies', user_id=user_id))
-
-                # If adding fails, delete the movie
-                data_manager.delete_movie(movie_id)
-                raise ValueError("Could not add movie to user's list")
+                # Only the title is required; missing details are filled in by the enrichment worker
+                name = request.form['name'].strip()
+                if not name:
+                    raise ValueError("Title is required")
+                # Create the movie and link it in one transaction;
+                # if linking fails the movie is rolled back as well
+                with data_manager.group_commit():
+                    movie_id = data_manager.add_movie(
+                        name=name,
+                        director=request.form.get('director', '').strip() or 'Unknown',
+                        year=int(request.form.get('year') or 0),
+                        rating=float(request.form.get('rating') or 0),
+                        poster=request.form.get('poster', ''),  # Save the poster URL
+                        imdb_id=request.form.get('imdb_id') or None  # Links to the canonical record if known
+                    )
+
+                    # Add the movie to user's list
+                    if not data_manager.add_user_movie(user_id, movie_id):
+                        raise ValueError("Could not add movie to user's list")
+
+                return redirect(url_for('main.user_movies', user_id=user_id))
 
             except (KeyError, ValueError) as e:
                 return render_template('add_movie.html',
@@ -158,24 +335,25 @@ def add_user_movie(user_id):
 
         return render_template('add_movie.html', user=user)
     except Exception as e:
-        app.logger.error(f"Error adding movie: {str(e)}")
+        current_app.logger.error(f"Error adding movie: {str(e)}")
         return render_template('error.html',
                             code=500,
                             message="Error Adding Movie",
                             description="The movie could not be added."), 500
 
-@app.route('/users/<int:user_id>/update_movie/<int:movie_id>', methods=['GET', 'POST'])
+@bp.route('/users/<int:user_id>/update_movie/<int:movie_id>', methods=['GET', 'POST'])
 def update_user_movie(user_id, movie_id):
     """Update a movie in user's list"""
-    user = data_manager.get_user(user_id)
-    movie = data_manager.get_movie(movie_id)
+    user, movie = data_manager.get_user_and_movie(user_id, movie_id)
 
     if not user or not movie:
         return render_template('error.html', message="User or movie not found"), 404
 
     if request.method == 'POST':
         try:
-            success = data_manager.update_movie(
+            # Edits apply to this user's list only; a movie others have too is copied first
+            data_manager.update_user_movie(
+                user_id=user_id,
                 movie_id=movie_id,
                 name=request.form['name'],
                 director=request.form['director'],
@@ -183,37 +361,52 @@ def update_user_movie(user_id, movie_id):
                 rating=float(request.form['rating']),
                 poster=request.form.get('poster', movie.get('poster', ''))  # Keep existing poster if not updated
             )
-            if success:
-                return redirect(url_for('user_movies', user_id=user_id))
-            return render_template('error.html', message="Update failed"), 400
+            return redirect(url_for('main.user_movies', user_id=user_id))
+        except (UserNotFoundError, MovieNotFoundError):
+            return render_template('error.html', message="User or movie not found"), 404
         except (KeyError, ValueError):
             return render_template('update_movie.html', user=user, movie=movie,
                                 error="All fields must be filled correctly")
 
     return render_template('update_movie.html', user=user, movie=movie)
 
-@app.route('/users/<int:user_id>/delete_movie/<int:movie_id>')
+@bp.route('/users/<int:user_id>/delete_movie/<int:movie_id>')
 def delete_user_movie(user_id, movie_id):
     """Remove a movie from user's list"""
     if data_manager.remove_user_movie(user_id, movie_id):
-        return redirect(url_for('user_movies', user_id=user_id))
+        return redirect(url_for('main.user_movies', user_id=user_id))
     return render_template('error.html', message="Could not remove movie"), 400
 
-@app.route('/movie_collections')
+def page_window(page, total_pages, around=2):
+    """Page numbers to link: the first, the last and `around` on each side of the current page;
+    None marks a gap"""
+    pages = sorted({1, total_pages} | set(range(max(page - around, 1), min(page + around, total_pages) + 1)))
+    links = []
+    for number in pages:
+        if links and number > links[-1] + 1:
+            links.append(None)
+        links.append(number)
+    return links
+
+@bp.route('/movie_collections')
 def movie_collections():
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10  # Number of movies per page
     search_query = request.args.get('search', '')
+    # Optional keyset cursors for deep pages: the ID of the last movie on the previous
+    # page (Next) or of the first movie on the following page (Previous)
+    after_id = request.args.get('after', type=int)
+    before_id = request.args.get('before', type=int)
 
     try:
         if search_query:
             # Search with pagination
-            movies = data_manager.search_movies(search_query)
+            result = data_manager.search_movies_page(search_query, page, per_page, after_id, before_id)
         else:
             # All movies with pagination
-            movies = data_manager.get_all_movies()
+            result = data_manager.get_movies_page(page, per_page, after_id, before_id)
 
-        if not movies and search_query:
+        if not result['total'] and search_query:
             return render_template('movie_collections.html',
                                 movies=[],
                                 page=1,
@@ -221,21 +414,21 @@ def movie_collections():
                                 search_query=search_query,
                                 error=f'No movies found for "{search_query}"')
 
-        # Pagination of results
-        total = len(movies)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        movies_page = movies[start_idx:end_idx]
-        total_pages = (total + per_page - 1) // per_page
+        total_pages = (result['total'] + per_page - 1) // per_page
+        if before_id is not None and result['prev_before_id'] is None:
+            page = 1  # Previous reached the start (page numbers drift when movies are added or deleted)
 
         return render_template('movie_collections.html',
-                             movies=movies_page,
+                             movies=result['movies'],
                              page=page,
                              total_pages=total_pages,
+                             page_links=page_window(page, total_pages),
+                             prev_before_id=result['prev_before_id'],
+                             next_after_id=result['next_after_id'],
                              search_query=search_query)
 
     except Exception as e:
-        app.logger.error(f"Error during movie search: {str(e)}")
+        current_app.logger.error(f"Error during movie search: {str(e)}")
         return render_template('movie_collections.html',
                              movies=[],
                              page=1,
@@ -243,16 +436,388 @@ def movie_collections():
                              search_query=search_query,
                              error="An error occurred during the search. Please try again later.")
 
+@bp.route('/posters/<size>')
+def poster(size):
+    """Serve a poster from the local cache, downloading and resizing it on first request"""
+    if size != 'full' and size not in POSTER_SIZES:
+        abort(404)
+    result = poster_store.get(request.args.get('url', ''), size)
+    if result is None:
+        return redirect(url_for('static', filename='images/no-poster.jpg'))
+
+    path, etag = result
+    response = send_file(path, mimetype='image/jpeg', etag=etag, max_age=POSTER_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # API routes for JSON responses
-@app.route('/api/movies', methods=['GET'])
+STREAM_CHUNK_ROWS = 500  # rows per chunk written to the response
+
+def wants_stream():
+    """Streaming is selected with Accept: application/x-ndjson or ?stream=1"""
+    return wants_ndjson() or request.args.get('stream') == '1'
+
+def wants_ndjson():
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def stream_json_response(rows):
+    """
+    Stream rows as NDJSON (one object per line) or as a chunked JSON array,
+    flushing every STREAM_CHUNK_ROWS rows so memory stays constant.
+    """
+    ndjson = wants_ndjson()
+
+    def generate():
+        chunk = []
+        first = True
+        if not ndjson:
+            yield b'['
+        for row in rows:
+            line = encoding.dumps_json(row)
+            if ndjson:
+                chunk.append(line + b'\n')
+            else:
+                chunk.append(line if first else b',' + line)
+                first = False
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield b''.join(chunk)
+                chunk.clear()
+        yield b''.join(chunk)
+        if not ndjson:
+            yield b']'
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def encoded_response(data):
+    """JSON (via orjson when installed) or MessagePack, whichever the Accept header prefers"""
+    mimetype = encoding.negotiate(request.accept_mimetypes)
+    return Response(encoding.ENCODERS[mimetype](data), mimetype=mimetype)
+
+def versioned_response(scope, build_response, fields=None):
+    """
+    Conditional GET for data covered by a version counter.
+    The ETag and Last-Modified come from the scope's version alone, so a client
+    that is up to date gets a 304 without the data being queried at all.
+    """
+    tag, updated_at = version_tag(scope)
+    if wants_ndjson():
+        variant = 'ndjson'
+    elif wants_stream():
+        variant = 'stream'
+    else:
+        variant = 'msgpack' if encoding.negotiate(request.accept_mimetypes) != encoding.JSON else 'json'
+    if fields:
+        variant += '-' + '.'.join(fields)
+    etag = f"{tag}-{variant}"
+    last_modified = datetime.fromtimestamp(int(updated_at), timezone.utc) if updated_at else None
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since)
+
+    response = Response(status=304) if not_modified else build_response()
+    if response.status_code not in (200, 304):
+        return response  # errors are not tied to the version
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients and CDNs may store the response but must revalidate it on every use
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept')
+    return response
+
+@bp.route('/api/movies', methods=['GET'])
 def api_get_movies():
-    movies = data_manager.get_all_movies()
-    return jsonify(movies)
-
-@app.route('/api/users/<int:user_id>/movies', methods=['GET'])
+    """All movies as JSON, NDJSON or MessagePack; ?fields=id,name returns only those fields"""
+    try:
+        fields = encoding.parse_fields(request.args.get('fields'), MOVIE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def build_response():
+        if wants_stream():
+            return stream_json_response(data_manager.iter_all_movies(fields=fields))
+        return encoded_response(data_manager.get_all_movies(fields))
+    return versioned_response(versions.CATALOG, build_response, fields)
+
+@bp.route('/api/movies/search', methods=['GET'])
+def api_search_movies():
+    """Ranked movie search (name and director) with pagination"""
+    search_query = request.args.get('q', '').strip()
+    if not search_query:
+        return jsonify({"error": "Search query is required"}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    result = data_manager.search_movies_page(search_query, page, per_page)
+    return jsonify({
+        "movies": result['movies'],
+        "total": result['total'],
+        "page": page,
+        "per_page": per_page
+    })
+
+@bp.route('/api/users/<int:user_id>/movies', methods=['GET'])
 def api_get_user_movies(user_id):
-    movies = data_manager.get_user_movies(user_id)
+    """A user's movies, with the same formats and ?fields= projection as /api/movies"""
+    try:
+        fields = encoding.parse_fields(request.args.get('fields'), MOVIE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Before the conditional check: a user that doesn't exist is a 404, never a 304
+    try:
+        data_manager.get_user(user_id)
+    except UserNotFoundError:
+        return jsonify({"error": "User not found"}), 404
+
+    def build_response():
+        try:
+            if wants_stream():
+                # iter_user_movies checks the user before the stream starts
+                return stream_json_response(data_manager.iter_user_movies(user_id, fields=fields))
+            return encoded_response(data_manager.get_user_movies(user_id, fields))
+        except UserNotFoundError:
+            return make_response(jsonify({"error": "User not found"}), 404)
+    return versioned_response(versions.user_scope(user_id), build_response, fields)
+
+@bp.route('/api/users/<int:user_id>/movies/batch', methods=['POST'])
+def api_batch_user_movies(user_id):
+    """
+    Add, update and remove many movies of a user's list in one transaction.
+    Body: {"add": [{"movie_id": 7} or movie details], "update": [{"movie_id": 7, "rating": 8.1}],
+    "remove": [7, ...]}. With ?atomic=1 nothing is applied unless every item succeeds.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not all(isinstance(payload.get(op) or [], list)
+                                                for op in movie_batch.OPERATIONS):
+        return jsonify({"error": "expected a JSON object with add, update and/or remove lists"}), 400
+    if sum(len(payload.get(op) or []) for op in movie_batch.OPERATIONS) > movie_batch.MAX_ITEMS:
+        return jsonify({"error": f"at most {movie_batch.MAX_ITEMS} items per batch"}), 413
+
+    try:
+        report = movie_batch.apply_batch(data_manager, user_id, payload,
+                                         atomic=request.args.get('atomic') == '1')
+    except movie_batch.BatchRejected as e:
+        return jsonify(e.report), 409
+    except UserNotFoundError:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(report)
+
+@bp.route('/api/suggest', methods=['GET'])
+def api_suggest():
+    """Typeahead suggestions (titles and directors) for the prefix in ?q="""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    response = jsonify(suggest_service.suggest(request.args.get('q', ''), limit))
+    response.headers['Cache-Control'] = 'public, max-age=30'
+    return response
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """Hit/miss counters of this worker's caches, coalesced OMDB lookups and the OMDB quota"""
+    # The OMDB client is created on first use (and not at all without OMDB_API_KEY); until then it has no stats
+    omdb = omdb_service.get() if omdb_service.created else None
+    return jsonify({
+        "pages": page_cache.stats(),
+        "omdb": omdb.cache.stats() if omdb and omdb.cache else None,
+        "omdb_coalesced": omdb.in_flight.shared if omdb else 0,
+        "omdb_quota": omdb.scheduler.stats() if omdb and omdb.scheduler else None
+    })
+
+@bp.route('/api/stats', methods=['GET'])
+def api_catalog_stats():
+    """Movie count and average rating overall, per decade and for the top ?directors=10 (at most 100)"""
+    top_directors = min(max(request.args.get('directors', 10, type=int), 0), 100)
+    return versioned_response(versions.CATALOG,
+                              lambda: jsonify(data_manager.get_catalog_stats(top_directors)))
+
+@bp.route('/api/stats/users', methods=['GET'])
+def api_users_stats():
+    """Movie count and average rating of every user's list"""
+    return versioned_response(versions.ALL, lambda: jsonify(data_manager.get_users_stats()))
+
+@bp.route('/api/users/<int:user_id>/stats', methods=['GET'])
+def api_user_stats(user_id):
+    # Before the conditional check: a user that doesn't exist is a 404, never a 304
+    try:
+        data_manager.get_user(user_id)
+    except UserNotFoundError:
+        return jsonify({"error": "User not found"}), 404
+
+    def build_response():
+        try:
+            return jsonify(data_manager.get_user_stats(user_id))
+        except UserNotFoundError:
+            return make_response(jsonify({"error": "User not found"}), 404)
+    return versioned_response(versions.user_scope(user_id), build_response)
+
+@bp.route('/api/movies/<int:movie_id>/similar', methods=['GET'])
+def api_similar_movies(movie_id):
+    """Movies most often saved together with this one (?limit=10)"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), similarity_refresher.top_k)
+    try:
+        movies = data_manager.get_similar_movies(movie_id, limit)
+    except MovieNotFoundError:
+        return jsonify({"error": "Movie not found"}), 404
+    response = jsonify(movies)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@bp.route('/api/users/<int:user_id>/recommendations', methods=['GET'])
+def api_user_recommendations(user_id):
+    """Movies similar to the ones in the user's list (?limit=10)"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), similarity_refresher.per_user)
+    try:
+        movies = data_manager.get_user_recommendations(user_id, limit)
+    except UserNotFoundError:
+        return jsonify({"error": "User not found"}), 404
     return jsonify(movies)
 
+@bp.route('/api/recommendations/stats', methods=['GET'])
+def api_recommendation_stats():
+    """Last similarity build and the background refresh"""
+    return jsonify(similarity_refresher.stats())
+
+@bp.route('/api/enrichment/stats', methods=['GET'])
+def api_enrichment_stats():
+    """Background enrichment progress and queue size"""
+    return jsonify(enrichment_worker.stats())
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics of all workers"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/import', methods=['POST'])
+def api_import_movies():
+    """
+    Bulk import movies from an uploaded CSV or JSONL file (form field "file") or the raw request body.
+    Query parameters: format=csv|jsonl, batch_size, enrich=1 to fill missing fields from OMDB.
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream = movie_import.open_text(upload.stream)
+        fmt = request.args.get('format') or movie_import.detect_format(upload.filename or '')
+    else:
+        stream = movie_import.open_text(request.stream)
+        fmt = request.args.get('format') or ('jsonl' if 'json' in (request.mimetype or '') else 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+
+    report = movie_import.import_movies(
+        data_manager, stream, fmt,
+        batch_size=min(max(request.args.get('batch_size', 5000, type=int), 1), 50000),
+        omdb_service=omdb_service if request.args.get('enrich') == '1' else None)
+    return jsonify(report)
+
+@bp.cli.command('import-movies')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per transaction')
+@click.option('--enrich', is_flag=True, help='Fill missing director/year/rating/poster from OMDB')
+def import_movies_command(path, fmt, batch_size, enrich):
+    """Bulk import movies for one or more users from a CSV or JSONL file"""
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = movie_import.import_movies(
+            data_manager, stream, fmt or movie_import.detect_format(path),
+            batch_size=batch_size, omdb_service=omdb_service if enrich else None)
+    for error in report['errors']:
+        click.echo(f"warning: {error}", err=True)
+    click.echo(f"Imported {report['imported']} of {report['read']} rows "
+               f"({report['skipped']} skipped) in {report['seconds']}s, {report['rows_per_sec']} rows/sec")
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations to the database"""
+    with db.engine.begin() as connection:
+        applied = migrate(connection)
+        for version, description in applied:
+            click.echo(f"Applied migration {version}: {description}")
+        click.echo(f"Schema version: {get_schema_version(connection)}")
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the statistics summary tables from the movie and user_movies tables"""
+    start = time.perf_counter()
+    data_manager.rebuild_stats()
+    click.echo(f"Rebuilt statistics in {time.perf_counter() - start:.2f}s")
+
+@bp.cli.command('rebuild-similar')
+@click.option('--top-k', type=int, help='Similar movies kept per movie (default: SIMILARITY_TOP_K)')
+@click.option('--min-common', default=1, show_default=True, help='Users two movies must share')
+def rebuild_similar_command(top_k, min_common):
+    """Recompute similar movies and per-user recommendations from the users' lists"""
+    refresher = SimilarityRefresher(current_app, data_manager, top_k=top_k or similarity_refresher.top_k,
+                                    min_common=min_common)
+    report = refresher.run_once(force=True)
+    click.echo(f"Stored {report['pairs']} similar pairs for {report['movies']} movies and "
+               f"{report['recommendations']} recommendations for {report['users']} users "
+               f"in {report['seconds']}s ({report['engine']})")
+
+@bp.cli.command('compact-movies')
+@click.option('--lookup', is_flag=True, help='Resolve missing imdb_ids via OMDB (title and year must match)')
+@click.option('--batch-size', default=500, show_default=True, help='Titles per OMDB batch lookup')
+def compact_movies_command(lookup, batch_size):
+    """Merge duplicate movie rows into one canonical record per film"""
+    resolved = {}
+    if lookup:
+        missing = db.session.execute(db.text("SELECT id, name, year FROM movie WHERE imdb_id IS NULL")).all()
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            results = omdb_service.search_movies_batch([name for _, name, _ in chunk])
+            for (movie_id, _, year), movie_data in zip(chunk, results):
+                if movie_data and movie_data.get('imdb_id') and str(movie_data['year'])[:4] == str(year):
+                    resolved[movie_id] = movie_data['imdb_id']
+        click.echo(f"Resolved {len(resolved)} of {len(missing)} missing imdb_ids via OMDB")
+
+    with db.engine.begin() as connection:
+        report = compact_movies(connection, resolved)
+    click.echo(f"Merged {report['merged']} duplicate movies, moved {report['links_moved']} user links, "
+               f"set {report['imdb_ids_set']} imdb_ids")
+
+@bp.cli.command('fetch-posters')
+@click.option('--workers', default=8, show_default=True, help='Concurrent downloads')
+def fetch_posters_command(workers):
+    """Download all movie posters into the local cache and generate thumbnails"""
+    urls = db.session.execute(db.text(
+        "SELECT DISTINCT poster FROM movie WHERE poster IS NOT NULL AND poster NOT IN ('', 'N/A')"
+    )).scalars().all()
+
+    def fetch(url):
+        return all(poster_store.get(url, size) for size in POSTER_SIZES)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        stored = sum(executor.map(fetch, urls))
+    click.echo(f"Cached {stored} of {len(urls)} posters")
+
+@bp.cli.command('enrich')
+@click.option('--once', is_flag=True, help='Process the jobs that are due now and exit')
+@click.option('--refresh', is_flag=True, help='Queue stale ratings for refresh first')
+def enrich_command(once, refresh):
+    """Run the background enrichment worker in the foreground"""
+    if refresh:
+        click.echo(f"Queued {enrichment_worker.queue_refresh_if_due(force=True)} stale ratings for refresh")
+    if once:
+        total = 0
+        while True:
+            claimed = enrichment_worker.run_once()
+            total += claimed
+            if claimed < enrichment_worker.batch_size:
+                break
+        click.echo(f"Processed {total} jobs ({enrichment_worker.failed} lookups failed and will be retried)")
+        return
+    enrichment_worker.start()
+    click.echo("Enrichment worker running, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        enrichment_worker.stop()
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    create_app().run(debug=True, port=5001)
@@ -0,0 +1,154 @@
+"""
+Check that the in-memory backend answers exactly like the SQLite backend, and time both.
+
+Seeds a fresh database, then runs the same reads through SQLiteDataManager and
+InMemoryDataManager after each kind of write: writes through the in-memory
+manager itself (applied from its own write events), and writes by "another
+worker" straight through a separate connection (which must trigger a reload).
+Any difference is an assertion error. Finally both backends serve the same
+random reads and their per-call latency is compared.
+
+Usage: python -m benchmarks.backend_parity [--users 100] [--movies 5000] [--links 30] [--reads 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.datagen import seed
+
+
+def read_calls(counts, rng, samples=20):
+    """(description, call) pairs covering every read the in-memory backend serves"""
+    users = list(range(counts["first_user_id"], counts["first_user_id"] + counts["users"])) + [10 ** 9]
+    movies = list(range(counts["first_movie_id"], counts["first_movie_id"] + counts["movies"])) + [10 ** 9]
+    calls = [("get_all_users", lambda dm: dm.get_all_users()),
+             ("get_all_movies", lambda dm: dm.get_all_movies()),
+             ("iter_all_movies", lambda dm: list(dm.iter_all_movies(batch_size=100))),
+             ("get_all_movies(fields)", lambda dm: dm.get_all_movies(["id", "name"]))]
+    for _ in range(samples):
+        user_id, movie_id = rng.choice(users), rng.choice(movies)
+        page, after_id = rng.randint(1, 60), rng.choice(movies)
+        calls += [
+            (f"get_user({user_id})", lambda dm, u=user_id: dm.get_user(u)),
+            (f"get_movie({movie_id})", lambda dm, m=movie_id: dm.get_movie(m)),
+            (f"get_user_with_movies({user_id})", lambda dm, u=user_id: dm.get_user_with_movies(u)),
+            (f"get_user_movies({user_id})", lambda dm, u=user_id: dm.get_user_movies(u)),
+            (f"iter_user_movies({user_id})", lambda dm, u=user_id: list(dm.iter_user_movies(u))),
+            (f"get_user_movies({user_id}, fields)", lambda dm, u=user_id: dm.get_user_movies(u, ["name", "year"])),
+            (f"get_user_and_movie({user_id}, {movie_id})",
+             lambda dm, u=user_id, m=movie_id: dm.get_user_and_movie(u, m)),
+            (f"get_movies_page({page})", lambda dm, p=page: dm.get_movies_page(p, 100)),
+            (f"get_movies_page(after_id={after_id})", lambda dm, a=after_id: dm.get_movies_page(1, 100, a)),
+            (f"get_movies_page(before_id={after_id})",
+             lambda dm, b=after_id: dm.get_movies_page(1, 100, before_id=b)),
+        ]
+    return calls
+
+
+def outcome(call, data_manager):
+    try:
+        return call(data_manager)
+    except Exception as e:
+        return type(e).__name__
+
+
+def check_parity(step, calls, reference, memory):
+    for description, call in calls:
+        expected, actual = outcome(call, reference), outcome(call, memory)
+        assert expected == actual, f"after {step}: {description} differs\n sqlite: {expected!r}\n memory: {actual!r}"
+    print(f"{step:40} {len(calls)} reads match")
+
+
+def time_reads(calls, data_manager, reads, rng):
+    latencies = []
+    for _ in range(reads):
+        _, call = rng.choice(calls)
+        start = time.perf_counter()
+        outcome(call, data_manager)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1e6, latencies[int(len(latencies) * 0.95)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--links", type=int, default=30, help="movies per user")
+    parser.add_argument("--reads", type=int, default=2000, help="timed reads per backend")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="movieweb-parity-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'movieweb.db')}",
+        "OMDB_API_KEY": "bench",
+        "OMDB_CACHE_PATH": os.path.join(workdir, "omdb_cache.db"),
+        "ENRICHMENT_WORKER": "0",
+        "SIMILARITY_REFRESH_SECONDS": "0",
+        "METRICS_PATH": os.path.join(workdir, "metrics.db"),
+        "DATA_BACKEND": "memory",
+    })
+    from app import create_app
+    from datamanager import versions
+    from datamanager.models import db
+    from datamanager.sqlite_data_manager import SQLiteDataManager
+    from services import movie_batch
+
+    app = create_app()
+    memory = app.extensions["movieweb"]["data_manager"]
+    reference = SQLiteDataManager()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            counts = seed(conn, args.users, args.movies, args.links, args.seed)
+        calls = read_calls(counts, rng)
+        user_id, movie_id = counts["first_user_id"], counts["first_movie_id"]
+        check_parity("seed (external write)", calls, reference, memory)
+
+        new_user = memory.add_user("Parity User")
+        new_movie = memory.add_movie("Parity Movie", "Someone", 1999, 7.5)
+        memory.add_user_movie(new_user, new_movie)
+        memory.add_user_movie(user_id, new_movie)
+        calls += [("new user", lambda dm: dm.get_user_with_movies(new_user)),
+                  ("new movie", lambda dm: dm.get_user_and_movie(user_id, new_movie))]
+        check_parity("add user, movie and links", calls, reference, memory)
+
+        memory.update_movie(movie_id, "Renamed", "Other", 2001, 3.0)
+        memory.remove_user_movie(user_id, new_movie)
+        memory.delete_movie(movie_id + 1)
+        check_parity("update, unlink, delete", calls, reference, memory)
+
+        movie_batch.apply_batch(memory, user_id, {
+            "add": [{"movie_id": movie_id + 2}, {"name": "Batch Movie"}],
+            "update": [{"movie_id": movie_id + 2, "rating": 9.0}],
+            "remove": [movie_id + 3]})
+        check_parity("batch", calls, reference, memory)
+
+        memory.import_movies([{"user_id": user_id, "name": f"Imported {i}", "director": "Someone",
+                               "year": 2000, "rating": 5.0, "poster": None, "imdb_id": None} for i in range(50)])
+        check_parity("import (full reload)", calls, reference, memory)
+
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE movie SET name = 'Changed elsewhere' WHERE id = :id"), {"id": movie_id + 4})
+            conn.execute(text("DELETE FROM user_movies WHERE movie_id = :id"), {"id": movie_id + 5})
+            versions.bump(conn, versions.CATALOG)
+        db.session.commit()  # end the session's read transaction, as the end of a request would
+        check_parity("write by another worker", calls, reference, memory)
+        print(f"reloads: {memory.reloads}")
+
+        timings = {name: time_reads(calls, dm, args.reads, random.Random(args.seed))
+                   for name, dm in (("sqlite", reference), ("memory", memory))}
+    print(f"\n{'backend':8} {'p50 us':>9} {'p95 us':>9}   ({args.reads} random reads, one version check each)")
+    for name, (p50, p95) in timings.items():
+        print(f"{name:8} {p50:9.1f} {p95:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
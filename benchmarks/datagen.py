@@ -0,0 +1,92 @@
+"""
+Synthetic data for benchmarks: users, movies and user/movie links.
+
+The output is deterministic for a given seed. Movie popularity is skewed
+(a few films are in many lists), titles share words so searches match
+realistic numbers of rows, and every movie has a poster URL on poster_base
+and an imdb_id.
+
+Usage: python -m benchmarks.datagen DATABASE_FILE [--users 200] [--movies 20000] [--links 50] [--seed 1]
+"""
+import argparse
+import random
+from typing import Dict
+
+from sqlalchemy import create_engine, text
+
+from datamanager import versions
+
+WORDS = ("night", "dark", "star", "love", "war", "city", "last", "blue", "king", "house", "river",
+         "ghost", "summer", "road", "secret", "empire", "island", "storm", "silent", "golden")
+FIRST_NAMES = ("Ana", "Ben", "Chloe", "David", "Emma", "Felix", "Greta", "Hugo", "Ines", "Jonas")
+LAST_NAMES = ("Nolan", "Varda", "Kurosawa", "Lee", "Bigelow", "Park", "Scott", "Tarr", "Weir", "Zhao")
+
+
+def seed(connection, users: int = 200, movies: int = 20_000, links_per_user: int = 50,
+         random_seed: int = 1, poster_base: str = "http://127.0.0.1/posters/") -> Dict[str, int]:
+    """
+    Insert synthetic rows through connection (tables must exist) and return the counts.
+    Ids start after the current maximum, so seeding an existing database adds to it.
+    All data versions are bumped, so a running app picks the rows up.
+    """
+    rng = random.Random(random_seed)
+    first_user = connection.execute(text('SELECT COALESCE(MAX(id), 0) FROM "user"')).scalar() + 1
+    first_movie = connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM movie")).scalar() + 1
+
+    connection.execute(text('INSERT INTO "user" (id, name) VALUES (:id, :name)'), [
+        {"id": first_user + i, "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"}
+        for i in range(users)
+    ])
+    movie_rows = []
+    for i in range(movies):
+        movie_id = first_movie + i
+        imdb_id = "tt%07d" % (9_000_000 + movie_id)
+        movie_rows.append({
+            "id": movie_id,
+            "name": " ".join(rng.sample(WORDS, rng.randint(1, 3))).title() + f" {i}",
+            "director": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "year": rng.randint(1950, 2024),
+            "rating": round(rng.uniform(1, 10), 1),
+            "poster": f"{poster_base}{imdb_id}.jpg",
+            "imdb_id": imdb_id,
+        })
+    connection.execute(text("""
+        INSERT INTO movie (id, name, director, year, rating, poster, imdb_id)
+        VALUES (:id, :name, :director, :year, :rating, :poster, :imdb_id)
+    """), movie_rows)
+
+    links = []
+    per_user = min(links_per_user, movies)
+    for user_id in range(first_user, first_user + users):
+        picked = set()
+        while len(picked) < per_user:
+            if rng.random() < 0.5:
+                # Pareto-distributed offset: the first movies are the popular ones
+                picked.add(min(int(rng.paretovariate(1.2)) - 1, movies - 1))
+            else:
+                picked.add(rng.randrange(movies))
+        links.extend({"user_id": user_id, "movie_id": first_movie + offset} for offset in picked)
+    connection.execute(text("INSERT INTO user_movies (user_id, movie_id) VALUES (:user_id, :movie_id)"), links)
+    # Like any bulk write, invalidate what running workers cached
+    versions.bump_all(connection)
+    return {"users": users, "movies": movies, "links": len(links),
+            "first_user_id": first_user, "first_movie_id": first_movie}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database", help="SQLite file created by the app (schema must exist)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--links", type=int, default=50, help="movies per user")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.database}")
+    with engine.begin() as conn:
+        counts = seed(conn, args.users, args.movies, args.links, args.seed)
+    print(counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the LIKE search path against the FTS5 index on a synthetic movie catalog.
+
+Usage: python -m benchmarks.fts_search [--rows 1000000] [--db /tmp/movieweb_bench.db]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from datamanager.fts import MOVIE_FTS_DDL, MOVIE_FTS_REBUILD, build_match_query
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "tor", "sil", "den", "bar", "ush", "el", "ion", "mar", "tu", "zo"]
+COMMON_WORDS = ["star", "night", "love", "dark", "return", "king", "lost", "city", "war", "blue",
+                "dream", "house", "river", "shadow", "storm", "ghost", "summer", "iron", "silent", "road"]
+# A realistic title vocabulary: a few common words plus a long tail of rarer ones
+WORDS = COMMON_WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+DIRECTORS = [f"{first} {last}" for first in ("Anna", "Ben", "Clara", "David", "Eva", "Frank")
+             for last in ("Miller", "Nolan", "Scott", "Lucas", "Varda", "Kurosawa")]
+QUERIES = ["star", "shadow king", "nol", "kalomi", "venbar", "zotu"]
+LIMIT = 10
+
+
+def seed(path: str, rows: int) -> sqlite3.Connection:
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE movie (
+        id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, director VARCHAR(100) NOT NULL,
+        year INTEGER NOT NULL, rating FLOAT NOT NULL, poster VARCHAR(500))""")
+    rng = random.Random(42)
+    batch = []
+    for i in range(rows):
+        name = " ".join(rng.choice(COMMON_WORDS) if rng.random() < 0.3 else rng.choice(WORDS)
+                        for _ in range(rng.randint(1, 4))).title()
+        batch.append((name, rng.choice(DIRECTORS), rng.randint(1920, 2024), round(rng.uniform(1, 10), 1)))
+        if len(batch) == 50_000:
+            conn.executemany("INSERT INTO movie (name, director, year, rating) VALUES (?, ?, ?, ?)", batch)
+            batch.clear()
+    conn.executemany("INSERT INTO movie (name, director, year, rating) VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+
+    start = time.perf_counter()
+    for statement in MOVIE_FTS_DDL:
+        conn.execute(statement)
+    conn.execute(MOVIE_FTS_REBUILD)
+    conn.commit()
+    print(f"seeded {rows:,} rows, FTS index built in {time.perf_counter() - start:.2f}s")
+    return conn
+
+
+def timed(conn, sql, params, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/movieweb_bench.db")
+    args = parser.parse_args()
+
+    conn = seed(args.db, args.rows)
+    like_sql = ("SELECT id, name, director, year, rating, poster FROM movie "
+                "WHERE lower(name) LIKE lower(?) ORDER BY id LIMIT ?")
+    like_count = "SELECT count(*) FROM movie WHERE lower(name) LIKE lower(?)"
+    fts_sql = ("SELECT movie.id, movie.name, movie.director, movie.year, movie.rating, movie.poster "
+               "FROM movie_fts JOIN movie ON movie.id = movie_fts.rowid "
+               "WHERE movie_fts MATCH ? ORDER BY movie_fts.rank, movie.id LIMIT ?")
+    fts_count = "SELECT count(*) FROM movie_fts WHERE movie_fts MATCH ?"
+
+    print(f"{'query':<14}{'LIKE page':>12}{'LIKE count':>12}{'FTS page':>12}{'FTS count':>12}  (ms, best of 5)")
+    for query in QUERIES:
+        pattern = f"%{query}%"
+        match = build_match_query(query)
+        print(f"{query:<14}"
+              f"{timed(conn, like_sql, (pattern, LIMIT)):>12.2f}"
+              f"{timed(conn, like_count, (pattern,)):>12.2f}"
+              f"{timed(conn, fts_sql, (match, LIMIT)):>12.2f}"
+              f"{timed(conn, fts_count, (match,)):>12.2f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
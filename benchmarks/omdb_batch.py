@@ -0,0 +1,45 @@
+"""
+Sequential OMDB lookups vs. OMDBService.search_movies_batch against the local stub.
+
+Usage: python -m benchmarks.omdb_batch [--titles 200] [--latency 0.05] [--workers 8]
+"""
+import argparse
+import time
+
+from benchmarks.omdb_stub import OMDBStubServer
+from services.omdb_service import OMDBService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--titles", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay in seconds")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = OMDBStubServer(latency=args.latency).start()
+    titles = [f"Movie {i}" if i % 10 else f"Missing {i}" for i in range(args.titles)]
+    try:
+        service = OMDBService("bench", base_url=server.url, max_workers=args.workers)
+        start = time.perf_counter()
+        sequential = [service.search_movie(title) for title in titles]
+        sequential_time = time.perf_counter() - start
+        sequential_connections = server.connection_count
+
+        service = OMDBService("bench", base_url=server.url, max_workers=args.workers)
+        start = time.perf_counter()
+        batch = service.search_movies_batch(titles)
+        batch_time = time.perf_counter() - start
+
+        assert batch == sequential, "batch results differ from sequential lookups"
+        print(f"{len(titles)} titles, {args.latency * 1000:.0f}ms stub latency")
+        print(f"sequential: {sequential_time:.2f}s ({len(titles) / sequential_time:.0f} lookups/s), "
+              f"{sequential_connections} connections")
+        print(f"batch x{args.workers}:   {batch_time:.2f}s ({len(titles) / batch_time:.0f} lookups/s), "
+              f"{server.connection_count - sequential_connections} connections")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
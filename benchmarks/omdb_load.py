@@ -0,0 +1,90 @@
+"""
+Concurrent load on OMDBService against the local stub: request coalescing and quota.
+
+Many threads look up a handful of "new release" titles at the same time. Without
+coalescing every lookup reaches the upstream; with it each title is fetched once.
+A second phase sends distinct titles through a QuotaScheduler and checks that the
+upstream rate and the daily budget are respected, with the excess shed.
+
+Usage: python -m benchmarks.omdb_load [--threads 64] [--titles 4] [--latency 0.2]
+                                      [--rate 20] [--budget 100] [--lookups 200] [--wait 5]
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.omdb_stub import OMDBStubServer
+from services.omdb_service import OMDBService
+from services.quota import QuotaScheduler
+
+
+class _NoCoalescing:
+    """Stand-in for SingleFlight that runs every call"""
+    shared = 0
+
+    def do(self, key, fn):
+        return fn()
+
+
+def hot_titles(server, threads, titles, coalesce):
+    service = OMDBService("bench", base_url=server.url, max_workers=threads)
+    if not coalesce:
+        service.in_flight = _NoCoalescing()
+    lookups = [f"New Release {i % titles}" for i in range(threads)]
+    before = server.request_count
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(service.search_movie, lookups))
+    elapsed = time.perf_counter() - start
+    assert all(results), "every lookup should find its movie"
+    return server.request_count - before, elapsed
+
+
+def quota_phase(server, lookups, rate, budget, threads, max_wait):
+    scheduler = QuotaScheduler(rate=rate, burst=max(1, int(rate)), daily_budget=budget,
+                               max_wait=max_wait, max_queue=threads)
+    service = OMDBService("bench", base_url=server.url, max_workers=threads, scheduler=scheduler)
+    before = server.request_count
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(service.search_movie, [f"Movie {i}" for i in range(lookups)]))
+    elapsed = time.perf_counter() - start
+    return server.request_count - before, sum(1 for r in results if r), elapsed, scheduler.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--titles", type=int, default=4, help="distinct hot titles")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub response delay in seconds")
+    parser.add_argument("--rate", type=float, default=20, help="scheduler calls per second")
+    parser.add_argument("--budget", type=int, default=100, help="scheduler daily budget")
+    parser.add_argument("--lookups", type=int, default=200, help="distinct lookups in the quota phase")
+    parser.add_argument("--wait", type=float, default=5, help="seconds a call may queue for its turn")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # shed lookups are logged as warnings
+
+    server = OMDBStubServer(latency=args.latency).start()
+    try:
+        plain_calls, plain_time = hot_titles(server, args.threads, args.titles, coalesce=False)
+        coalesced_calls, coalesced_time = hot_titles(server, args.threads, args.titles, coalesce=True)
+        print(f"{args.threads} concurrent lookups of {args.titles} titles, {args.latency * 1000:.0f}ms stub latency")
+        print(f"without coalescing: {plain_calls} upstream calls in {plain_time:.2f}s")
+        print(f"with coalescing:    {coalesced_calls} upstream calls in {coalesced_time:.2f}s")
+        assert coalesced_calls == args.titles, "each hot title should reach the upstream once"
+
+        calls, found, elapsed, stats = quota_phase(server, args.lookups, args.rate, args.budget, args.threads, args.wait)
+        print(f"\n{args.lookups} distinct lookups, rate {args.rate:g}/s, budget {args.budget}/day")
+        print(f"upstream calls: {calls} in {elapsed:.2f}s ({calls / elapsed:.1f}/s), answered: {found}")
+        print(f"shed by rate: {stats['shed_rate']}, by budget: {stats['shed_budget']}, "
+              f"remaining today: {stats['remaining_today']}")
+        assert calls <= args.budget, "daily budget exceeded"
+        # The bucket starts full, so allow one burst on top of the steady rate
+        assert calls <= args.rate * elapsed + args.rate + 1, "rate limit exceeded"
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Local stand-in for the OMDB API, used by the benchmarks.
+
+Answers ?t=<title> or ?i=<imdb id> with a movie document after an injected
+delay. Titles starting with "missing" get OMDB's "Movie not found" response. Poster URLs
+point back at the stub, which serves a small JPEG for /posters/<id>.jpg.
+"""
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+POSTER_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAA0JCgsKCA0LCgsODg0PEyAVExISEyccHhcgLikxMC4pLSwzOko+MzZGNywtQFdBRkxO"
+    "UlNSMj5aYVpQYEpRUk//2wBDAQ4ODhMREyYVFSZPNS01T09PT09PT09PT09PT09PT09PT09PT09PT09PT09PT09PT09PT09PT09P"
+    "T09PT09PT0//wAARCABaADwDASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUF"
+    "BAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVW"
+    "V1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi"
+    "4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAEC"
+    "AxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVm"
+    "Z2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq"
+    "8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDk6KKK5j2gooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKACi"
+    "iigAooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKAP/2Q=="
+)
+
+
+class OMDBStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.05, port: int = 0):
+        super().__init__(("127.0.0.1", port), _OMDBStubHandler)
+        self.latency = latency
+        self.request_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+
+    def start(self) -> "OMDBStubServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _OMDBStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled sessions can reuse connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.request_count += 1
+        time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        if url.path.startswith("/posters/"):
+            self._send(POSTER_JPEG, "image/jpeg")
+            return
+
+        query = parse_qs(url.query)
+        title = query.get("t", [""])[0]
+        imdb_id = query.get("i", ["tt%07d" % (abs(hash(title.lower())) % 10_000_000)])[0]
+        title = title or f"Stub {imdb_id}"
+        if title.lower().startswith("missing"):
+            payload = {"Response": "False", "Error": "Movie not found!"}
+        else:
+            payload = {
+                "Response": "True",
+                "Title": title,
+                "Director": "Stub Director",
+                "Year": "1999",
+                "imdbRating": "7.5",
+                "imdbID": imdb_id,
+                "Poster": f"{server.url}posters/{imdb_id}.jpg",
+            }
+        self._send(json.dumps(payload).encode(), "application/json")
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,87 @@
+"""
+Payload size and serialization time of the movie listings at 100k rows.
+
+Seeds a fresh database, then compares for all fields and for ?fields=id,name:
+  - the SELECT alone (the projection is pushed down into SQL),
+  - each encoder on the same rows: Flask's jsonify encoder (the previous
+    behaviour), services.encoding's JSON (orjson when installed) and
+    MessagePack (when msgpack is installed),
+  - the whole GET /api/movies request through the test client.
+
+Usage: python -m benchmarks.serialization [--movies 100000] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.datagen import seed
+
+PROJECTIONS = {"all fields": None, "fields=id,name": ["id", "name"]}
+
+
+def best_time(fn, repeat):
+    """Median wall time of fn() in ms, and its last result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="movieweb-serialization-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'movieweb.db')}",
+        "OMDB_API_KEY": "bench",
+        "OMDB_CACHE_PATH": os.path.join(workdir, "omdb_cache.db"),
+        "ENRICHMENT_WORKER": "0",
+        "SIMILARITY_REFRESH_SECONDS": "0",
+        "METRICS_PATH": os.path.join(workdir, "metrics.db"),
+    })
+    from app import create_app
+    from datamanager.models import db
+    from services import encoding
+
+    app = create_app()
+
+    encoders = {"jsonify (stdlib)": app.json.dumps, "json" + (" (orjson)" if encoding.orjson else ""):
+                encoding.dumps_json}
+    if encoding.msgpack is not None:
+        encoders["msgpack"] = encoding.dumps_msgpack
+    accepts = {"json": encoding.JSON}
+    if encoding.msgpack is not None:
+        accepts["msgpack"] = encoding.MSGPACK
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            seed(conn, users=1, movies=args.movies, links_per_user=1)
+        data_manager = app.extensions["movieweb"]["data_manager"]
+
+        print(f"{args.movies} movies, median of {args.repeat} runs\n")
+        print(f"{'projection':16} {'step':24} {'ms':>9} {'bytes':>12}")
+        for label, fields in PROJECTIONS.items():
+            select_ms, rows = best_time(lambda: data_manager.get_all_movies(fields), args.repeat)
+            print(f"{label:16} {'SELECT':24} {select_ms:9.1f}")
+            for name, encode in encoders.items():
+                encode_ms, payload = best_time(lambda: encode(rows), args.repeat)
+                print(f"{label:16} {'encode ' + name:24} {encode_ms:9.1f} {len(payload):12,}")
+
+    client = app.test_client()
+    print()
+    for label, fields in PROJECTIONS.items():
+        url = "/api/movies" + (f"?fields={','.join(fields)}" if fields else "")
+        for name, mimetype in accepts.items():
+            request_ms, body = best_time(lambda: client.get(url, headers={"Accept": mimetype}).get_data(), args.repeat)
+            print(f"{label:16} {'GET /api/movies ' + name:24} {request_ms:9.1f} {len(body):12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Build time of the similar-movies tables and the cost of serving them.
+
+Seeds a fresh database, rebuilds movie_similarity and user_recommendation with
+the pure-Python engine and, when NumPy/SciPy are installed, with the sparse
+matrix engine (the two must produce the same neighbours), then times
+/api/movies/<id>/similar and /api/users/<id>/recommendations.
+
+Usage: python -m benchmarks.similarity [--users 2000] [--movies 20000] [--links 50] [--top-k 20]
+                                       [--requests 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.datagen import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--links", type=int, default=50, help="movies per user")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="movieweb-similarity-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'movieweb.db')}",
+        "OMDB_API_KEY": "bench",
+        "OMDB_CACHE_PATH": os.path.join(workdir, "omdb_cache.db"),
+        "ENRICHMENT_WORKER": "0",
+        "SIMILARITY_REFRESH_SECONDS": "0",
+        "METRICS_PATH": os.path.join(workdir, "metrics.db"),
+    })
+    from app import create_app
+    from datamanager import similarity
+    from datamanager.models import db
+
+    app = create_app()
+    engines = [False] + ([True] if similarity.np is not None else [])
+    with app.app_context():
+        with db.engine.begin() as conn:
+            counts = seed(conn, args.users, args.movies, args.links)
+        print(f"{counts['users']} users, {counts['movies']} movies, {counts['links']} links")
+
+        tables = {}
+        for use_numpy in engines:
+            with db.engine.begin() as conn:
+                report = similarity.rebuild(conn, top_k=args.top_k, use_numpy=use_numpy)
+                tables[report["engine"]] = (
+                    conn.execute(text("SELECT * FROM movie_similarity ORDER BY movie_id, similar_id")).all(),
+                    conn.execute(text("SELECT * FROM user_recommendation ORDER BY user_id, movie_id")).all())
+            print(f"{report['engine']:7} build: {report['seconds']:.2f}s, {report['pairs']} pairs, "
+                  f"{report['recommendations']} recommendations")
+        if len(tables) == 2:
+            assert tables["python"] == tables["numpy"], "engines disagree"
+            print("engines produce identical tables")
+        if not similarity.np:
+            print("numpy/scipy not installed: only the pure-Python engine was measured")
+
+    client = app.test_client()
+    rng = random.Random(1)
+    urls = {
+        "similar": lambda: f"/api/movies/{counts['first_movie_id'] + rng.randrange(counts['movies'])}/similar",
+        "recommendations": lambda: f"/api/users/{counts['first_user_id'] + rng.randrange(counts['users'])}"
+                                   f"/recommendations",
+    }
+    for name, url in urls.items():
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url())
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        latencies.sort()
+        print(f"GET {name:16} p50 {statistics.median(latencies) * 1000:.2f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
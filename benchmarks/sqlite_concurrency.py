@@ -0,0 +1,118 @@
+"""
+Concurrent readers and writers against one SQLite file, per engine profile.
+
+Every worker is a separate process with its own engine (like gunicorn workers).
+Readers page through the movie table, writers insert movies; with the stock
+rollback journal they serialize, with the "wal" profile they don't.
+
+Usage: python -m benchmarks.sqlite_concurrency [--readers 4] [--writers 2] [--seconds 5] [--group 1]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from datamanager.engine import SQLITE_PROFILES, apply_sqlite_pragmas, sqlite_pragmas
+
+
+def make_engine(path, profile):
+    engine = create_engine(f"sqlite:///{path}")
+    apply_sqlite_pragmas(engine, sqlite_pragmas(profile))
+    return engine
+
+
+def seed(path, profile, rows=20_000):
+    engine = make_engine(path, profile)
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE movie (
+            id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, director VARCHAR(100) NOT NULL,
+            year INTEGER NOT NULL, rating FLOAT NOT NULL, poster VARCHAR(500))"""))
+        conn.execute(text("INSERT INTO movie (name, director, year, rating) VALUES (:n, 'd', 2000, 5)"),
+                     [{"n": f"Movie {i}"} for i in range(rows)])
+    engine.dispose()
+
+
+def reader(path, profile, deadline, results):
+    engine = make_engine(path, profile)
+    ops, errors, latencies = 0, 0, []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM movie ORDER BY id LIMIT 10 OFFSET :o"),
+                             {"o": random.randint(0, 10_000)}).fetchall()
+            ops += 1
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    results.put(("read", ops, errors, latencies))
+
+
+def writer(path, profile, deadline, group, results):
+    engine = make_engine(path, profile)
+    ops, errors, latencies = 0, 0, []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                # group > 1 emulates group commit: several writes share one transaction/fsync
+                for _ in range(group):
+                    conn.execute(text("INSERT INTO movie (name, director, year, rating) "
+                                      "VALUES ('new', 'd', 2001, 6)"))
+            ops += group
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    results.put(("write", ops, errors, latencies))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def run(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, profile)
+        results = multiprocessing.Queue()
+        deadline = time.time() + args.seconds
+        procs = [multiprocessing.Process(target=reader, args=(path, profile, deadline, results))
+                 for _ in range(args.readers)]
+        procs += [multiprocessing.Process(target=writer, args=(path, profile, deadline, args.group, results))
+                  for _ in range(args.writers)]
+        for proc in procs:
+            proc.start()
+        collected = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    for kind in ("read", "write"):
+        rows = [r for r in collected if r[0] == kind]
+        ops = sum(r[1] for r in rows)
+        errors = sum(r[2] for r in rows)
+        latencies = [l for r in rows for l in r[3]]
+        print(f"{profile:<8}{kind:<6}{ops / args.seconds:>10.0f}/s{errors:>8} errors"
+              f"   p50 {percentile(latencies, 50):7.2f}ms  p99 {percentile(latencies, 99):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--group", type=int, default=1, help="writes per commit")
+    args = parser.parse_args()
+    for profile in SQLITE_PROFILES:
+        run(profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cold start of one worker: how long until a fresh process serves its first request.
+
+Seeds a database once, then starts --runs new Python processes against it, each
+measuring:
+  - import:        `import app` (the module graph: Flask, SQLAlchemy, services)
+  - create_app:    building the app (schema check, services)
+  - first request: the first GET through the test client (template compilation,
+                   first connection, data manager warm-up, background threads)
+  - ready:         the three above together, the time a new gunicorn worker
+                   (or a test) waits before it can answer
+  - suggest index: until the background typeahead build has finished
+and the process's wall time including interpreter startup. Medians are reported.
+With --importtime the slowest imports of one run (python -X importtime) are listed.
+
+Usage: python -m benchmarks.startup [--users 200] [--movies 50000] [--links 50] [--runs 5]
+                                    [--path /users] [--backend sqlite|memory] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import seed
+
+# Runs in each measured process
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app as movieweb
+imported = time.perf_counter()
+application = movieweb.create_app()
+created = time.perf_counter()
+response = application.test_client().get(sys.argv[1])
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+suggest = application.extensions["movieweb"]["suggest"]
+while suggest.version is None and time.perf_counter() - served < 60:
+    time.sleep(0.005)
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "ready_ms": (served - start) * 1000,
+    "suggest_index_ms": (time.perf_counter() - created) * 1000,
+}))
+"""
+
+STEPS = ("import_ms", "create_app_ms", "first_request_ms", "ready_ms", "suggest_index_ms", "process_ms")
+
+
+def run_child(path, env, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, path]
+    start = time.perf_counter()
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result, completed.stderr
+
+
+def slowest_imports(stderr, limit):
+    """Top-level imports of app.py by cumulative time, from python -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and name.startswith(" " * 3) and not name.startswith(" " * 4):
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--movies", type=int, default=50_000)
+    parser.add_argument("--links", type=int, default=50, help="movies per user")
+    parser.add_argument("--runs", type=int, default=5, help="measured processes")
+    parser.add_argument("--path", default="/users", help="URL of the first request")
+    parser.add_argument("--backend", choices=("sqlite", "memory"), default="sqlite", help="DATA_BACKEND of the app")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="list the N slowest imports")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="movieweb-startup-")
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'movieweb.db')}",
+               OMDB_API_KEY="bench",
+               OMDB_CACHE_PATH=os.path.join(workdir, "omdb_cache.db"),
+               ENRICHMENT_WORKER="0",  # would only wait for jobs
+               METRICS_PATH=os.path.join(workdir, "metrics.db"),
+               POSTER_CACHE_PATH=os.path.join(workdir, "posters"),
+               DATA_BACKEND=args.backend,
+               PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    os.environ.update(env)
+
+    # Create and seed the database, and build the similarity tables so the
+    # workers' refresher finds them current, as it would in production
+    from app import create_app
+    from datamanager.models import db
+    app = create_app({"SIMILARITY_REFRESH_SECONDS": 0})
+    with app.app_context():
+        with db.engine.begin() as conn:
+            counts = seed(conn, args.users, args.movies, args.links)
+        app.extensions["movieweb"]["similarity_refresher"].run_once(force=True)
+    print(f"{counts['users']} users, {counts['movies']} movies, {counts['links']} links; "
+          f"first request GET {args.path}, median of {args.runs} processes\n")
+
+    run_child(args.path, env)  # warm the OS page cache and .pyc files
+    results = [run_child(args.path, env)[0] for _ in range(args.runs)]
+    print(f"{'step':18} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for step in STEPS:
+        values = [result[step] for result in results]
+        print(f"{step[:-3]:18} {statistics.median(values):10.1f} {min(values):8.1f} {max(values):8.1f}")
+
+    if args.importtime:
+        _, stderr = run_child(args.path, env, importtime=True)
+        print("\nslowest imports under app (cumulative ms, one run with -X importtime)")
+        for milliseconds, name in slowest_imports(stderr, args.importtime):
+            print(f"{milliseconds:10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
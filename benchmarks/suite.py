@@ -0,0 +1,275 @@
+"""
+End-to-end benchmark of every route, plus OMDB lookups against the local stub.
+
+Seeds a fresh database in a temporary directory with benchmarks.datagen, points
+the app's OMDB client and poster cache at benchmarks.omdb_stub, and drives each
+endpoint through the Flask test client. Reports p50/p95/p99 latency, throughput
+and peak Python memory per endpoint, and writes the results as JSON (by default
+to benchmarks/results/) so runs on different commits can be compared.
+
+Usage: python -m benchmarks.suite [--users 200] [--movies 20000] [--links 50] [--requests 200]
+                                  [--latency 0.02] [--only user_movies,api_movies]
+                                  [--backend sqlite|memory] [--output FILE] [--compare OLD.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.datagen import seed
+from benchmarks.omdb_stub import OMDBStubServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+MEMORY_SAMPLES = 20  # requests per endpoint run under tracemalloc
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, peak_bytes=None):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    result = {
+        "requests": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "throughput_rps": round(len(ordered) / total, 1) if total else None,
+    }
+    if peak_bytes is not None:
+        result["peak_memory_kib"] = round(peak_bytes / 1024, 1)
+    return result
+
+
+def build_scenarios(counts, rng):
+    """
+    Request factories per endpoint: each takes the iteration number and returns
+    (method, url, keyword arguments for the test client).
+    """
+    users = range(counts["first_user_id"], counts["first_user_id"] + counts["users"])
+    movies = range(counts["first_movie_id"], counts["first_movie_id"] + counts["movies"])
+    form = {"name": "Bench Movie", "director": "Bench Director", "year": "2001", "rating": "6.5"}
+    import_body = "\n".join(
+        json.dumps({"user_id": users[0], "name": f"Imported {i}", "director": "Someone",
+                    "year": 2000, "rating": 5.0}) for i in range(100))
+
+    return {
+        "home": lambda i: ("GET", "/", {}),
+        "users_list": lambda i: ("GET", "/users", {}),
+        "user_movies": lambda i: ("GET", f"/users/{rng.choice(users)}", {}),
+        "add_user_form": lambda i: ("GET", "/add_user", {}),
+        "add_user": lambda i: ("POST", "/add_user", {"data": {"name": f"Bench User {i}"}}),
+        "search_movie_omdb": lambda i: ("GET", f"/api/search_movie?title=Bench+{i % 50}", {}),
+        "add_user_movie_form": lambda i: ("GET", f"/users/{rng.choice(users)}/add_movie", {}),
+        "add_user_movie": lambda i: ("POST", f"/users/{rng.choice(users)}/add_movie",
+                                     {"data": dict(form, name=f"Bench Movie {i}")}),
+        "update_movie_form": lambda i: ("GET", f"/users/{users[0]}/update_movie/{counts['own_movie_id']}", {}),
+        "update_movie": lambda i: ("POST", f"/users/{users[0]}/update_movie/{counts['own_movie_id']}",
+                                   {"data": form}),
+        "delete_user_movie": lambda i: ("GET", f"/users/{rng.choice(users)}/delete_movie/{rng.choice(movies)}", {}),
+        "movie_collections": lambda i: ("GET", f"/movie_collections?page={rng.randint(1, 50)}", {}),
+        "movie_collections_deep": lambda i: ("GET", f"/movie_collections?page={rng.randint(500, 1500)}", {}),
+        "movie_collections_search": lambda i: ("GET", f"/movie_collections?search={rng.choice(['dark', 'star', 'king river'])}", {}),
+        "poster_thumb": lambda i: ("GET", f"/posters/thumb?url=http://127.0.0.1:{counts['stub_port']}/posters/tt{9_000_000 + rng.choice(movies):07d}.jpg", {}),
+        "api_movies": lambda i: ("GET", "/api/movies", {}),
+        "api_movies_stream": lambda i: ("GET", "/api/movies?stream=1", {}),
+        "api_movies_search": lambda i: ("GET", f"/api/movies/search?q={rng.choice(['dark', 'night', 'golden'])}", {}),
+        "api_user_movies": lambda i: ("GET", f"/api/users/{rng.choice(users)}/movies", {}),
+        "api_similar": lambda i: ("GET", f"/api/movies/{rng.choice(movies)}/similar", {}),
+        "api_user_recommendations": lambda i: ("GET", f"/api/users/{rng.choice(users)}/recommendations", {}),
+        "api_suggest": lambda i: ("GET", f"/api/suggest?q={rng.choice(['da', 'st', 'kin', 'nol'])}", {}),
+        "api_cache_stats": lambda i: ("GET", "/api/cache/stats", {}),
+        "metrics": lambda i: ("GET", "/metrics", {}),
+        "api_batch_sync": lambda i: ("POST", f"/api/users/{rng.choice(users)}/movies/batch", {"json": {
+            "add": [{"movie_id": rng.choice(movies)} for _ in range(100)],
+            "update": [{"movie_id": rng.choice(movies), "rating": 7.0} for _ in range(20)],
+            "remove": [rng.choice(movies) for _ in range(20)]}}),
+        "api_import": lambda i: ("POST", "/api/import?format=jsonl", {"data": import_body,
+                                                                     "content_type": "application/x-ndjson"}),
+    }
+
+
+def run_request(client, method, url, kwargs):
+    response = client.open(url, method=method, **kwargs)
+    response.get_data()  # drain streamed bodies
+    response.close()
+    if response.status_code >= 500:
+        raise RuntimeError(f"{method} {url} returned {response.status_code}")
+
+
+def bench_endpoint(client, factory, requests_per_endpoint, warmup=5):
+    for i in range(warmup):
+        run_request(client, *factory(-i - 1))
+    latencies = []
+    for i in range(requests_per_endpoint):
+        request = factory(i)
+        start = time.perf_counter()
+        run_request(client, *request)
+        latencies.append(time.perf_counter() - start)
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(min(MEMORY_SAMPLES, requests_per_endpoint)):
+            request = factory(requests_per_endpoint + i)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            run_request(client, *request)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return summarize(latencies, peak)
+
+
+def bench_omdb(stub, lookups, workers):
+    """Uncached OMDBService lookups against the stub, one by one and as a batch"""
+    from services.omdb_service import OMDBService
+
+    service = OMDBService("bench", base_url=stub.url, max_workers=workers)
+    titles = [f"Movie {i}" if i % 10 else f"Missing {i}" for i in range(lookups)]
+    latencies = []
+    for title in titles:
+        start = time.perf_counter()
+        service.search_movie(title)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    service.search_movies_batch([f"Batch {i}" for i in range(lookups)])
+    batch_seconds = time.perf_counter() - start
+    return {"sequential": summarize(latencies),
+            "batch": {"lookups": lookups, "workers": workers,
+                      "throughput_rps": round(lookups / batch_seconds, 1)}}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    print(f"\n{'endpoint':28} {'p50 old':>9} {'p50 new':>9} {'change':>8}   {'p95 old':>9} {'p95 new':>9} {'change':>8}")
+    for name, result in new["endpoints"].items():
+        before = old.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms"):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+            cells.append(f"{before[key]:9.2f} {result[key]:9.2f} {change:+7.1f}%")
+        print(f"{name:28} {cells[0]}   {cells[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--links", type=int, default=50, help="movies per user")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--latency", type=float, default=0.02, help="OMDB stub delay in seconds")
+    parser.add_argument("--omdb-lookups", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8, help="OMDB batch concurrency")
+    parser.add_argument("--only", help="comma-separated endpoint names")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=("sqlite", "memory"), default="sqlite", help="DATA_BACKEND of the app")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    stub = OMDBStubServer(latency=args.latency).start()
+    workdir = tempfile.mkdtemp(prefix="movieweb-bench-")
+    # create_app() reads its configuration from the environment
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'movieweb.db')}",
+        "OMDB_API_KEY": "bench",
+        "OMDB_BASE_URL": stub.url,
+        "OMDB_CACHE_PATH": os.path.join(workdir, "omdb_cache.db"),
+        "OMDB_RATE": "100000",  # measure the app, not the quota scheduler
+        "OMDB_DAILY_BUDGET": "0",
+        "ENRICHMENT_WORKER": "0",  # movies added by the benchmark would keep it busy
+        "SIMILARITY_REFRESH_SECONDS": "0",  # built once after seeding instead
+        "BACKGROUND_THREADS": "0",  # the suggest index too
+        "POSTER_CACHE_PATH": os.path.join(workdir, "posters"),
+        "POSTER_ALLOWED_HOSTS": "127.0.0.1",
+        "METRICS_PATH": os.path.join(workdir, "metrics.db"),
+        "DATA_BACKEND": args.backend,
+    })
+    try:
+        from app import create_app
+        from datamanager.models import db
+
+        app = create_app()
+        services = app.extensions["movieweb"]
+        with app.app_context():
+            start = time.perf_counter()
+            with db.engine.begin() as conn:
+                counts = seed(conn, args.users, args.movies, args.links, args.seed,
+                              poster_base=f"{stub.url}posters/")
+            seed_seconds = time.perf_counter() - start
+            # Only the first user has this movie, so the edit scenarios update it in place
+            data_manager = services["data_manager"]
+            counts["own_movie_id"] = data_manager.add_movie("Bench Own Movie", "Bench Director", 2001, 6.5,
+                                                            f"{stub.url}posters/own.jpg")
+            data_manager.add_user_movie(counts["first_user_id"], counts["own_movie_id"])
+        services["suggest"].rebuild()
+        with app.app_context():
+            services["similarity_refresher"].run_once(force=True)
+        counts["stub_port"] = stub.server_address[1]
+        print(f"seeded {counts['users']} users, {counts['movies']} movies, {counts['links']} links "
+              f"in {seed_seconds:.1f}s")
+
+        scenarios = build_scenarios(counts, random.Random(args.seed))
+        if args.only:
+            scenarios = {name: scenarios[name] for name in args.only.split(",")}
+
+        client = app.test_client()
+        results = {}
+        print(f"{'endpoint':28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'peak KiB':>9}")
+        for name, factory in scenarios.items():
+            result = results[name] = bench_endpoint(client, factory, args.requests)
+            print(f"{name:28} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+                  f"{result['throughput_rps']:8.0f} {result['peak_memory_kib']:9.0f}")
+
+        omdb = bench_omdb(stub, args.omdb_lookups, args.workers)
+        print(f"omdb sequential: p50 {omdb['sequential']['p50_ms']:.1f} ms, "
+              f"p99 {omdb['sequential']['p99_ms']:.1f} ms; "
+              f"batch x{args.workers}: {omdb['batch']['throughput_rps']:.0f} lookups/s")
+    finally:
+        stub.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "endpoints": results,
+        "omdb": omdb,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
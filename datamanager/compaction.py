@@ -0,0 +1,95 @@
+from collections import defaultdict
+from typing import Dict, Optional
+from sqlalchemy import text
+from . import versions
+
+
+def _same_entry(a, b) -> bool:
+    """Whether two movie rows agree on everything a user can edit, so merging loses nothing"""
+    return " ".join(a[1].split()) == " ".join(b[1].split()) and a[2:5] == b[2:5]
+
+
+def _canonical_groups(movies, resolved_imdb_ids: Dict[int, str]):
+    """
+    Group movie rows into sets of duplicates.
+    Rows are duplicates if they share an imdb_id, or if they share a
+    case-folded title and year and at most one imdb_id occurs in that group.
+    Duplicates whose title, director, year or rating differ are copies a user
+    edited (see SQLiteDataManager.update_user_movie) and stay separate.
+    Yields (canonical_id, imdb_id, [duplicate ids]) for every group that has
+    duplicates or an imdb_id.
+    """
+    by_title = defaultdict(list)
+    for movie_id, name, director, year, rating, imdb_id in movies:
+        imdb_id = imdb_id or resolved_imdb_ids.get(movie_id)
+        by_title[(" ".join(name.split()).casefold(), year)].append((movie_id, name, director, year, rating, imdb_id))
+
+    by_imdb = defaultdict(list)
+    for rows in by_title.values():
+        imdb_ids = {row[-1] for row in rows if row[-1]}
+        if len(imdb_ids) <= 1:
+            # Same title and year, no conflicting IMDb ids: one film
+            group_key = imdb_ids.pop() if imdb_ids else ("title", rows[0][0])
+            by_imdb[group_key].extend(rows)
+        else:
+            # Different films with the same title and year; only merge rows with equal ids
+            for row in rows:
+                by_imdb[row[-1] or ("title", row[0])].append(row)
+
+    for key, rows in by_imdb.items():
+        imdb_id = key if isinstance(key, str) else None
+        # Prefer the row that already carries the imdb_id, then the oldest
+        rows.sort(key=lambda row: (row[-1] is None, row[0]))
+        entries = []
+        for row in rows:
+            entry = next((entry for entry in entries if _same_entry(entry[0], row)), None)
+            if entry is None:
+                entries.append([row])
+            else:
+                entry.append(row)
+        # Only the first entry gets the imdb_id; it is unique, and the others are edited copies
+        for index, entry in enumerate(entries):
+            entry_imdb_id = imdb_id if index == 0 else None
+            if len(entry) < 2 and entry_imdb_id is None:
+                continue
+            yield entry[0][0], entry_imdb_id, [row[0] for row in entry[1:]]
+
+
+def compact_movies(connection, resolved_imdb_ids: Optional[Dict[int, str]] = None) -> Dict[str, int]:
+    """
+    Merge duplicate movie rows into one canonical record per film; copies
+    that users edited are kept as they are.
+    User links are moved to the canonical movie (users that had several copies
+    keep one link), the copies are deleted, and imdb_ids resolved elsewhere
+    (e.g. via OMDB, as {movie_id: imdb_id}) are stored on the canonical rows.
+    Runs in the caller's transaction.
+    """
+    resolved_imdb_ids = resolved_imdb_ids or {}
+    movies = connection.execute(text("SELECT id, name, director, year, rating, imdb_id FROM movie")).all()
+    current_imdb_ids = {movie[0]: movie[-1] for movie in movies}
+
+    merges, imdb_updates = [], []
+    for canonical_id, imdb_id, duplicates in _canonical_groups(movies, resolved_imdb_ids):
+        merges.extend({"old_id": old_id, "canonical_id": canonical_id} for old_id in duplicates)
+        if imdb_id and current_imdb_ids[canonical_id] != imdb_id:
+            imdb_updates.append({"id": canonical_id, "imdb_id": imdb_id})
+
+    report = {"merged": len(merges), "links_moved": 0, "imdb_ids_set": len(imdb_updates)}
+    if merges:
+        connection.execute(text("CREATE TEMP TABLE movie_merge (old_id INTEGER PRIMARY KEY, canonical_id INTEGER)"))
+        connection.execute(text("INSERT INTO movie_merge (old_id, canonical_id) VALUES (:old_id, :canonical_id)"),
+                           merges)
+        report["links_moved"] = connection.execute(text("""
+            INSERT OR IGNORE INTO user_movies (user_id, movie_id)
+            SELECT user_movies.user_id, movie_merge.canonical_id
+            FROM user_movies JOIN movie_merge ON movie_merge.old_id = user_movies.movie_id
+        """)).rowcount
+        connection.execute(text("DELETE FROM user_movies WHERE movie_id IN (SELECT old_id FROM movie_merge)"))
+        connection.execute(text("DELETE FROM movie WHERE id IN (SELECT old_id FROM movie_merge)"))
+        connection.execute(text("DROP TABLE movie_merge"))
+    if imdb_updates:
+        # Copies are gone, so setting the ids can't violate the unique index
+        connection.execute(text("UPDATE movie SET imdb_id = :imdb_id WHERE id = :id"), imdb_updates)
+    if merges:
+        versions.bump_all(connection)
+    return report
@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict
+from typing import ContextManager, Iterator, List, Optional, Dict, Sequence, Tuple
 
 class DataManagerInterface(ABC):
+    @abstractmethod
+    def subscribe(self, callback) -> None:
+        """Register callback(event, data), called after each committed write"""
+        pass
+
+    @abstractmethod
+    def group_commit(self) -> ContextManager:
+        """Context manager that makes the write calls inside it share one transaction"""
+        pass
+
     @abstractmethod
     def add_user(self, name: str) -> int:
         """Add a new user and return their ID"""
@@ -13,8 +23,10 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def add_movie(self, name: str, director: str, year: int, rating: float) -> int:
-        """Add a new movie and return its ID"""
+    def add_movie(self, name: str, director: str, year: int, rating: float,
+                  poster: str = None, imdb_id: str = None) -> int:
+        """Add a new movie and return its ID.
+        If a movie with the same imdb_id exists, its ID is returned instead"""
         pass
 
     @abstractmethod
@@ -23,8 +35,22 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def get_all_movies(self) -> List[Dict]:
-        """Get all movies"""
+    def get_all_movies(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get all movies; fields limits the keys of each movie (and the columns read)"""
+        pass
+
+    @abstractmethod
+    def get_movies_page(self, page: int, per_page: int, after_id: Optional[int] = None,
+                        before_id: Optional[int] = None) -> Dict:
+        """Get one page of movies plus the total count.
+        If after_id is given, the page starts after that movie ID; if before_id is given, it ends
+        before that movie ID (keyset cursors, handed out as next_after_id and prev_before_id)"""
+        pass
+
+    @abstractmethod
+    def search_movies_page(self, search_query: str, page: int, per_page: int,
+                           after_id: Optional[int] = None, before_id: Optional[int] = None) -> Dict:
+        """Get one page of movies matching the search query plus the total count"""
         pass
 
     @abstractmethod
@@ -32,6 +58,12 @@ class DataManagerInterface(ABC):
         """Update movie details"""
         pass
 
+    @abstractmethod
+    def update_user_movie(self, user_id: int, movie_id: int, name: str, director: str, year: int,
+                          rating: float, poster: str = None) -> int:
+        """Update a movie of the user's list without changing it for other users; returns its id in the list"""
+        pass
+
     @abstractmethod
     def delete_movie(self, movie_id: int) -> bool:
         """Delete a movie"""
@@ -43,8 +75,29 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def get_user_movies(self, user_id: int) -> List[Dict]:
-        """Get all movies associated with a specific user"""
+    def get_user_movies(self, user_id: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get all movies associated with a specific user, optionally only some fields"""
+        pass
+
+    @abstractmethod
+    def get_user_with_movies(self, user_id: int) -> Optional[Tuple[Dict, List[Dict]]]:
+        """Get a user and their movies in one round trip; None if the user doesn't exist"""
+        pass
+
+    @abstractmethod
+    def get_user_and_movie(self, user_id: int, movie_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Get a user and a movie of their list in one round trip; either is None if it doesn't exist"""
+        pass
+
+    @abstractmethod
+    def iter_all_movies(self, batch_size: int = 1000, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Iterate over all movies, fetching batch_size rows at a time, optionally only some fields"""
+        pass
+
+    @abstractmethod
+    def iter_user_movies(self, user_id: int, batch_size: int = 1000,
+                         fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Iterate over a user's movies, fetching batch_size rows at a time, optionally only some fields"""
         pass
 
     @abstractmethod
@@ -56,3 +109,97 @@ class DataManagerInterface(ABC):
     def remove_user_movie(self, user_id: int, movie_id: int) -> bool:
         """Remove a movie association from a user"""
         pass
+
+    @abstractmethod
+    def import_movies(self, rows: List[Dict]) -> int:
+        """Insert a batch of movies and link each one to row["user_id"] in a single transaction.
+        Rows for unknown users are skipped. Returns the number of rows imported"""
+        pass
+
+    @abstractmethod
+    def add_user_movies(self, user_id: int, movies: List[Dict]) -> List[Dict]:
+        """Add many movies to a user's list in one transaction. Each item is {"movie_id": id} for an
+        existing movie or the details of a new one (name, director, year, rating, poster, imdb_id).
+        Returns per item {"status": "added" | "already_in_list" | "not_found", "movie_id": ...}"""
+        pass
+
+    @abstractmethod
+    def update_user_movies(self, user_id: int, updates: List[Dict]) -> List[Dict]:
+        """Update many movies of a user's list in one transaction. Each update has a movie_id and
+        the fields to change. Returns per update {"status": "updated" | "not_in_list", "movie_id": ...},
+        plus "copied_to" with the user's new movie id if the movie was shared and had to be copied"""
+        pass
+
+    @abstractmethod
+    def remove_user_movies(self, user_id: int, movie_ids: List[int]) -> List[Dict]:
+        """Remove many movies from a user's list in one transaction.
+        Returns per id {"status": "removed" | "not_in_list", "movie_id": ...}"""
+        pass
+
+    @abstractmethod
+    def get_data_version(self, scope: str) -> Tuple[int, Optional[float]]:
+        """Get (version, last update timestamp) of a data scope such as "catalog" or "user:<id>".
+        The version changes whenever a write changes the data in that scope"""
+        pass
+
+    @abstractmethod
+    def claim_enrichment_jobs(self, limit: int, lease_seconds: float) -> List[Dict]:
+        """Lease up to limit due enrichment jobs, each with the movie's current details"""
+        pass
+
+    @abstractmethod
+    def finish_enrichment_job(self, job: Dict, details: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        """Apply looked-up details (None: nothing found) and remove the job,
+        or schedule a retry if the lookup failed with error"""
+        pass
+
+    @abstractmethod
+    def enqueue_rating_refresh(self, max_age: float, limit: int) -> int:
+        """Queue refresh jobs for movies whose OMDB details are older than max_age seconds"""
+        pass
+
+    @abstractmethod
+    def get_enrichment_stats(self) -> Dict:
+        """Number of queued enrichment jobs by kind and status"""
+        pass
+
+    @abstractmethod
+    def get_catalog_stats(self, top_directors: int = 10) -> Dict:
+        """Movie count and average rating overall, per decade and for the directors with the most movies"""
+        pass
+
+    @abstractmethod
+    def get_users_stats(self) -> List[Dict]:
+        """Movie count and average rating of every user's list"""
+        pass
+
+    @abstractmethod
+    def get_user_stats(self, user_id: int) -> Dict:
+        """Movie count and average rating of one user's list"""
+        pass
+
+    @abstractmethod
+    def rebuild_stats(self) -> None:
+        """Recompute the statistics summary tables from the movie and user_movies tables"""
+        pass
+
+    @abstractmethod
+    def get_similar_movies(self, movie_id: int, limit: int = 10) -> List[Dict]:
+        """Movies most often saved together with this one, best first, with their score"""
+        pass
+
+    @abstractmethod
+    def get_user_recommendations(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Movies similar to the ones in a user's list that aren't in it yet, best first"""
+        pass
+
+    @abstractmethod
+    def rebuild_similarities(self, top_k: int = 20, min_common: int = 1, per_user: int = 20,
+                             if_changed: bool = False) -> Optional[Dict]:
+        """Recompute similar movies and recommendations; with if_changed, None if nothing was written since"""
+        pass
+
+    @abstractmethod
+    def get_similarity_build(self) -> Optional[Dict]:
+        """Report of the last similarity build, None if there was none"""
+        pass
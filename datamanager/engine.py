@@ -0,0 +1,44 @@
+from typing import Dict, Optional
+from sqlalchemy import event
+
+# PRAGMAs applied to every new SQLite connection, by profile name.
+# "wal" lets readers run alongside a writer and avoids an fsync per commit;
+# "default" keeps SQLite's stock settings (rollback journal, synchronous=FULL).
+SQLITE_PROFILES = {
+    "default": {
+        "busy_timeout": 5000,
+    },
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,             # ms to wait for a lock instead of failing with "database is locked"
+        "cache_size": -64000,             # negative = KiB, i.e. 64 MB page cache per connection
+        "mmap_size": 256 * 1024 * 1024,   # read pages through a 256 MB memory map
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def sqlite_pragmas(profile: str, overrides: Optional[Dict] = None) -> Dict:
+    """Look up the PRAGMAs of a profile, with per-key overrides"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    pragmas.update(overrides or {})
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine, pragmas: Dict) -> None:
+    """Run the given PRAGMAs on every connection the engine opens from now on"""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    # Connections opened before the listener was registered don't have the settings
+    engine.dispose()
@@ -0,0 +1,77 @@
+import re
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# External-content FTS5 index over movie.name and movie.director.
+# The triggers keep it in sync with every INSERT/UPDATE/DELETE on the movie table,
+# so the write methods of the data manager don't need to know about it.
+MOVIE_FTS_TABLE = "movie_fts"
+
+MOVIE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {MOVIE_FTS_TABLE} USING fts5(
+        name, director,
+        content='movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_ai AFTER INSERT ON movie BEGIN
+        INSERT INTO {MOVIE_FTS_TABLE}(rowid, name, director) VALUES (new.id, new.name, new.director);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_ad AFTER DELETE ON movie BEGIN
+        INSERT INTO {MOVIE_FTS_TABLE}({MOVIE_FTS_TABLE}, rowid, name, director)
+        VALUES ('delete', old.id, old.name, old.director);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_au AFTER UPDATE OF name, director ON movie BEGIN
+        INSERT INTO {MOVIE_FTS_TABLE}({MOVIE_FTS_TABLE}, rowid, name, director)
+        VALUES ('delete', old.id, old.name, old.director);
+        INSERT INTO {MOVIE_FTS_TABLE}(rowid, name, director) VALUES (new.id, new.name, new.director);
+    END""",
+]
+
+MOVIE_FTS_REBUILD = f"INSERT INTO {MOVIE_FTS_TABLE}({MOVIE_FTS_TABLE}) VALUES ('rebuild')"
+
+MOVIE_FTS_COUNT = f"SELECT count(*) FROM {MOVIE_FTS_TABLE} WHERE {MOVIE_FTS_TABLE} MATCH :match"
+
+MOVIE_FTS_SEARCH = f"""
+    SELECT movie.id, movie.name, movie.director, movie.year, movie.rating, movie.poster
+    FROM {MOVIE_FTS_TABLE}
+    JOIN movie ON movie.id = {MOVIE_FTS_TABLE}.rowid
+    WHERE {MOVIE_FTS_TABLE} MATCH :match
+    ORDER BY {MOVIE_FTS_TABLE}.rank, movie.id
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def build_match_query(search_query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so "star wa" matches "Star Wars".
+    Returns None if the query contains no searchable words.
+    """
+    words = re.findall(r"\w+", search_query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def fts5_available(connection) -> bool:
+    """Check whether the SQLite library was compiled with FTS5"""
+    try:
+        connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)"))
+        connection.execute(text("DROP TABLE temp.fts5_probe"))
+        return True
+    except OperationalError:
+        return False
+
+
+def create_movie_fts(connection) -> None:
+    """Create the movie FTS5 index and its triggers, and fill it if it was just created"""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": MOVIE_FTS_TABLE}
+    ).first()
+    for statement in MOVIE_FTS_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(MOVIE_FTS_REBUILD))
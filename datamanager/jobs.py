@@ -0,0 +1,113 @@
+import time
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import text
+
+# Background enrichment jobs, kept in the enrichment_job table so they survive restarts.
+#   "enrich"  - fill in missing director/year/rating/poster of a movie from OMDB
+#   "refresh" - update the rating of a movie that came from OMDB once it is stale
+# A job is claimed with a lease (locked_until); if the worker dies, the lease runs
+# out and another worker picks it up. Failed lookups are retried with exponential
+# backoff until MAX_ATTEMPTS, then the job is marked "failed".
+ENRICH = "enrich"
+REFRESH = "refresh"
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 60
+MAX_BACKOFF_SECONDS = 6 * 3600
+
+def needs_enrichment(director: str, year: int, rating: float, poster: Optional[str]) -> bool:
+    return poster in (None, '', 'N/A') or director in ('', 'Unknown') or not rating or not year
+
+
+def enqueue(connection, kind: str, movie_ids: Iterable[int]) -> None:
+    """Queue jobs for the movies; movies that already have a job of this kind are skipped"""
+    now = time.time()
+    params = [{"kind": kind, "movie_id": movie_id, "now": now} for movie_id in movie_ids]
+    if params:
+        connection.execute(text("""
+            INSERT OR IGNORE INTO enrichment_job (kind, movie_id, status, attempts, run_after)
+            VALUES (:kind, :movie_id, 'pending', 0, :now)
+        """), params)
+
+
+def enqueue_stale(connection, max_age: float, limit: int) -> int:
+    """Queue refresh jobs for up to limit movies from OMDB whose details are older than max_age seconds"""
+    now = time.time()
+    return connection.execute(text("""
+        INSERT OR IGNORE INTO enrichment_job (kind, movie_id, status, attempts, run_after)
+        SELECT :kind, id, 'pending', 0, :now FROM movie
+        WHERE imdb_id IS NOT NULL AND (metadata_updated_at IS NULL OR metadata_updated_at < :cutoff)
+        ORDER BY metadata_updated_at
+        LIMIT :limit
+    """), {"kind": REFRESH, "now": now, "cutoff": now - max_age, "limit": limit}).rowcount
+
+
+def claim(connection, limit: int, lease_seconds: float) -> List[Dict]:
+    """
+    Lease up to limit due jobs. Returns dicts with the job's id, kind and attempts
+    plus the movie's current name, director, year, rating, poster and imdb_id.
+    Jobs of movies that no longer exist are dropped.
+    """
+    now = time.time()
+    claimed = connection.execute(text("""
+        UPDATE enrichment_job SET locked_until = :until, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM enrichment_job
+            WHERE status = 'pending' AND run_after <= :now AND (locked_until IS NULL OR locked_until <= :now)
+            ORDER BY run_after LIMIT :limit
+        )
+        RETURNING id
+    """), {"now": now, "until": now + lease_seconds, "limit": limit}).scalars().all()
+    if not claimed:
+        return []
+
+    ids = ",".join(str(int(job_id)) for job_id in claimed)
+    rows = connection.execute(text(f"""
+        SELECT enrichment_job.id, enrichment_job.kind, enrichment_job.attempts, enrichment_job.movie_id,
+               movie.name, movie.director, movie.year, movie.rating, movie.poster, movie.imdb_id
+        FROM enrichment_job LEFT JOIN movie ON movie.id = enrichment_job.movie_id
+        WHERE enrichment_job.id IN ({ids})
+    """)).mappings().all()
+    orphaned = [row["id"] for row in rows if row["name"] is None]
+    if orphaned:
+        complete(connection, orphaned)
+    return [dict(row) for row in rows if row["name"] is not None]
+
+
+def complete(connection, job_ids: Iterable[int]) -> None:
+    connection.execute(text("DELETE FROM enrichment_job WHERE id = :id"), [{"id": job_id} for job_id in job_ids])
+
+
+def retry(connection, job_id: int, error: str) -> None:
+    """
+    Schedule the next attempt of a leased job with exponential backoff, or give up.
+    A refresh that keeps failing is dropped and the movie counts as refreshed,
+    so it is tried again only after another max_age.
+    """
+    job = connection.execute(text("SELECT kind, movie_id, attempts FROM enrichment_job WHERE id = :id"),
+                             {"id": job_id}).first()
+    if job is None:
+        return
+    kind, movie_id, attempts = job
+    if attempts >= MAX_ATTEMPTS and kind == REFRESH:
+        complete(connection, [job_id])
+        connection.execute(text("UPDATE movie SET metadata_updated_at = :now WHERE id = :id"),
+                           {"id": movie_id, "now": time.time()})
+    elif attempts >= MAX_ATTEMPTS:
+        connection.execute(text("""
+            UPDATE enrichment_job SET status = 'failed', locked_until = NULL, last_error = :error WHERE id = :id
+        """), {"id": job_id, "error": error[:500]})
+    else:
+        delay = min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+        connection.execute(text("""
+            UPDATE enrichment_job SET run_after = :run_after, locked_until = NULL, last_error = :error WHERE id = :id
+        """), {"id": job_id, "run_after": time.time() + delay, "error": error[:500]})
+
+
+def stats(connection) -> Dict[str, Dict[str, int]]:
+    """Number of jobs by kind and status"""
+    result = {}
+    for kind, status, count in connection.execute(text(
+            "SELECT kind, status, COUNT(*) FROM enrichment_job GROUP BY kind, status")):
+        result.setdefault(kind, {})[status] = count
+    return result
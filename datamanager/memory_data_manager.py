@@ -0,0 +1,284 @@
+import bisect
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from flask import g, has_request_context
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, User, Movie, user_movies
+from .sqlite_data_manager import SQLiteDataManager, DatabaseError, UserNotFoundError, MovieNotFoundError
+from . import versions
+
+
+class MovieRecord:
+    __slots__ = ("id", "name", "director", "year", "rating", "poster")
+
+    def __init__(self, id, name, director, year, rating, poster):
+        self.id = id
+        self.name = name
+        self.director = director
+        self.year = year
+        self.rating = rating
+        self.poster = poster
+
+    def as_dict(self, fields: Optional[Sequence[str]] = None) -> Dict:
+        if fields:
+            return {field: getattr(self, field) for field in fields}
+        return {"id": self.id, "name": self.name, "director": self.director,
+                "year": self.year, "rating": self.rating, "poster": self.poster}
+
+
+class UserRecord:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def as_dict(self) -> Dict:
+        return {"id": self.id, "name": self.name}
+
+
+class _Snapshot:
+    """Users, movies and links as of one value of the "all" version"""
+    __slots__ = ("version", "movies", "movie_ids", "users", "user_ids", "user_movies", "movie_users")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.movies: Dict[int, MovieRecord] = {}
+        self.movie_ids: List[int] = []  # sorted, for pages and keyset seeks
+        self.users: Dict[int, UserRecord] = {}
+        self.user_ids: List[int] = []
+        self.user_movies: Dict[int, List[int]] = {}  # user id -> sorted movie ids
+        self.movie_users: Dict[int, set] = {}  # movie id -> user ids, to unlink deleted movies
+
+
+def _insort(ids: List[int], value: int) -> None:
+    index = bisect.bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        ids.insert(index, value)
+
+
+def _remove(ids: List[int], value: int) -> None:
+    index = bisect.bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+
+
+class InMemoryDataManager(SQLiteDataManager):
+    """
+    SQLiteDataManager that serves reads from an in-memory copy of the users,
+    movies and user lists. Writes go through to SQLite unchanged (write-through),
+    and search still uses the FTS index.
+
+    The copy is checked against the "all" data version at most once per request.
+    Our own commits are applied row by row from the write events; if the version
+    moved further than our own writes account for, another worker wrote and the
+    copy is reloaded.
+    """
+
+    def __init__(self, app=None):
+        self._snapshot: Optional[_Snapshot] = None
+        self._own_bumps = 0  # "all" bumps committed by this process since the last sync
+        self._pending: List[Tuple[str, Dict]] = []  # our write events since the last sync
+        self._lock = threading.RLock()
+        self.reloads = 0
+        super().__init__(app)
+        self.subscribe(self._on_write)
+
+    def _dispatch_events(self, session) -> None:
+        # Count the bumps and queue the events together, so a concurrent sync sees both or neither
+        with self._lock:
+            self._own_bumps += session.info.get('version_bumps', {}).get(versions.ALL, 0)
+            super()._dispatch_events(session)
+
+    def _on_write(self, event: str, data: Dict) -> None:
+        if event == 'versions_bumped':
+            return  # already counted in _dispatch_events
+        with self._lock:
+            self._pending.append((event, data))
+
+    def _load(self) -> _Snapshot:
+        # One explicit read transaction, so the version and all three tables come from
+        # the same snapshot; pysqlite would otherwise run each SELECT on its own
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql("BEGIN")
+            snapshot = _Snapshot(versions.get_version(connection, versions.ALL)[0])
+            for row in connection.execute(select(*self._movie_columns()).order_by(Movie.id)):
+                snapshot.movies[row[0]] = MovieRecord(*row)
+                snapshot.movie_ids.append(row[0])
+            for user_id, name in connection.execute(select(User.id, User.name).order_by(User.id)):
+                snapshot.users[user_id] = UserRecord(user_id, name)
+                snapshot.user_ids.append(user_id)
+                snapshot.user_movies[user_id] = []
+            links = select(user_movies.c.user_id, user_movies.c.movie_id).order_by(user_movies.c.movie_id)
+            for user_id, movie_id in connection.execute(links):
+                snapshot.user_movies.setdefault(user_id, []).append(movie_id)
+                snapshot.movie_users.setdefault(movie_id, set()).add(user_id)
+        return snapshot
+
+    def _reload_movies(self, snapshot: _Snapshot, movie_ids: set) -> None:
+        rows = self._select_in(lambda chunk: select(*self._movie_columns()).where(Movie.id.in_(chunk)),
+                               sorted(movie_ids))
+        found = set()
+        for row in rows:
+            if row[0] not in snapshot.movies:
+                _insort(snapshot.movie_ids, row[0])
+            snapshot.movies[row[0]] = MovieRecord(*row)
+            found.add(row[0])
+        for movie_id in movie_ids - found:
+            self._drop_movie(snapshot, movie_id)
+
+    @staticmethod
+    def _drop_movie(snapshot: _Snapshot, movie_id: int) -> None:
+        if snapshot.movies.pop(movie_id, None) is not None:
+            _remove(snapshot.movie_ids, movie_id)
+        for user_id in snapshot.movie_users.pop(movie_id, ()):
+            _remove(snapshot.user_movies.get(user_id, []), movie_id)
+
+    def _apply(self, snapshot: _Snapshot, events: List[Tuple[str, Dict]]) -> bool:
+        """Apply our own write events; False if they need a full reload instead"""
+        dirty = set()
+        for event, data in events:
+            if event == 'catalog_changed':
+                return False
+            if event == 'movie_saved':
+                dirty.add(data['id'])
+            elif event == 'movie_deleted':
+                dirty.discard(data['id'])
+                self._drop_movie(snapshot, data['id'])
+            elif event == 'user_added':
+                snapshot.users[data['id']] = UserRecord(data['id'], data['name'])
+                _insort(snapshot.user_ids, data['id'])
+                snapshot.user_movies.setdefault(data['id'], [])
+            elif event == 'user_movie_added':
+                _insort(snapshot.user_movies.setdefault(data['user_id'], []), data['movie_id'])
+                snapshot.movie_users.setdefault(data['movie_id'], set()).add(data['user_id'])
+                dirty.add(data['movie_id'])
+            elif event == 'user_movie_removed':
+                _remove(snapshot.user_movies.get(data['user_id'], []), data['movie_id'])
+                snapshot.movie_users.get(data['movie_id'], set()).discard(data['user_id'])
+        if dirty:
+            self._reload_movies(snapshot, dirty)
+        return True
+
+    def _sync(self) -> _Snapshot:
+        """The up-to-date snapshot; hits the database at most once per request unless we wrote"""
+        if has_request_context() and g.get('memory_synced') and not self._pending:
+            return self._snapshot
+        try:
+            version = versions.get_version(db.session, versions.ALL)[0]
+            with self._lock:
+                snapshot = self._snapshot
+                events, self._pending = self._pending, []
+                if (snapshot is None or version != snapshot.version + self._own_bumps
+                        or not self._apply(snapshot, events)):
+                    snapshot = self._snapshot = self._load()
+                    self.reloads += 1
+                else:
+                    snapshot.version = version
+                self._own_bumps = 0
+        except SQLAlchemyError as e:
+            self._snapshot = None
+            raise DatabaseError(f"Database error: {str(e)}")
+        if has_request_context():
+            g.memory_synced = True
+        return snapshot
+
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            user = snapshot.users.get(user_id)
+            if user:
+                return user.as_dict()
+        raise UserNotFoundError(f"User with ID {user_id} not found")
+
+    def get_movie(self, movie_id: int) -> Optional[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            movie = snapshot.movies.get(movie_id)
+            if movie:
+                return movie.as_dict()
+        raise MovieNotFoundError(f"Movie with ID {movie_id} not found")
+
+    def get_all_movies(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            return [snapshot.movies[movie_id].as_dict(fields)
+                    for movie_id in snapshot.movie_ids if movie_id in snapshot.movies]
+
+    def get_movies_page(self, page: int, per_page: int, after_id: Optional[int] = None,
+                        before_id: Optional[int] = None) -> Dict:
+        snapshot = self._sync()
+        with self._lock:
+            if after_id is not None:
+                start = bisect.bisect_right(snapshot.movie_ids, after_id)
+                first_page = False
+            elif before_id is not None:
+                # A page or less before the cursor: that's the first page
+                start = max(bisect.bisect_left(snapshot.movie_ids, before_id) - per_page, 0)
+                first_page = start == 0
+            else:
+                start = (max(page, 1) - 1) * per_page
+                first_page = start == 0
+            ids = snapshot.movie_ids[start:start + per_page]
+            return {
+                "movies": [snapshot.movies[movie_id].as_dict() for movie_id in ids if movie_id in snapshot.movies],
+                "total": len(snapshot.movie_ids),
+                "prev_before_id": ids[0] if ids and not first_page else None,
+                "next_after_id": ids[-1] if len(ids) == per_page else None
+            }
+
+    def get_all_users(self) -> List[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            return [snapshot.users[user_id].as_dict() for user_id in snapshot.user_ids]
+
+    def get_user_with_movies(self, user_id: int) -> Optional[Tuple[Dict, List[Dict]]]:
+        snapshot = self._sync()
+        with self._lock:
+            user = snapshot.users.get(user_id)
+            if user is None:
+                return None
+            return user.as_dict(), [snapshot.movies[movie_id].as_dict()
+                                    for movie_id in snapshot.user_movies.get(user_id, [])
+                                    if movie_id in snapshot.movies]
+
+    def get_user_movies(self, user_id: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            if user_id not in snapshot.users:
+                raise UserNotFoundError(f"User with ID {user_id} not found")
+            return [snapshot.movies[movie_id].as_dict(fields)
+                    for movie_id in snapshot.user_movies.get(user_id, []) if movie_id in snapshot.movies]
+
+    def get_user_and_movie(self, user_id: int, movie_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
+        snapshot = self._sync()
+        with self._lock:
+            user = snapshot.users.get(user_id)
+            if user is None:
+                return None, None
+            movie = snapshot.movies.get(movie_id) if user_id in snapshot.movie_users.get(movie_id, ()) else None
+            return user.as_dict(), movie.as_dict() if movie else None
+
+    def _iter_movies(self, snapshot: _Snapshot, movie_ids: List[int], batch_size: int,
+                     fields: Optional[Sequence[str]]) -> Iterator[Dict]:
+        # Copy the ids batch by batch, so the lock isn't held while the caller consumes
+        for start in range(0, len(movie_ids), batch_size):
+            with self._lock:
+                batch = [snapshot.movies[movie_id].as_dict(fields)
+                         for movie_id in movie_ids[start:start + batch_size] if movie_id in snapshot.movies]
+            yield from batch
+
+    def iter_all_movies(self, batch_size: int = 1000, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        snapshot = self._sync()
+        with self._lock:
+            movie_ids = list(snapshot.movie_ids)
+        return self._iter_movies(snapshot, movie_ids, batch_size, fields)
+
+    def iter_user_movies(self, user_id: int, batch_size: int = 1000,
+                         fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        self.get_user(user_id)
+        snapshot = self._snapshot
+        with self._lock:
+            movie_ids = list(snapshot.user_movies.get(user_id, []))
+        return self._iter_movies(snapshot, movie_ids, batch_size, fields)
@@ -0,0 +1,118 @@
+from sqlalchemy import text
+from . import stats
+
+# Ordered schema migrations. The version applied last is stamped into
+# PRAGMA user_version, so each migration runs exactly once per database file.
+# Version 0 is the original schema as created by db.create_all().
+# Steps must be idempotent: on a fresh database create_all() has already
+# built the current models, and the migration only stamps the version.
+# A step is either an SQL string or a callable taking the connection.
+
+
+def add_column(table: str, column: str, ddl: str):
+    """Migration step adding a column unless the table already has it"""
+    def step(connection):
+        columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({table})"))]
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return step
+
+
+MIGRATIONS = [
+    (1, "secondary indexes on movie and reverse index on user_movies", [
+        "CREATE INDEX IF NOT EXISTS ix_movie_name_nocase ON movie (name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS ix_movie_director ON movie (director)",
+        "CREATE INDEX IF NOT EXISTS ix_movie_year ON movie (year)",
+        "CREATE INDEX IF NOT EXISTS ix_user_movies_movie_user ON user_movies (movie_id, user_id)",
+        "ANALYZE",
+    ]),
+    (2, "imdb_id on movie for canonical, deduplicated movie records", [
+        add_column("movie", "imdb_id", "VARCHAR(20)"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_movie_imdb_id ON movie (imdb_id)",
+    ]),
+    (3, "data_version counters for ETags and cache invalidation", [
+        """CREATE TABLE IF NOT EXISTS data_version (
+            scope VARCHAR(50) NOT NULL PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at FLOAT
+        )""",
+    ]),
+    (4, "enrichment job queue and metadata timestamps for background OMDB enrichment", [
+        add_column("movie", "metadata_updated_at", "FLOAT"),
+        """CREATE TABLE IF NOT EXISTS enrichment_job (
+            id INTEGER NOT NULL PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL,
+            movie_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INTEGER NOT NULL,
+            run_after FLOAT NOT NULL,
+            locked_until FLOAT,
+            last_error VARCHAR(500)
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_enrichment_job_kind_movie ON enrichment_job (kind, movie_id)",
+        "CREATE INDEX IF NOT EXISTS ix_enrichment_job_due ON enrichment_job (status, run_after)",
+    ]),
+    (5, "summary tables and triggers for catalog and user statistics", [
+        stats.create_stats,
+        stats.rebuild,
+    ]),
+    (6, "precomputed similar movies and per-user recommendations", [
+        """CREATE TABLE IF NOT EXISTS movie_similarity (
+            movie_id INTEGER NOT NULL,
+            similar_id INTEGER NOT NULL,
+            score FLOAT NOT NULL,
+            common INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, similar_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS user_recommendation (
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            score FLOAT NOT NULL,
+            PRIMARY KEY (user_id, movie_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS similarity_build (
+            built_at FLOAT NOT NULL PRIMARY KEY,
+            source_version INTEGER NOT NULL,
+            engine VARCHAR(20) NOT NULL,
+            users INTEGER NOT NULL,
+            movies INTEGER NOT NULL,
+            pairs INTEGER NOT NULL,
+            recommendations INTEGER NOT NULL,
+            seconds FLOAT NOT NULL
+        )""",
+    ]),
+    (7, "leases so one worker at a time runs the periodic similarity rebuild", [
+        """CREATE TABLE IF NOT EXISTS maintenance_lease (
+            name VARCHAR(50) NOT NULL PRIMARY KEY,
+            holder VARCHAR(50) NOT NULL,
+            locked_until FLOAT NOT NULL
+        )""",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection) -> int:
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def migrate(connection) -> list:
+    """
+    Apply all pending migrations inside the caller's transaction.
+    Returns the list of (version, description) tuples that were applied.
+    """
+    current = get_schema_version(connection)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        for step in steps:
+            if callable(step):
+                step(connection)
+            else:
+                connection.execute(text(step))
+        # PRAGMA doesn't accept bound parameters; version is an int from the list above
+        connection.execute(text(f"PRAGMA user_version = {int(version)}"))
+        applied.append((version, description))
+    return applied
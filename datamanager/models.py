@@ -9,16 +9,98 @@ class User(db.Model):
     movies = db.relationship('Movie', secondary='user_movies', back_populates='users')
 
 class Movie(db.Model):
+    __table_args__ = (
+        # Case-folded index for name lookups, sorting and prefix LIKE
+        db.Index('ix_movie_name_nocase', db.text('name COLLATE NOCASE')),
+        db.Index('ix_movie_director', 'director'),
+        db.Index('ix_movie_year', 'year'),
+        # One canonical row per film; NULLs (movies entered by hand) are not constrained
+        db.Index('ux_movie_imdb_id', 'imdb_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     director = db.Column(db.String(100), nullable=False)
     year = db.Column(db.Integer, nullable=False)
     rating = db.Column(db.Float, nullable=False)
     poster = db.Column(db.String(500), nullable=True)  # URL to movie poster
+    imdb_id = db.Column(db.String(20), nullable=True)  # e.g. "tt0133093", from OMDB
+    metadata_updated_at = db.Column(db.Float, nullable=True)  # last time details came from OMDB
     users = db.relationship('User', secondary='user_movies', back_populates='movies')
 
 # Association table for the many-to-many relationship
 user_movies = db.Table('user_movies',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id'), primary_key=True)
+    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id'), primary_key=True),
+    # The primary key serves user -> movies; this one serves movie -> users
+    db.Index('ix_user_movies_movie_user', 'movie_id', 'user_id')
+)
+
+# Version counters per data scope (see datamanager/versions.py)
+data_version = db.Table('data_version',
+    db.Column('scope', db.String(50), primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0),
+    db.Column('updated_at', db.Float, nullable=True)
+)
+
+# Persistent queue of background enrichment jobs (see datamanager/jobs.py)
+enrichment_job = db.Table('enrichment_job',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('kind', db.String(20), nullable=False),
+    db.Column('movie_id', db.Integer, nullable=False),
+    db.Column('status', db.String(20), nullable=False, default='pending'),
+    db.Column('attempts', db.Integer, nullable=False, default=0),
+    db.Column('run_after', db.Float, nullable=False),
+    db.Column('locked_until', db.Float, nullable=True),
+    db.Column('last_error', db.String(500), nullable=True),
+    db.Index('ux_enrichment_job_kind_movie', 'kind', 'movie_id', unique=True),
+    db.Index('ix_enrichment_job_due', 'status', 'run_after')
+)
+
+# Summary tables for the statistics endpoints, kept up to date by triggers (see datamanager/stats.py)
+movie_stats = db.Table('movie_stats',
+    db.Column('dimension', db.String(20), primary_key=True),
+    db.Column('bucket', db.String(100), primary_key=True),
+    db.Column('movies', db.Integer, nullable=False),
+    db.Column('rated', db.Integer, nullable=False),
+    db.Column('rating_sum', db.Float, nullable=False)
+)
+
+user_stats = db.Table('user_stats',
+    db.Column('user_id', db.Integer, primary_key=True),
+    db.Column('movies', db.Integer, nullable=False),
+    db.Column('rated', db.Integer, nullable=False),
+    db.Column('rating_sum', db.Float, nullable=False)
+)
+
+# Precomputed recommendations, rebuilt from user_movies (see datamanager/similarity.py)
+movie_similarity = db.Table('movie_similarity',
+    db.Column('movie_id', db.Integer, primary_key=True),
+    db.Column('similar_id', db.Integer, primary_key=True),
+    db.Column('score', db.Float, nullable=False),
+    db.Column('common', db.Integer, nullable=False)
+)
+
+user_recommendation = db.Table('user_recommendation',
+    db.Column('user_id', db.Integer, primary_key=True),
+    db.Column('movie_id', db.Integer, primary_key=True),
+    db.Column('score', db.Float, nullable=False)
+)
+
+similarity_build = db.Table('similarity_build',
+    db.Column('built_at', db.Float, primary_key=True),
+    db.Column('source_version', db.Integer, nullable=False),  # "all" data version the build saw
+    db.Column('engine', db.String(20), nullable=False),
+    db.Column('users', db.Integer, nullable=False),
+    db.Column('movies', db.Integer, nullable=False),
+    db.Column('pairs', db.Integer, nullable=False),
+    db.Column('recommendations', db.Integer, nullable=False),
+    db.Column('seconds', db.Float, nullable=False)
+)
+
+# Leases on periodic maintenance tasks shared by all workers (see similarity.claim_build)
+maintenance_lease = db.Table('maintenance_lease',
+    db.Column('name', db.String(50), primary_key=True),
+    db.Column('holder', db.String(50), nullable=False),
+    db.Column('locked_until', db.Float, nullable=False)
 )
@@ -0,0 +1,204 @@
+import heapq
+import math
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import text
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # NumPy/SciPy are optional; without them the pure-Python path is used
+    np = None
+    sparse = None
+
+# "Users who saved this also saved..." from the user_movies table.
+# Two movies are similar when the same users have both in their lists:
+#     score(a, b) = common(a, b) / sqrt(users(a) * users(b))
+# (cosine similarity of the movies' user vectors). The top_k neighbours of each
+# movie are stored in movie_similarity, and the best suggestions per user (sum
+# of the scores of the neighbours of their movies) in user_recommendation, so
+# serving either is a single indexed read of at most k rows. Both are rebuilt
+# together in one transaction; readers keep seeing the previous build until it commits.
+Neighbours = Dict[int, List[Tuple[int, float, int]]]  # movie id -> [(similar id, score, common users)]
+
+# Every worker's refresher may find the tables stale at the same moment; only the one
+# holding this lease rebuilds. A lease that is not released (the worker died) runs out
+# after BUILD_LEASE_SECONDS, like the enrichment jobs' leases.
+BUILD_LEASE = "similarity_build"
+BUILD_LEASE_SECONDS = 15 * 60
+
+
+def _load_lists(connection) -> Dict[int, List[int]]:
+    lists: Dict[int, List[int]] = {}
+    for user_id, movie_id in connection.execute(
+            text("SELECT user_id, movie_id FROM user_movies ORDER BY user_id, movie_id")):
+        lists.setdefault(user_id, []).append(movie_id)
+    return lists
+
+
+def _top(candidates: Iterable[Tuple[int, float, int]], top_k: int) -> List[Tuple[int, float, int]]:
+    # Best score first, ties by movie id, so both engines return the same neighbours
+    return heapq.nsmallest(top_k, candidates, key=lambda item: (-item[1], item[0]))
+
+
+def neighbours_python(user_lists: Dict[int, List[int]], top_k: int, min_common: int) -> Neighbours:
+    """Top-k neighbours per movie; the work is the sum of the squared list lengths"""
+    movie_users: Dict[int, List[int]] = {}
+    for user_id, movies in user_lists.items():
+        for movie_id in movies:
+            movie_users.setdefault(movie_id, []).append(user_id)
+
+    result: Neighbours = {}
+    for movie_id, users in movie_users.items():
+        common = Counter()
+        for user_id in users:
+            common.update(user_lists[user_id])
+        del common[movie_id]
+        users_a = len(users)
+        result[movie_id] = _top(((other, count / math.sqrt(users_a * len(movie_users[other])), count)
+                                 for other, count in common.items() if count >= min_common), top_k)
+    return result
+
+
+def neighbours_numpy(user_lists: Dict[int, List[int]], top_k: int, min_common: int) -> Neighbours:
+    """Same result as neighbours_python, from a sparse user x movie matrix product"""
+    user_index = np.repeat(np.arange(len(user_lists)), [len(movies) for movies in user_lists.values()])
+    movie_ids, movie_index = np.unique(np.fromiter((movie_id for movies in user_lists.values() for movie_id in movies),
+                                                   dtype=np.int64, count=len(user_index)), return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(user_index), dtype=np.int64), (user_index, movie_index)),
+                               shape=(len(user_lists), len(movie_ids)))
+    users = np.asarray(matrix.sum(axis=0)).ravel()
+
+    common = (matrix.T @ matrix).tocoo()
+    keep = (common.row != common.col) & (common.data >= min_common)
+    rows, cols, counts = common.row[keep], common.col[keep], common.data[keep]
+    scores = counts / np.sqrt((users[rows] * users[cols]).astype(np.float64))
+
+    # Sort by movie, best score first, ties by neighbour id; then keep the first top_k of each movie
+    order = np.lexsort((movie_ids[cols], -scores, rows))
+    rows, cols, counts, scores = rows[order], cols[order], counts[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < top_k
+    rows, cols, counts, scores = rows[keep], cols[keep], counts[keep], scores[keep]
+
+    result: Neighbours = {int(movie_id): [] for movie_id in movie_ids}
+    for row, col, score, count in zip(movie_ids[rows].tolist(), movie_ids[cols].tolist(),
+                                      scores.tolist(), counts.tolist()):
+        result[row].append((col, score, count))
+    return result
+
+
+def recommendations(user_lists: Dict[int, List[int]], neighbours: Neighbours,
+                    per_user: int) -> Dict[int, List[Tuple[int, float]]]:
+    """Best movies per user that aren't in their list, scored by summed similarity"""
+    result = {}
+    for user_id, movies in user_lists.items():
+        owned = set(movies)
+        scores: Dict[int, float] = {}
+        for movie_id in movies:
+            for other, score, _ in neighbours.get(movie_id, ()):
+                if other not in owned:
+                    scores[other] = scores.get(other, 0.0) + score
+        result[user_id] = heapq.nsmallest(per_user, scores.items(), key=lambda item: (-item[1], item[0]))
+    return result
+
+
+def rebuild(connection, top_k: int = 20, min_common: int = 1, per_user: int = 20,
+            source_version: int = 0, use_numpy: Optional[bool] = None) -> Dict:
+    """
+    Recompute both tables from user_movies in the caller's transaction.
+    use_numpy defaults to whether NumPy/SciPy are installed.
+    Returns a report of the build, which is also stored in similarity_build.
+    """
+    start = time.perf_counter()
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    user_lists = _load_lists(connection)
+    if use_numpy and user_lists:
+        neighbours = neighbours_numpy(user_lists, top_k, min_common)
+    else:
+        neighbours = neighbours_python(user_lists, top_k, min_common)
+    suggestions = recommendations(user_lists, neighbours, per_user)
+
+    connection.execute(text("DELETE FROM movie_similarity"))
+    connection.execute(text("DELETE FROM user_recommendation"))
+    pairs = [{"movie_id": movie_id, "similar_id": other, "score": score, "common": count}
+             for movie_id, items in neighbours.items() for other, score, count in items]
+    if pairs:
+        connection.execute(text("""
+            INSERT INTO movie_similarity (movie_id, similar_id, score, common)
+            VALUES (:movie_id, :similar_id, :score, :common)
+        """), pairs)
+    picks = [{"user_id": user_id, "movie_id": movie_id, "score": score}
+             for user_id, items in suggestions.items() for movie_id, score in items]
+    if picks:
+        connection.execute(text("""
+            INSERT INTO user_recommendation (user_id, movie_id, score) VALUES (:user_id, :movie_id, :score)
+        """), picks)
+
+    report = {
+        "built_at": time.time(),
+        "source_version": source_version,
+        "engine": "numpy" if use_numpy and user_lists else "python",
+        "users": len(user_lists),
+        "movies": len(neighbours),
+        "pairs": len(pairs),
+        "recommendations": len(picks),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    connection.execute(text("DELETE FROM similarity_build"))
+    connection.execute(text("""
+        INSERT INTO similarity_build (built_at, source_version, engine, users, movies, pairs, recommendations, seconds)
+        VALUES (:built_at, :source_version, :engine, :users, :movies, :pairs, :recommendations, :seconds)
+    """), report)
+    return report
+
+
+def claim_build(connection, lease_seconds: float = BUILD_LEASE_SECONDS) -> Optional[str]:
+    """Take the build lease unless another worker holds it; returns the holder token to release it with, or None"""
+    holder = uuid.uuid4().hex
+    now = time.time()
+    claimed = connection.execute(text("""
+        INSERT INTO maintenance_lease (name, holder, locked_until) VALUES (:name, :holder, :until)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, locked_until = excluded.locked_until
+        WHERE maintenance_lease.locked_until < :now
+    """), {"name": BUILD_LEASE, "holder": holder, "until": now + lease_seconds, "now": now}).rowcount
+    return holder if claimed else None
+
+
+def release_build(connection, holder: str) -> None:
+    connection.execute(text("DELETE FROM maintenance_lease WHERE name = :name AND holder = :holder"),
+                       {"name": BUILD_LEASE, "holder": holder})
+
+
+def last_build(connection) -> Optional[Dict]:
+    row = connection.execute(text("SELECT * FROM similarity_build")).mappings().first()
+    return dict(row) if row else None
+
+
+_MOVIE_COLUMNS = "movie.id, movie.name, movie.director, movie.year, movie.rating, movie.poster"
+
+
+def similar(connection, movie_id: int, limit: int) -> List[Dict]:
+    rows = connection.execute(text(f"""
+        SELECT {_MOVIE_COLUMNS}, movie_similarity.score, movie_similarity.common
+        FROM movie_similarity JOIN movie ON movie.id = movie_similarity.similar_id
+        WHERE movie_similarity.movie_id = :movie_id
+        ORDER BY movie_similarity.score DESC, movie_similarity.similar_id
+        LIMIT :limit
+    """), {"movie_id": movie_id, "limit": limit}).mappings()
+    return [dict(row) for row in rows]
+
+
+def for_user(connection, user_id: int, limit: int) -> List[Dict]:
+    # Movies the user added since the last build are left out
+    rows = connection.execute(text(f"""
+        SELECT {_MOVIE_COLUMNS}, user_recommendation.score
+        FROM user_recommendation JOIN movie ON movie.id = user_recommendation.movie_id
+        WHERE user_recommendation.user_id = :user_id
+          AND user_recommendation.movie_id NOT IN (SELECT movie_id FROM user_movies WHERE user_id = :user_id)
+        ORDER BY user_recommendation.score DESC, user_recommendation.movie_id
+        LIMIT :limit
+    """), {"user_id": user_id, "limit": limit}).mappings()
+    return [dict(row) for row in rows]
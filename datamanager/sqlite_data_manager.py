@@ -1,8 +1,23 @@
-from typing import List, Optional, Dict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Dict, Sequence, Tuple
 from .data_manager_interface import DataManagerInterface
-from .models import db, User, Movie
+from .models import db, User, Movie, user_movies
+from .engine import apply_sqlite_pragmas, sqlite_pragmas
+from .migrations import SCHEMA_VERSION, get_schema_version, migrate
+from . import jobs, similarity, stats, versions
+from .fts import build_match_query, create_movie_fts, fts5_available, MOVIE_FTS_COUNT, MOVIE_FTS_SEARCH, MOVIE_FTS_TABLE
+import logging
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, event, func, insert, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
 
+logger = logging.getLogger(__name__)
+
+# Keys of a movie dict, in order; ?fields= projections pick from these
+MOVIE_FIELDS = ("id", "name", "director", "year", "rating", "poster")
+
 class DatabaseError(Exception):
     """Base class for database errors"""
     pass
@@ -17,22 +32,205 @@ class MovieNotFoundError(DatabaseError):
 
 class SQLiteDataManager(DataManagerInterface):
     def __init__(self, app=None):
+        # Set by init_app once we know whether SQLite was built with FTS5
+        self.fts_enabled = False
+        self.app = None
+        self._listeners = []
         if app is not None:
             self.init_app(app)
 
+    @staticmethod
+    def _movie_to_dict(movie) -> Dict:
+        """Build a movie dict from a Movie object or a Core row with the movie columns"""
+        return {
+            "id": movie.id,
+            "name": movie.name,
+            "director": movie.director,
+            "year": movie.year,
+            "rating": movie.rating,
+            "poster": movie.poster
+        }
+
+    def _paginate_movies(self, criteria: list, page: int, per_page: int,
+                         after_id: Optional[int] = None, before_id: Optional[int] = None) -> Dict:
+        """Run a LIMIT/OFFSET query for one page of movies, or a keyset query if after_id (next
+        page) or before_id (previous page) is given. Only the requested page is loaded; the
+        total comes from a separate COUNT query. prev_before_id is None on the first page."""
+        total = db.session.query(func.count(Movie.id)).filter(*criteria).scalar()
+
+        query = Movie.query.filter(*criteria)
+        if after_id is not None:
+            # Keyset pagination: seek by primary key instead of skipping rows
+            movies = query.filter(Movie.id > after_id).order_by(Movie.id).limit(per_page).all()
+            first_page = False
+        elif before_id is not None:
+            # Seek backwards, one row further to tell whether this is the first page
+            movies = query.filter(Movie.id < before_id).order_by(Movie.id.desc()).limit(per_page + 1).all()
+            first_page = len(movies) <= per_page
+            if first_page:
+                movies = query.order_by(Movie.id).limit(per_page).all()
+            else:
+                movies = movies[per_page - 1::-1]
+        else:
+            offset = (max(page, 1) - 1) * per_page
+            movies = query.order_by(Movie.id).offset(offset).limit(per_page).all()
+            first_page = offset == 0
+
+        return {
+            "movies": [self._movie_to_dict(movie) for movie in movies],
+            "total": total,
+            "prev_before_id": movies[0].id if movies and not first_page else None,
+            "next_after_id": movies[-1].id if len(movies) == per_page else None
+        }
+
+    def _fts_search_movies(self, search_query: str, page: int, per_page: Optional[int]) -> Dict:
+        """Ranked, prefix-aware search over movie name and director using the FTS5 index"""
+        match = build_match_query(search_query)
+        if match is None:
+            return {"movies": [], "total": 0, "prev_before_id": None, "next_after_id": None}
+
+        total = db.session.execute(text(MOVIE_FTS_COUNT), {"match": match}).scalar()
+        rows = db.session.execute(text(MOVIE_FTS_SEARCH), {
+            "match": match,
+            "limit": per_page if per_page is not None else -1,
+            "offset": (max(page, 1) - 1) * per_page if per_page is not None else 0
+        }).mappings()
+
+        # Results are ordered by relevance, so there is no ID cursor to hand out
+        return {"movies": [dict(row) for row in rows], "total": total, "prev_before_id": None, "next_after_id": None}
+
+    @staticmethod
+    def _movie_columns(fields: Optional[Sequence[str]] = None):
+        """The movie columns to SELECT, all of them or only the given fields"""
+        return tuple(getattr(Movie, field) for field in (fields or MOVIE_FIELDS))
+
+    @staticmethod
+    def _stream_rows(statement, batch_size: int) -> Iterator[Dict]:
+        """Run a Core SELECT with a server-side cursor, yielding plain dicts batch by batch"""
+        try:
+            result = db.session.execute(statement.execution_options(yield_per=batch_size))
+            keys = list(result.keys())
+            for row in result:
+                yield dict(zip(keys, row))
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
     def init_app(self, app):
-        """Initialize the data manager with the Flask app"""
+        """
+        Initialize the data manager with the Flask app.
+        The schema is only created or migrated when the database's stamped
+        version (PRAGMA user_version) is behind SCHEMA_VERSION; an up-to-date
+        database costs two small queries instead of create_all() and the FTS setup.
+        """
+        self.app = app
+        # Write events are delivered by listeners on db.session's factory. All apps
+        # share it, so each manager only handles commits of its own app's sessions
+        event.listen(db.session, 'after_commit', self._on_commit)
+        event.listen(db.session, 'after_rollback', self._on_rollback)
         try:
             with app.app_context():
+                apply_sqlite_pragmas(db.engine, sqlite_pragmas(
+                    app.config.get('SQLITE_PROFILE', 'wal'),
+                    app.config.get('SQLITE_PRAGMAS')
+                ))
+                with db.engine.begin() as connection:
+                    if get_schema_version(connection) >= SCHEMA_VERSION and connection.execute(
+                            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                            {"name": MOVIE_FTS_TABLE}).first():
+                        self.fts_enabled = True
+                        return
                 db.create_all()
+                with db.engine.begin() as connection:
+                    for version, description in migrate(connection):
+                        app.logger.info(f"Applied schema migration {version}: {description}")
+                    if fts5_available(connection):
+                        create_movie_fts(connection)
+                        self.fts_enabled = True
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error initializing database: {str(e)}")
 
+    @contextmanager
+    def group_commit(self):
+        """
+        Group several write calls into a single transaction and commit.
+        Inside the block the write methods only flush; the commit (one fsync)
+        happens when the outermost block exits, or everything is rolled back on error.
+        """
+        depth = db.session.info.get('group_commit_depth', 0)
+        db.session.info['group_commit_depth'] = depth + 1
+        try:
+            yield
+            if depth == 0:
+                db.session.commit()
+        except Exception:
+            if depth == 0:
+                db.session.rollback()
+            raise
+        finally:
+            db.session.info['group_commit_depth'] = depth
+
+    def _commit(self):
+        if db.session.info.get('group_commit_depth'):
+            db.session.flush()
+        else:
+            db.session.commit()
+
+    def subscribe(self, callback) -> None:
+        """
+        Register callback(event, data) for write events ("movie_saved", "movie_deleted",
+        "catalog_changed", "user_added", "user_movie_added", "user_movie_removed",
+        "enrichment_queued"), and last "versions_bumped" with the number of bumps per
+        data version scope the transaction made (see versions.bump).
+        Events are delivered after the transaction that caused them commits.
+        """
+        self._listeners.append(callback)
+
+    def close(self) -> None:
+        """Remove the session listeners added by init_app, e.g. when the app is torn down"""
+        for name, listener in (('after_commit', self._on_commit), ('after_rollback', self._on_rollback)):
+            if event.contains(db.session, name, listener):
+                event.remove(db.session, name, listener)
+
+    def _owns(self, session) -> bool:
+        # db.session is scoped to the app context, so the committing session is the current app's
+        return self.app is not None and has_app_context() and current_app._get_current_object() is self.app
+
+    def _on_commit(self, session) -> None:
+        if self._owns(session):
+            self._dispatch_events(session)
+
+    def _on_rollback(self, session) -> None:
+        if self._owns(session):
+            self._discard_events(session)
+
+    def _notify(self, event_name: str, **data) -> None:
+        db.session.info.setdefault('pending_events', []).append((event_name, data))
+
+    def _dispatch_events(self, session) -> None:
+        events = session.info.pop('pending_events', [])
+        bumps = session.info.pop('version_bumps', None)
+        if bumps:
+            events.append(('versions_bumped', bumps))
+        for event_name, data in events:
+            for callback in self._listeners:
+                try:
+                    callback(event_name, data)
+                except Exception:
+                    logger.exception("Listener failed for %s event", event_name)
+
+    @staticmethod
+    def _discard_events(session) -> None:
+        session.info.pop('pending_events', None)
+        session.info.pop('version_bumps', None)
+
     def add_user(self, name: str) -> int:
         try:
             user = User(name=name)
             db.session.add(user)
-            db.session.commit()
+            versions.bump(db.session, versions.USERS)
+            db.session.flush()
+            self._notify('user_added', id=user.id, name=name)
+            self._commit()
             return user.id
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -40,18 +238,50 @@ class SQLiteDataManager(DataManagerInterface):
 
     def get_user(self, user_id: int) -> Optional[Dict]:
         try:
-            user = User.query.get(user_id)
+            user = db.session.execute(
+                select(User.id, User.name).where(User.id == user_id)
+            ).mappings().first()
             if user:
-                return {"id": user.id, "name": user.name}
+                return dict(user)
             raise UserNotFoundError(f"User with ID {user_id} not found")
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
 
-    def add_movie(self, name: str, director: str, year: int, rating: float, poster: str = None) -> int:
+    def add_movie(self, name: str, director: str, year: int, rating: float,
+                  poster: str = None, imdb_id: str = None) -> int:
         try:
-            movie = Movie(name=name, director=director, year=year, rating=rating, poster=poster)
-            db.session.add(movie)
-            db.session.commit()
+            if not imdb_id:
+                movie = Movie(name=name, director=director, year=year, rating=rating, poster=poster)
+                db.session.add(movie)
+                versions.bump(db.session, versions.CATALOG)
+                db.session.flush()
+                self._notify('movie_saved', id=movie.id, name=name, director=director, rating=rating)
+                if jobs.needs_enrichment(director, year, rating, poster):
+                    jobs.enqueue(db.session, jobs.ENRICH, [movie.id])
+                    self._notify('enrichment_queued')
+                self._commit()
+                return movie.id
+
+            # Upsert onto the canonical record: the no-op DO UPDATE makes RETURNING
+            # hand back the existing row on conflict, all in one statement
+            statement = sqlite_insert(Movie.__table__).values(
+                name=name, director=director, year=year, rating=rating, poster=poster, imdb_id=imdb_id,
+                metadata_updated_at=time.time()  # details with an imdb_id come from OMDB
+            )
+            columns = Movie.__table__.c
+            movie = db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[Movie.imdb_id],
+                    set_={"imdb_id": statement.excluded.imdb_id}
+                ).returning(columns.id, columns.name, columns.director, columns.year, columns.rating, columns.poster)
+            ).one()
+            versions.bump(db.session, versions.CATALOG)
+            # Listeners get the stored row, which is the existing one if the imdb_id was known
+            self._notify('movie_saved', id=movie.id, name=movie.name, director=movie.director, rating=movie.rating)
+            if jobs.needs_enrichment(movie.director, movie.year, movie.rating, movie.poster):
+                jobs.enqueue(db.session, jobs.ENRICH, [movie.id])
+                self._notify('enrichment_queued')
+            self._commit()
             return movie.id
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -59,37 +289,34 @@ class SQLiteDataManager(DataManagerInterface):
 
     def get_movie(self, movie_id: int) -> Optional[Dict]:
         try:
-            movie = Movie.query.get(movie_id)
+            movie = db.session.execute(
+                select(*self._movie_columns()).where(Movie.id == movie_id)
+            ).mappings().first()
             if movie:
-                return {
-                    "id": movie.id,
-                    "name": movie.name,
-                    "director": movie.director,
-                    "year": movie.year,
-                    "rating": movie.rating,
-                    "poster": movie.poster
-                }
+                return dict(movie)
             raise MovieNotFoundError(f"Movie with ID {movie_id} not found")
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
 
-    def get_all_movies(self) -> List[Dict]:
+    def get_all_movies(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        try:
+            result = db.session.execute(select(*self._movie_columns(fields)).order_by(Movie.id))
+            # zip over plain rows builds the dicts about twice as fast as .mappings()
+            keys = list(result.keys())
+            return [dict(zip(keys, row)) for row in result]
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def get_movies_page(self, page: int, per_page: int, after_id: Optional[int] = None,
+                        before_id: Optional[int] = None) -> Dict:
         try:
-            movies = Movie.query.all()
-            return [{
-                "id": movie.id,
-                "name": movie.name,
-                "director": movie.director,
-                "year": movie.year,
-                "rating": movie.rating,
-                "poster": movie.poster
-            } for movie in movies]
+            return self._paginate_movies([], page, per_page, after_id, before_id)
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
 
     def update_movie(self, movie_id: int, name: str, director: str, year: int, rating: float, poster: str = None) -> bool:
         try:
-            movie = Movie.query.get(movie_id)
+            movie = db.session.get(Movie, movie_id)
             if movie:
                 movie.name = name
                 movie.director = director
@@ -97,47 +324,173 @@ class SQLiteDataManager(DataManagerInterface):
                 movie.rating = rating
                 if poster:
                     movie.poster = poster
-                db.session.commit()
+                versions.bump(db.session, versions.CATALOG)
+                versions.bump_movie_users(db.session, [movie_id])
+                self._notify('movie_saved', id=movie_id, name=name, director=director, rating=rating)
+                self._commit()
                 return True
             raise MovieNotFoundError(f"Movie with ID {movie_id} not found")
         except SQLAlchemyError as e:
             db.session.rollback()
             raise DatabaseError(f"Error updating movie: {str(e)}")
 
+    def _own_movies(self, user_id: int, movie_ids) -> Dict[int, int]:
+        """
+        Copy-on-write for edits from a user's list: movies other users' lists share, and
+        canonical movies (with an imdb_id, which later adds resolve to), are copied, and the
+        user's link moves to the copy. Returns {movie id: id of the row the user may edit}
+        for the movie_ids that are in the user's list.
+        """
+        other_links = user_movies.alias("other_links")
+        others = (select(other_links.c.movie_id)
+                  .where(other_links.c.movie_id == Movie.id, other_links.c.user_id != user_id).exists())
+        rows = self._select_in(
+            lambda chunk: select(Movie.id, or_(Movie.imdb_id.isnot(None), others))
+            .join(user_movies, user_movies.c.movie_id == Movie.id)
+            .where(user_movies.c.user_id == user_id, Movie.id.in_(chunk)),
+            set(movie_ids))
+        own = {movie_id: movie_id for movie_id, _ in rows}
+        shared = sorted(movie_id for movie_id, is_shared in rows if is_shared)
+        if not shared:
+            return own
+
+        incomplete = []
+        for movie_id in shared:
+            # Without the imdb_id (that stays with the canonical row) and metadata_updated_at,
+            # so rating refreshes don't overwrite the user's copy
+            copy = db.session.execute(text("""
+                INSERT INTO movie (name, director, year, rating, poster)
+                SELECT name, director, year, rating, poster FROM movie WHERE id = :id
+                RETURNING id, director, year, rating, poster
+            """), {"id": movie_id}).one()
+            own[movie_id] = copy.id
+            if jobs.needs_enrichment(copy.director, copy.year, copy.rating, copy.poster):
+                incomplete.append(copy.id)
+        # Delete and insert rather than update the links, so the user_stats triggers see both
+        db.session.execute(
+            user_movies.delete().where(user_movies.c.user_id == user_id,
+                                       user_movies.c.movie_id == bindparam("movie_id")),
+            [{"movie_id": movie_id} for movie_id in shared])
+        db.session.execute(insert(user_movies), [{"user_id": user_id, "movie_id": own[movie_id]}
+                                                 for movie_id in shared])
+        for movie_id in shared:
+            self._notify('user_movie_removed', user_id=user_id, movie_id=movie_id)
+            self._notify('user_movie_added', user_id=user_id, movie_id=own[movie_id])
+        if incomplete:
+            jobs.enqueue(db.session, jobs.ENRICH, incomplete)
+            self._notify('enrichment_queued')
+        return own
+
+    def update_user_movie(self, user_id: int, movie_id: int, name: str, director: str, year: int,
+                          rating: float, poster: str = None) -> int:
+        try:
+            own_id = self._own_movies(user_id, [movie_id]).get(movie_id)
+            if own_id is None:
+                self._require_user(user_id)
+                raise MovieNotFoundError(f"Movie with ID {movie_id} is not in the list of user {user_id}")
+            values = {"name": name, "director": director, "year": year, "rating": rating}
+            if poster:
+                values["poster"] = poster
+            db.session.execute(update(Movie).where(Movie.id == own_id).values(**values))
+            versions.bump(db.session, versions.CATALOG, versions.user_scope(user_id))
+            self._notify('movie_saved', id=own_id, name=name, director=director, rating=rating)
+            self._commit()
+            return own_id
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error updating movie: {str(e)}")
+
     def get_all_users(self) -> List[Dict]:
         try:
-            users = User.query.all()
-            return [{"id": user.id, "name": user.name} for user in users]
+            rows = db.session.execute(select(User.id, User.name).order_by(User.id)).mappings()
+            return [dict(row) for row in rows]
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
 
-    def get_user_movies(self, user_id: int) -> List[Dict]:
+    def get_user_movies(self, user_id: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        if fields:
+            return list(self.iter_user_movies(user_id, fields=fields))
+        result = self.get_user_with_movies(user_id)
+        if result is None:
+            raise UserNotFoundError(f"User with ID {user_id} not found")
+        return result[1]
+
+    def get_user_with_movies(self, user_id: int) -> Optional[Tuple[Dict, List[Dict]]]:
         try:
-            user = User.query.get(user_id)
-            if not user:
-                raise UserNotFoundError(f"User with ID {user_id} not found")
+            # One round trip: user LEFT JOIN user_movies LEFT JOIN movie.
+            # A user without movies comes back as a single row with NULL movie columns.
+            rows = db.session.execute(
+                select(User.id.label("user_id"), User.name.label("user_name"), *self._movie_columns())
+                .select_from(User)
+                .outerjoin(user_movies, user_movies.c.user_id == User.id)
+                .outerjoin(Movie, Movie.id == user_movies.c.movie_id)
+                .where(User.id == user_id)
+                .order_by(user_movies.c.movie_id)
+            ).all()
+            if not rows:
+                return None
 
-            return [{
-                "id": movie.id,
-                "name": movie.name,
-                "director": movie.director,
-                "year": movie.year,
-                "rating": movie.rating,
-                "poster": movie.poster
-            } for movie in user.movies]
+            user = {"id": rows[0].user_id, "name": rows[0].user_name}
+            movies = [self._movie_to_dict(row) for row in rows if row.id is not None]
+            return user, movies
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
 
-    def add_user_movie(self, user_id: int, movie_id: int) -> bool:
+    def get_user_and_movie(self, user_id: int, movie_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
         try:
-            user = User.query.get(user_id)
-            movie = Movie.query.get(movie_id)
+            row = db.session.execute(
+                select(User.id.label("user_id"), User.name.label("user_name"), *self._movie_columns())
+                .select_from(User)
+                .outerjoin(user_movies, (user_movies.c.user_id == User.id) & (user_movies.c.movie_id == movie_id))
+                .outerjoin(Movie, Movie.id == user_movies.c.movie_id)
+                .where(User.id == user_id)
+            ).first()
+            if row is None:
+                return None, None
 
-            if not user or not movie:
-                return False
+            user = {"id": row.user_id, "name": row.user_name}
+            if row.id is None:
+                return user, None
+            return user, self._movie_to_dict(row)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
 
-            user.movies.append(movie)
-            db.session.commit()
+    def iter_all_movies(self, batch_size: int = 1000, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        statement = select(*self._movie_columns(fields)).order_by(Movie.id)
+        return self._stream_rows(statement, batch_size)
+
+    def iter_user_movies(self, user_id: int, batch_size: int = 1000,
+                         fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        # Check the user up front, so a missing user fails before any output is streamed
+        self.get_user(user_id)
+
+        statement = (select(*self._movie_columns(fields))
+                     .join(user_movies, user_movies.c.movie_id == Movie.id)
+                     .where(user_movies.c.user_id == user_id)
+                     .order_by(Movie.id))
+        return self._stream_rows(statement, batch_size)
+
+    def add_user_movie(self, user_id: int, movie_id: int) -> bool:
+        try:
+            # Single INSERT ... SELECT that only links existing users and movies;
+            # linking a movie the user already has is a no-op
+            result = db.session.execute(
+                insert(user_movies).prefix_with("OR IGNORE").from_select(
+                    ["user_id", "movie_id"],
+                    select(User.id, Movie.id)
+                    .select_from(User)
+                    .join(Movie, Movie.id == movie_id)
+                    .where(User.id == user_id)
+                )
+            )
+            if result.rowcount == 0:
+                return db.session.execute(
+                    select(user_movies.c.user_id).where(user_movies.c.user_id == user_id,
+                                                        user_movies.c.movie_id == movie_id)
+                ).first() is not None
+            versions.bump(db.session, versions.user_scope(user_id))
+            self._notify('user_movie_added', user_id=user_id, movie_id=movie_id)
+            self._commit()
             return True
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -145,14 +498,15 @@ class SQLiteDataManager(DataManagerInterface):
 
     def remove_user_movie(self, user_id: int, movie_id: int) -> bool:
         try:
-            user = User.query.get(user_id)
-            movie = Movie.query.get(movie_id)
-
-            if not user or not movie:
+            result = db.session.execute(
+                user_movies.delete().where(user_movies.c.user_id == user_id,
+                                           user_movies.c.movie_id == movie_id)
+            )
+            if result.rowcount == 0:
                 return False
-
-            user.movies.remove(movie)
-            db.session.commit()
+            versions.bump(db.session, versions.user_scope(user_id))
+            self._notify('user_movie_removed', user_id=user_id, movie_id=movie_id)
+            self._commit()
             return True
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -160,29 +514,435 @@ class SQLiteDataManager(DataManagerInterface):
 
     def delete_movie(self, movie_id: int) -> bool:
         try:
-            movie = Movie.query.get(movie_id)
+            movie = db.session.get(Movie, movie_id)
             if movie:
+                # Bump the users before the links are deleted along with the movie
+                versions.bump(db.session, versions.CATALOG)
+                versions.bump_movie_users(db.session, [movie_id])
                 db.session.delete(movie)
-                db.session.commit()
+                self._notify('movie_deleted', id=movie_id)
+                self._commit()
                 return True
             return False
         except SQLAlchemyError as e:
             db.session.rollback()
             raise DatabaseError(f"Error deleting movie: {str(e)}")
 
+    # Bound parameters per IN (...) list, well below SQLite's variable limit
+    IN_CHUNK = 500
+
+    def _select_in(self, statement_for, values: List) -> List:
+        """Run statement_for(chunk) for chunks of values and collect all rows"""
+        values, rows = list(values), []
+        for start in range(0, len(values), self.IN_CHUNK):
+            rows.extend(db.session.execute(statement_for(values[start:start + self.IN_CHUNK])).all())
+        return rows
+
+    def _insert_movies(self, rows: List[Dict]) -> List[Tuple[int, bool]]:
+        """
+        Insert movie rows and return (movie id, created) per row.
+        Rows with a known imdb_id resolve to the canonical movie instead of inserting a copy.
+        Incomplete new movies are queued for enrichment.
+        """
+        imdb_ids = {row["imdb_id"] for row in rows if row.get("imdb_id")}
+        canonical = dict(self._select_in(
+            lambda chunk: select(Movie.imdb_id, Movie.id).where(Movie.imdb_id.in_(chunk)), imdb_ids))
+
+        new_movies, new_index = [], {}
+        resolved = []  # movie id, or ("new", index into new_movies)
+        for row in rows:
+            imdb_id = row.get("imdb_id") or None
+            if imdb_id in canonical:
+                resolved.append(canonical[imdb_id])
+                continue
+            if imdb_id is None or imdb_id not in new_index:
+                if imdb_id is not None:
+                    new_index[imdb_id] = len(new_movies)
+                new_movies.append({
+                    "name": row["name"],
+                    "director": row["director"],
+                    "year": row["year"],
+                    "rating": row["rating"],
+                    "poster": row.get("poster"),
+                    "imdb_id": imdb_id
+                })
+                resolved.append(("new", len(new_movies) - 1))
+            else:
+                resolved.append(("new", new_index[imdb_id]))
+
+        new_ids = []
+        if new_movies:
+            # RETURNING in parameter order. SQLite has no column SQLAlchemy can sort a batch's
+            # RETURNING rows by, so it sends one INSERT per row, still on one prepared statement
+            new_ids = db.session.execute(
+                insert(Movie.__table__).returning(Movie.id, sort_by_parameter_order=True), new_movies
+            ).scalars().all()
+            incomplete = [movie_id for movie_id, movie in zip(new_ids, new_movies)
+                          if jobs.needs_enrichment(movie["director"], movie["year"], movie["rating"], movie["poster"])]
+            if incomplete:
+                jobs.enqueue(db.session, jobs.ENRICH, incomplete)
+                self._notify('enrichment_queued')
+
+        seen_new = set()
+        result = []
+        for movie in resolved:
+            if isinstance(movie, tuple):
+                # Only the first row of a new canonical movie counts as creating it
+                result.append((new_ids[movie[1]], movie[1] not in seen_new))
+                seen_new.add(movie[1])
+            else:
+                result.append((movie, False))
+        return result
+
+    def import_movies(self, rows: List[Dict]) -> int:
+        try:
+            user_ids = {row["user_id"] for row in rows}
+            existing_users = set(db.session.execute(
+                select(User.id).where(User.id.in_(user_ids))
+            ).scalars())
+            rows = [row for row in rows if row["user_id"] in existing_users]
+            if not rows:
+                return 0
+
+            movie_ids = self._insert_movies(rows)
+            links = [{"user_id": row["user_id"], "movie_id": movie_id}
+                     for row, (movie_id, _) in zip(rows, movie_ids)]
+            db.session.execute(insert(user_movies).prefix_with("OR IGNORE"), links)
+            versions.bump(db.session, versions.CATALOG, *{versions.user_scope(link["user_id"]) for link in links})
+            self._notify('catalog_changed')
+            self._commit()
+            return len(rows)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error importing movies: {str(e)}")
+
+    def _require_user(self, user_id: int) -> None:
+        if db.session.execute(select(User.id).where(User.id == user_id)).first() is None:
+            raise UserNotFoundError(f"User with ID {user_id} not found")
+
+    def _linked_movie_ids(self, user_id: int, movie_ids) -> set:
+        return {movie_id for movie_id, in self._select_in(
+            lambda chunk: select(user_movies.c.movie_id).where(user_movies.c.user_id == user_id,
+                                                               user_movies.c.movie_id.in_(chunk)),
+            set(movie_ids))}
+
+    def add_user_movies(self, user_id: int, movies: List[Dict]) -> List[Dict]:
+        try:
+            self._require_user(user_id)
+            # Items are either {"movie_id": ...} for an existing movie or full movie details
+            existing = {movie_id for movie_id, in self._select_in(
+                lambda chunk: select(Movie.id).where(Movie.id.in_(chunk)),
+                {item["movie_id"] for item in movies if "movie_id" in item})}
+            new_rows = [item for item in movies if "movie_id" not in item]
+            inserted = iter(self._insert_movies(new_rows) if new_rows else [])
+
+            resolved = []  # (movie id or None, created)
+            for item in movies:
+                if "movie_id" in item:
+                    resolved.append((item["movie_id"] if item["movie_id"] in existing else None, False))
+                else:
+                    resolved.append(next(inserted))
+
+            linked = self._linked_movie_ids(user_id, [movie_id for movie_id, _ in resolved if movie_id])
+            results, new_links = [], []
+            for item, (movie_id, created) in zip(movies, resolved):
+                if movie_id is None:
+                    results.append({"status": "not_found", "movie_id": item["movie_id"]})
+                elif movie_id in linked:
+                    results.append({"status": "already_in_list", "movie_id": movie_id})
+                else:
+                    linked.add(movie_id)
+                    new_links.append({"user_id": user_id, "movie_id": movie_id})
+                    results.append({"status": "added", "movie_id": movie_id, "created": created})
+                if created:
+                    self._notify('movie_saved', id=movie_id, name=item["name"], director=item["director"],
+                                 rating=item["rating"])
+
+            if new_links:
+                db.session.execute(insert(user_movies).prefix_with("OR IGNORE"), new_links)
+                versions.bump(db.session, versions.user_scope(user_id))
+                for link in new_links:
+                    self._notify('user_movie_added', **link)
+            if new_rows:
+                versions.bump(db.session, versions.CATALOG)
+            self._commit()
+            return results
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error adding movies to user: {str(e)}")
+
+    def update_user_movies(self, user_id: int, updates: List[Dict]) -> List[Dict]:
+        try:
+            self._require_user(user_id)
+            # Movies the user shares with others are copied first, as in update_user_movie
+            own = self._own_movies(user_id, [update["movie_id"] for update in updates])
+            fields = ("name", "director", "year", "rating", "poster")
+            params = [dict({field: update.get(field) for field in fields}, id=own[update["movie_id"]])
+                      for update in updates if update["movie_id"] in own]
+            if params:
+                # Fields left out of an update (None) keep their value
+                db.session.execute(text("""
+                    UPDATE movie SET name = COALESCE(:name, name), director = COALESCE(:director, director),
+                        year = COALESCE(:year, year), rating = COALESCE(:rating, rating),
+                        poster = COALESCE(:poster, poster)
+                    WHERE id = :id
+                """), params)
+                updated_ids = {param["id"] for param in params}
+                versions.bump(db.session, versions.CATALOG, versions.user_scope(user_id))
+                for movie in self._select_in(
+                        lambda chunk: select(Movie.id, Movie.name, Movie.director, Movie.rating)
+                        .where(Movie.id.in_(chunk)), updated_ids):
+                    self._notify('movie_saved', id=movie.id, name=movie.name, director=movie.director,
+                                 rating=movie.rating)
+            self._commit()
+            results = []
+            for update in updates:
+                movie_id = update["movie_id"]
+                if movie_id not in own:
+                    results.append({"status": "not_in_list", "movie_id": movie_id})
+                elif own[movie_id] != movie_id:
+                    results.append({"status": "updated", "movie_id": movie_id, "copied_to": own[movie_id]})
+                else:
+                    results.append({"status": "updated", "movie_id": movie_id})
+            return results
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error updating movies: {str(e)}")
+
+    def remove_user_movies(self, user_id: int, movie_ids: List[int]) -> List[Dict]:
+        try:
+            self._require_user(user_id)
+            linked = self._linked_movie_ids(user_id, movie_ids)
+            if linked:
+                db.session.execute(
+                    user_movies.delete().where(user_movies.c.user_id == user_id,
+                                               user_movies.c.movie_id == bindparam("movie_id")),
+                    [{"movie_id": movie_id} for movie_id in linked])
+                versions.bump(db.session, versions.user_scope(user_id))
+                for movie_id in linked:
+                    self._notify('user_movie_removed', user_id=user_id, movie_id=movie_id)
+            results = []
+            for movie_id in movie_ids:
+                results.append({"status": "removed" if movie_id in linked else "not_in_list", "movie_id": movie_id})
+                linked.discard(movie_id)  # a repeated id was removed by its first occurrence
+            self._commit()
+            return results
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error removing movies from user: {str(e)}")
+
+    def get_data_version(self, scope: str) -> Tuple[int, Optional[float]]:
+        try:
+            return versions.get_version(db.session, scope)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def claim_enrichment_jobs(self, limit: int, lease_seconds: float) -> List[Dict]:
+        try:
+            claimed = jobs.claim(db.session, limit, lease_seconds)
+            self._commit()
+            return claimed
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error claiming enrichment jobs: {str(e)}")
+
+    @staticmethod
+    def _parse_year(year) -> int:
+        # OMDB years look like "1999" or "2010–2012"
+        digits = str(year or '')[:4]
+        return int(digits) if digits.isdigit() else 0
+
+    def finish_enrichment_job(self, job: Dict, details: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        try:
+            if error is not None:
+                jobs.retry(db.session, job["id"], error)
+                self._commit()
+                return
+
+            year = self._parse_year(details and details.get("year"))
+            # Enrichment matches by title; if the movie has a year, OMDB's has to agree
+            if details and job["kind"] == jobs.ENRICH and job["year"] and year and year != job["year"]:
+                details = None
+            # Refreshes are looked up by imdb id; still, never apply another film's details
+            if details and job["kind"] == jobs.REFRESH and details.get("imdb_id") != job["imdb_id"]:
+                details = None
+
+            if details:
+                params = {
+                    "id": job["movie_id"],
+                    "director": details.get("director") or "",
+                    "year": year,
+                    "rating": details.get("rating") or 0,
+                    "poster": details.get("poster") or "",
+                    "imdb_id": details.get("imdb_id"),
+                    "now": time.time(),
+                }
+                if job["kind"] == jobs.ENRICH:
+                    # Only fill what is missing; never overwrite what the user entered
+                    db.session.execute(text("""
+                        UPDATE movie SET
+                            director = CASE WHEN director IN ('', 'Unknown') AND :director NOT IN ('', 'N/A')
+                                            THEN :director ELSE director END,
+                            year = CASE WHEN year = 0 THEN :year ELSE year END,
+                            rating = CASE WHEN rating = 0 THEN :rating ELSE rating END,
+                            poster = CASE WHEN (poster IS NULL OR poster IN ('', 'N/A')) AND :poster != ''
+                                          THEN :poster ELSE poster END,
+                            imdb_id = COALESCE(imdb_id, (SELECT :imdb_id WHERE NOT EXISTS (
+                                SELECT 1 FROM movie WHERE imdb_id = :imdb_id))),
+                            metadata_updated_at = :now
+                        WHERE id = :id
+                    """), params)
+                else:
+                    db.session.execute(text("""
+                        UPDATE movie SET
+                            rating = CASE WHEN :rating > 0 THEN :rating ELSE rating END,
+                            poster = CASE WHEN :poster NOT IN ('', 'N/A') THEN :poster ELSE poster END,
+                            metadata_updated_at = :now
+                        WHERE id = :id
+                    """), params)
+                versions.bump(db.session, versions.CATALOG)
+                versions.bump_movie_users(db.session, [job["movie_id"]])
+                movie = db.session.execute(
+                    select(Movie.name, Movie.director, Movie.rating).where(Movie.id == job["movie_id"])
+                ).first()
+                self._notify('movie_saved', id=job["movie_id"], name=movie.name, director=movie.director,
+                             rating=movie.rating)
+            elif job["kind"] == jobs.REFRESH:
+                # Not found any more; try again after another max_age
+                db.session.execute(text("UPDATE movie SET metadata_updated_at = :now WHERE id = :id"),
+                                   {"id": job["movie_id"], "now": time.time()})
+            jobs.complete(db.session, [job["id"]])
+            self._commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error finishing enrichment job: {str(e)}")
+
+    def enqueue_rating_refresh(self, max_age: float, limit: int) -> int:
+        try:
+            queued = jobs.enqueue_stale(db.session, max_age, limit)
+            self._commit()
+            return queued
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error queueing rating refreshes: {str(e)}")
+
+    def get_enrichment_stats(self) -> Dict:
+        try:
+            return jobs.stats(db.session)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def get_catalog_stats(self, top_directors: int = 10) -> Dict:
+        try:
+            return stats.catalog(db.session, top_directors)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def get_users_stats(self) -> List[Dict]:
+        try:
+            return stats.users(db.session)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def get_user_stats(self, user_id: int) -> Dict:
+        try:
+            result = stats.user(db.session, user_id)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+        if result is None:
+            raise UserNotFoundError(f"User with ID {user_id} not found")
+        return result
+
+    def rebuild_stats(self) -> None:
+        try:
+            stats.rebuild(db.session)
+            versions.bump_all(db.session)
+            self._commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error rebuilding statistics: {str(e)}")
+
+    def get_similar_movies(self, movie_id: int, limit: int = 10) -> List[Dict]:
+        try:
+            movies = similarity.similar(db.session, movie_id, limit)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+        if not movies:
+            self.get_movie(movie_id)  # raises MovieNotFoundError for unknown movies
+        return movies
+
+    def get_user_recommendations(self, user_id: int, limit: int = 10) -> List[Dict]:
+        try:
+            movies = similarity.for_user(db.session, user_id, limit)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+        if not movies:
+            self.get_user(user_id)  # raises UserNotFoundError for unknown users
+        return movies
+
+    def rebuild_similarities(self, top_k: int = 20, min_common: int = 1, per_user: int = 20,
+                             if_changed: bool = False) -> Optional[Dict]:
+        try:
+            if not if_changed:
+                version, _ = versions.get_version(db.session, versions.ALL)
+                report = similarity.rebuild(db.session, top_k, min_common, per_user, source_version=version)
+                self._commit()
+                return report
+
+            if self._stale_similarity_version() is None:
+                return None
+            # Only one worker rebuilds; the others skip this round
+            holder = similarity.claim_build(db.session)
+            self._commit()
+            if holder is None:
+                return None
+            # Checked again under the lease: the previous holder may just have built this version
+            version = self._stale_similarity_version()
+            report = None
+            if version is not None:
+                report = similarity.rebuild(db.session, top_k, min_common, per_user, source_version=version)
+            similarity.release_build(db.session, holder)
+            self._commit()
+            return report
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise DatabaseError(f"Error rebuilding similar movies: {str(e)}")
+
+    @staticmethod
+    def _stale_similarity_version() -> Optional[int]:
+        """The data version to rebuild the similarity tables from, or None if they were built from it"""
+        # Any write bumps "all"; the build records the version it saw
+        version, _ = versions.get_version(db.session, versions.ALL)
+        last = similarity.last_build(db.session)
+        return None if last and last["source_version"] == version else version
+
+    def get_similarity_build(self) -> Optional[Dict]:
+        try:
+            return similarity.last_build(db.session)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
     def search_movies(self, search_query: str) -> List[Dict]:
         try:
+            if self.fts_enabled:
+                return self._fts_search_movies(search_query, 1, None)["movies"]
+
             # Suche nach Filmen, die den Suchbegriff im Namen enthalten (case-insensitive)
             search_pattern = f"%{search_query}%"
             movies = Movie.query.filter(Movie.name.ilike(search_pattern)).all()
 
-            return [{
-                "id": movie.id,
-                "name": movie.name,
-                "director": movie.director,
-                "year": movie.year,
-                "rating": movie.rating,
-                "poster": movie.poster
-            } for movie in movies]
+            return [self._movie_to_dict(movie) for movie in movies]
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def search_movies_page(self, search_query: str, page: int, per_page: int,
+                           after_id: Optional[int] = None, before_id: Optional[int] = None) -> Dict:
+        try:
+            if self.fts_enabled:
+                # Relevance-ranked results are paged by offset; the cursors only apply to the LIKE path
+                return self._fts_search_movies(search_query, page, per_page)
+
+            criteria = [Movie.name.ilike(f"%{search_query}%")]
+            return self._paginate_movies(criteria, page, per_page, after_id, before_id)
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error: {str(e)}")
@@ -0,0 +1,166 @@
+from typing import Dict, List, Optional
+from sqlalchemy import text
+
+# Summary tables for the statistics endpoints, one row per group:
+#   movie_stats - ("total", ""), ("decade", "1990"), ("director", "Sofia Coppola")
+#   user_stats  - one row per user with movies in their list
+# Each row keeps the number of movies, how many of them have a rating (0 means
+# "unknown") and the sum of those ratings, so averages are rating_sum / rated.
+# Like the FTS index (see fts.py), triggers keep them in step with every write to
+# movie and user_movies inside the writing transaction, so reading them costs
+# O(groups) and the write methods don't need to know about them.
+UNKNOWN_DECADE = "unknown"
+
+
+def _decade(row: str) -> str:
+    return f"CASE WHEN {row}.year > 0 THEN CAST({row}.year / 10 * 10 AS TEXT) ELSE '{UNKNOWN_DECADE}' END"
+
+
+def _rated(row: str) -> str:
+    return f"({row}.rating > 0)"
+
+
+def _rating(row: str) -> str:
+    return f"(CASE WHEN {row}.rating > 0 THEN {row}.rating ELSE 0 END)"
+
+
+def _movie_groups(row: str):
+    return (("total", "''"), ("decade", _decade(row)), ("director", f"{row}.director"))
+
+
+def _add_movie(row: str, sign: int) -> str:
+    """Statements adding (sign 1) or removing (sign -1) a movie row to/from its groups"""
+    statements = []
+    for dimension, bucket in _movie_groups(row):
+        statements.append(f"""
+            INSERT INTO movie_stats (dimension, bucket, movies, rated, rating_sum)
+            VALUES ('{dimension}', {bucket}, {sign}, {sign} * {_rated(row)}, {sign} * {_rating(row)})
+            ON CONFLICT (dimension, bucket) DO UPDATE SET movies = movies + excluded.movies,
+                rated = rated + excluded.rated, rating_sum = rating_sum + excluded.rating_sum;""")
+        if sign < 0 and dimension != "total":
+            statements.append(f"""
+            DELETE FROM movie_stats WHERE dimension = '{dimension}' AND bucket = {bucket} AND movies <= 0;""")
+    return "".join(statements)
+
+
+STATS_DDL = [
+    """CREATE TABLE IF NOT EXISTS movie_stats (
+        dimension VARCHAR(20) NOT NULL,
+        bucket VARCHAR(100) NOT NULL,
+        movies INTEGER NOT NULL,
+        rated INTEGER NOT NULL,
+        rating_sum FLOAT NOT NULL,
+        PRIMARY KEY (dimension, bucket)
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER NOT NULL PRIMARY KEY,
+        movies INTEGER NOT NULL,
+        rated INTEGER NOT NULL,
+        rating_sum FLOAT NOT NULL
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_ai AFTER INSERT ON movie BEGIN
+        {_add_movie("new", 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_ad AFTER DELETE ON movie BEGIN
+        {_add_movie("old", -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_au AFTER UPDATE OF year, director, rating ON movie BEGIN
+        {_add_movie("old", -1)}
+        {_add_movie("new", 1)}
+    END""",
+    # Users' rating sums follow the ratings of the movies in their lists
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_rating_au AFTER UPDATE OF rating ON movie
+    WHEN old.rating IS NOT new.rating BEGIN
+        UPDATE user_stats SET rated = rated + {_rated("new")} - {_rated("old")},
+            rating_sum = rating_sum + {_rating("new")} - {_rating("old")}
+        WHERE user_id IN (SELECT user_id FROM user_movies WHERE movie_id = new.id);
+    END""",
+    # Links are deleted before their movie (see delete_movie and compaction), so the movie is still there
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_ai AFTER INSERT ON user_movies BEGIN
+        INSERT INTO user_stats (user_id, movies, rated, rating_sum)
+        SELECT new.user_id, 1, {_rated("movie")}, {_rating("movie")} FROM movie WHERE movie.id = new.movie_id
+        ON CONFLICT (user_id) DO UPDATE SET movies = movies + excluded.movies,
+            rated = rated + excluded.rated, rating_sum = rating_sum + excluded.rating_sum;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_ad AFTER DELETE ON user_movies BEGIN
+        UPDATE user_stats SET movies = movies - 1,
+            rated = rated - COALESCE((SELECT {_rated("movie")} FROM movie WHERE movie.id = old.movie_id), 0),
+            rating_sum = rating_sum - COALESCE((SELECT {_rating("movie")} FROM movie WHERE movie.id = old.movie_id), 0)
+        WHERE user_id = old.user_id;
+    END""",
+]
+
+_REBUILD = [
+    "DELETE FROM movie_stats",
+    "DELETE FROM user_stats",
+    f"""INSERT INTO movie_stats (dimension, bucket, movies, rated, rating_sum)
+        SELECT 'total', '', COUNT(*), TOTAL({_rated("movie")}), TOTAL({_rating("movie")}) FROM movie""",
+    f"""INSERT INTO movie_stats (dimension, bucket, movies, rated, rating_sum)
+        SELECT 'decade', {_decade("movie")}, COUNT(*), TOTAL({_rated("movie")}), TOTAL({_rating("movie")})
+        FROM movie GROUP BY 2""",
+    f"""INSERT INTO movie_stats (dimension, bucket, movies, rated, rating_sum)
+        SELECT 'director', movie.director, COUNT(*), TOTAL({_rated("movie")}), TOTAL({_rating("movie")})
+        FROM movie GROUP BY movie.director""",
+    f"""INSERT INTO user_stats (user_id, movies, rated, rating_sum)
+        SELECT user_movies.user_id, COUNT(*), TOTAL({_rated("movie")}), TOTAL({_rating("movie")})
+        FROM user_movies JOIN movie ON movie.id = user_movies.movie_id
+        GROUP BY user_movies.user_id""",
+]
+
+
+def create_stats(connection) -> None:
+    """Create the summary tables and their triggers"""
+    for statement in STATS_DDL:
+        connection.execute(text(statement))
+
+
+def rebuild(connection) -> None:
+    """Recompute the summary tables from scratch, e.g. to repair them or after writes that bypassed SQLite"""
+    for statement in _REBUILD:
+        connection.execute(text(statement))
+
+
+def _group(row) -> Dict:
+    return {
+        "movies": row.movies,
+        "rated": int(row.rated),
+        "average_rating": round(row.rating_sum / row.rated, 2) if row.rated else None,
+    }
+
+
+def catalog(connection, top_directors: int = 10) -> Dict:
+    """Totals, all decades and the directors with the most movies"""
+    total = connection.execute(text(
+        "SELECT movies, rated, rating_sum FROM movie_stats WHERE dimension = 'total'")).first()
+    decades = connection.execute(text(
+        "SELECT bucket, movies, rated, rating_sum FROM movie_stats WHERE dimension = 'decade' ORDER BY bucket"))
+    directors = connection.execute(text("""
+        SELECT bucket, movies, rated, rating_sum FROM movie_stats WHERE dimension = 'director'
+        ORDER BY movies DESC, bucket LIMIT :limit
+    """), {"limit": top_directors})
+    return dict(
+        _group(total) if total else {"movies": 0, "rated": 0, "average_rating": None},
+        directors_total=connection.execute(text(
+            "SELECT COUNT(*) FROM movie_stats WHERE dimension = 'director'")).scalar(),
+        by_decade=[dict(decade=row.bucket, **_group(row)) for row in decades],
+        top_directors=[dict(director=row.bucket, **_group(row)) for row in directors],
+    )
+
+
+_USER_STATS = """
+    SELECT "user".id AS user_id, "user".name AS name,
+           COALESCE(user_stats.movies, 0) AS movies, COALESCE(user_stats.rated, 0) AS rated,
+           COALESCE(user_stats.rating_sum, 0) AS rating_sum
+    FROM "user" LEFT JOIN user_stats ON user_stats.user_id = "user".id
+"""
+
+
+def users(connection) -> List[Dict]:
+    """Movie count and average rating of every user's list"""
+    rows = connection.execute(text(_USER_STATS + ' ORDER BY "user".id'))
+    return [dict(user_id=row.user_id, name=row.name, **_group(row)) for row in rows]
+
+
+def user(connection, user_id: int) -> Optional[Dict]:
+    row = connection.execute(text(_USER_STATS + ' WHERE "user".id = :user_id'), {"user_id": user_id}).first()
+    return dict(user_id=row.user_id, name=row.name, **_group(row)) if row else None
@@ -0,0 +1,72 @@
+import time
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import text
+
+# Version counters for cached/conditional reads. Every write bumps the scopes whose
+# data it changed, inside the write's own transaction, so all workers see the new
+# version exactly when they can see the new data.
+#   "catalog"     - the movie table (/api/movies)
+#   "users"       - the user list
+#   "user:<id>"   - one user's movie list (/api/users/<id>/movies)
+#   "all"         - bumped once by every bump() call, so one lookup tells whether anything changed
+CATALOG = "catalog"
+USERS = "users"
+ALL = "all"
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+_BUMP = text("""
+    INSERT INTO data_version (scope, version, updated_at) VALUES (:scope, 1, :now)
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+""")
+
+_BUMP_MOVIE_USERS = text("""
+    INSERT INTO data_version (scope, version, updated_at)
+    SELECT DISTINCT 'user:' || user_id, 1, :now FROM user_movies WHERE movie_id = :movie_id
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+""")
+
+
+def _count_bumps(connection, scopes: Iterable[str]) -> None:
+    # Readers that keep in-memory copies (the in-memory backend, the suggest index) compare
+    # these per-scope counts with the stored versions after commit to tell their own writes
+    # from other workers'. bump_all's blanket UPDATE isn't counted, so it looks like a foreign write.
+    info = getattr(connection, "info", None)
+    if info is not None:
+        bumps = info.setdefault("version_bumps", {})
+        for scope in scopes:
+            bumps[scope] = bumps.get(scope, 0) + 1
+
+
+def bump(connection, *scopes: str) -> None:
+    now = time.time()
+    scopes = set(scopes) | {ALL}
+    connection.execute(_BUMP, [{"scope": scope, "now": now} for scope in scopes])
+    _count_bumps(connection, scopes)
+
+
+def bump_movie_users(connection, movie_ids: Iterable[int]) -> None:
+    """Bump every user whose list contains one of the movies"""
+    now = time.time()
+    params = [{"movie_id": movie_id, "now": now} for movie_id in movie_ids]
+    if params:
+        connection.execute(_BUMP_MOVIE_USERS, params)
+        bump(connection)
+
+
+def bump_all(connection) -> None:
+    """Invalidate every scope, e.g. after maintenance jobs that rewrite many rows"""
+    connection.execute(text("UPDATE data_version SET version = version + 1, updated_at = :now"),
+                       {"now": time.time()})
+    bump(connection, CATALOG, USERS)
+
+
+def get_version(connection, scope: str) -> Tuple[int, Optional[float]]:
+    """Current (version, updated_at) of a scope; (0, None) if it was never written"""
+    row = connection.execute(
+        text("SELECT version, updated_at FROM data_version WHERE scope = :scope"), {"scope": scope}
+    ).first()
+    return (row[0], row[1]) if row else (0, None)
@@ -0,0 +1,242 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def normalize_title(title: str) -> str:
+    """Build a cache key from a movie title: case-folded with collapsed whitespace"""
+    return " ".join(title.split()).casefold()
+
+
+class CacheStore(ABC):
+    """Storage backend for cached lookups. Values must be JSON-serializable (None is allowed)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value). Expired entries count as not found."""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for ttl seconds"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries"""
+        pass
+
+
+class LRUStore(CacheStore):
+    """
+    Bounded in-process store with per-entry expiry and least-recently-used eviction.
+    Besides the entry count, the total size of str/bytes values can be capped with max_bytes.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        return len(value) if isinstance(value, (str, bytes)) else 0
+
+    def _pop(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= self._sizeof(value)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                self._pop(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += self._sizeof(value)
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+class SQLiteStore(CacheStore):
+    """
+    Cache store in a SQLite file, so all worker processes share one cache.
+    Each thread gets its own connection; expired rows are purged periodically on write.
+    """
+
+    PURGE_EVERY = 500  # writes between purges of expired rows
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires_at REAL NOT NULL
+            )""")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache")
+
+
+class LookupCache:
+    """
+    Two-tier TTL cache for upstream lookups: an in-process LRU in front of an
+    optional shared store. Misses from the upstream ("not found") are cached
+    too, with a shorter TTL, by storing None.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, negative_ttl: float = 15 * 60,
+                 max_entries: int = 1024, shared_store: Optional[CacheStore] = None,
+                 max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = LRUStore(max_entries, max_bytes)
+        self.shared = shared_store
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        found, value = self.local.get(key)
+        if not found and self.shared is not None:
+            found, value = self.shared.get(key)
+            if found:
+                # Promote to the local tier so later lookups skip the shared store
+                self.local.set(key, value, self.negative_ttl if value is None else self.ttl)
+        if not found:
+            self.misses += 1
+        elif value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return found, value
+
+    def set(self, key: str, value: Any) -> None:
+        ttl = self.negative_ttl if value is None else self.ttl
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.size_bytes
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one: the first caller runs
+    the function, callers arriving while it runs wait for and share its result
+    (or exception). Once the call finishes the key is released again.
+    """
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+        self.shared = 0  # calls answered by another caller's result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,51 @@
+import json
+from typing import Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; without it the stdlib encoder is used
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it MessagePack isn't offered
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+
+def dumps_json(data) -> bytes:
+    """Compact JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def dumps_msgpack(data) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+ENCODERS: Dict[str, Callable] = {JSON: dumps_json}
+if msgpack is not None:
+    ENCODERS[MSGPACK] = dumps_msgpack
+    ENCODERS['application/x-msgpack'] = dumps_msgpack
+
+
+def negotiate(accept_mimetypes) -> str:
+    """The response type for a request's Accept header; JSON unless the client prefers MessagePack"""
+    return accept_mimetypes.best_match(list(ENCODERS), default=JSON)
+
+
+def parse_fields(value: Optional[str], allowed) -> Optional[List[str]]:
+    """
+    The fields of a ?fields=id,name projection, in the order of allowed;
+    None if no projection was asked for. Raises ValueError for unknown fields.
+    """
+    if not value:
+        return None
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in allowed if field in requested] or None
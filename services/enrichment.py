@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentWorker:
+    """
+    Background threads that complete movie details from OMDB.
+
+    Jobs come from the data manager's persistent queue: "enrich" jobs for movies
+    stored with missing director/year/rating/poster, and "refresh" jobs for
+    ratings older than refresh_max_age, queued every refresh_interval seconds.
+    Each round claims up to batch_size jobs and looks them up with
+    OMDBService.search_movies_batch (by title) or, for refreshes, by the stored
+    IMDb id with search_imdb_ids_batch; failed lookups are retried by the queue
+    with backoff. Workers in several processes can share one queue, since jobs
+    are leased atomically. The request path only queues jobs and never waits.
+    """
+
+    def __init__(self, app, data_manager, omdb_service, threads: int = 1, batch_size: int = 20,
+                 poll_interval: float = 5, lease_seconds: float = 300,
+                 refresh_interval: Optional[float] = 3600, refresh_max_age: float = 7 * 24 * 3600,
+                 refresh_limit: int = 100):
+        self.app = app
+        self.data_manager = data_manager
+        self.omdb_service = omdb_service
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.refresh_interval = refresh_interval
+        self.refresh_max_age = refresh_max_age
+        self.refresh_limit = refresh_limit
+
+        self.processed = 0
+        self.failed = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        data_manager.subscribe(self._on_write)
+
+    def _on_write(self, event: str, data: Dict) -> None:
+        if event == 'enrichment_queued':
+            self._wake.set()
+
+    def start(self) -> "EnrichmentWorker":
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._run, name=f"enrichment-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.queue_refresh_if_due()
+                    busy = self.run_once() == self.batch_size
+            except Exception:
+                logger.exception("Enrichment round failed")
+                busy = False
+            if not busy:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def queue_refresh_if_due(self, force: bool = False) -> int:
+        if self.refresh_interval is None and not force:
+            return 0
+        with self._lock:
+            if not force and self._refreshed_at and time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return 0
+            self._refreshed_at = time.monotonic()
+        queued = self.data_manager.enqueue_rating_refresh(self.refresh_max_age, self.refresh_limit)
+        if queued:
+            logger.info("Queued %d stale ratings for refresh", queued)
+        return queued
+
+    def run_once(self) -> int:
+        """Process one batch of due jobs (needs an app context); returns the number of jobs claimed"""
+        jobs = self.data_manager.claim_enrichment_jobs(self.batch_size, self.lease_seconds)
+        if not jobs:
+            return 0
+        # Refreshes are of movies already linked to an OMDB entry: look that entry up by
+        # its IMDb id rather than by title, which may since match a different film
+        refreshes = [job for job in jobs if job['kind'] == 'refresh' and job['imdb_id']]
+        enrichments = [job for job in jobs if not (job['kind'] == 'refresh' and job['imdb_id'])]
+        results = (self.omdb_service.search_movies_batch([job['name'] for job in enrichments], report_failures=True)
+                   + self.omdb_service.search_imdb_ids_batch([job['imdb_id'] for job in refreshes],
+                                                             report_failures=True))
+        for job, details in zip(enrichments + refreshes, results):
+            if details is False:
+                self.data_manager.finish_enrichment_job(job, error="OMDB lookup failed")
+                with self._lock:
+                    self.failed += 1
+            else:
+                self.data_manager.finish_enrichment_job(job, details=details)
+                with self._lock:
+                    self.processed += 1
+        return len(jobs)
+
+    def stats(self) -> Dict:
+        return {
+            "threads": len(self._threads),
+            "processed": self.processed,
+            "failed_lookups": self.failed,
+            "queue": self.data_manager.get_enrichment_stats(),
+        }
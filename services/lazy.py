@@ -0,0 +1,33 @@
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    """
+    Stand-in for a service that is only created when it is first used, so
+    workers that never call it don't pay for its setup (connection pools,
+    cache files, ...). Attribute access creates the service once, thread-safely,
+    and forwards to it. If creating it fails the error goes to the caller and
+    the next use tries again.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
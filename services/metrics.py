@@ -0,0 +1,322 @@
+import bisect
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached page to a slow OMDB round trip
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Mirror a counter that is kept elsewhere (e.g. cache hit counts)"""
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self.values[key] = value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self.values.items()]
+        return {"type": "counter", "help": self.help, "labels": list(self.labels), "samples": samples}
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), [list(counts), total, count]]
+                       for key, (counts, total, count) in self.values.items()]
+        return {"type": "histogram", "help": self.help, "labels": list(self.labels),
+                "buckets": list(self.buckets), "samples": samples}
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of one process. Updates are a dict lookup under a
+    lock, cheap enough to leave on in production. Collectors run before each
+    snapshot to copy in numbers that are kept elsewhere, like cache stats.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Sum the snapshots of several workers, sample by sample"""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif metric["type"] == "histogram":
+                    counts = [a + b for a, b in zip(current[0], value[0])]
+                    target["samples"][key] = [counts, current[1] + value[1], current[2] + value[2]]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def render_prometheus(merged: Dict[str, Dict]) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key in sorted(metric["samples"]):
+            value = metric["samples"][key]
+            if metric["type"] == "counter":
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {value}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric["buckets"]) + ["+Inf"], counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {total}")
+            lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class SharedMetricsStore:
+    """
+    Snapshots of every worker in one SQLite file, so any worker can serve the
+    totals. Rows of exited workers are kept, which keeps the summed counters
+    monotonic across restarts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS metrics_snapshot (
+                worker TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+
+    @property
+    def worker_id(self) -> str:
+        # Looked up on use, so workers forked after the app was loaded get their own row
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, snapshot: Dict[str, Dict]) -> None:
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO metrics_snapshot (worker, data, updated_at) VALUES (?, ?, ?)",
+                         (self.worker_id, json.dumps(snapshot), time.time()))
+
+    def collect(self) -> List[Dict[str, Dict]]:
+        rows = self._connection().execute(
+            "SELECT data FROM metrics_snapshot WHERE worker != ?", (self.worker_id,))
+        return [json.loads(data) for data, in rows]
+
+
+class Metrics:
+    """
+    Request, SQL and external-call instrumentation for the app.
+
+    Per request it records latency by endpoint, the number of SQL statements and
+    the time spent in them (via events on the app's engine). With a shared store, each worker
+    publishes its snapshot every flush_interval seconds and /metrics reports the
+    sum over all workers. If slow_request_seconds is set, requests slower than that
+    are logged together with the SQL statements they ran.
+    """
+
+    MAX_LOGGED_STATEMENTS = 50
+
+    def __init__(self, shared_store: Optional[SharedMetricsStore] = None,
+                 slow_request_seconds: Optional[float] = None, flush_interval: float = 5):
+        self.registry = MetricsRegistry()
+        self.shared_store = shared_store
+        self.slow_request_seconds = slow_request_seconds
+        self.flush_interval = flush_interval
+        self._flushed_at = 0.0
+        # Request state lives in g under a key of its own, so several apps can be instrumented
+        self._state_key = f"metrics_state_{id(self)}"
+
+        self.request_duration = self.registry.histogram(
+            "http_request_duration_seconds", "Request latency by endpoint", ("method", "endpoint", "status"))
+        self.request_statements = self.registry.histogram(
+            "db_statements_per_request", "SQL statements executed per request", ("endpoint",),
+            buckets=STATEMENT_BUCKETS)
+        self.db_statements = self.registry.counter(
+            "db_statements_total", "SQL statements executed, by endpoint", ("endpoint",))
+        self.db_seconds = self.registry.counter(
+            "db_statement_seconds_total", "Time spent executing SQL, by endpoint", ("endpoint",))
+        self.external_duration = self.registry.histogram(
+            "external_request_duration_seconds", "Latency of calls to external services",
+            ("service", "outcome"))
+        self.cache_lookups = self.registry.counter(
+            "cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+
+    def instrument_app(self, app: Flask, engine) -> None:
+        """Time the app's requests and count the statements run on its engine (db.engine)"""
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def observe_external(self, service: str, outcome: str, seconds: float) -> None:
+        self.external_duration.observe(seconds, service=service, outcome=outcome)
+
+    def watch_cache(self, name: str, cache) -> None:
+        """Export the hit/miss counters of a LookupCache"""
+        def collect():
+            stats = cache.stats()
+            for result in ("hits", "negative_hits", "misses"):
+                self.cache_lookups.set(stats[result], cache=name, result=result)
+        self.registry.add_collector(collect)
+
+    def _start_request(self) -> None:
+        setattr(g, self._state_key, {"start": time.perf_counter(), "statements": 0, "db_seconds": 0.0,
+                                     "log": [] if self.slow_request_seconds is not None else None})
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        state = g.get(self._state_key) if has_request_context() else None
+        if state is None:
+            return
+        state["statements"] += 1
+        state["db_seconds"] += elapsed
+        if state["log"] is not None and len(state["log"]) < self.MAX_LOGGED_STATEMENTS:
+            state["log"].append((elapsed, statement))
+
+    @staticmethod
+    def _handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_started"):
+            connection.info["metrics_started"].pop()
+
+    def _finish_request(self, response):
+        state = g.pop(self._state_key, None)
+        if state is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        method, status = request.method, response.status_code
+
+        def record():
+            # Runs when the response is closed, so streamed bodies are included
+            elapsed = time.perf_counter() - state["start"]
+            self.request_duration.observe(elapsed, method=method, endpoint=endpoint, status=status)
+            self.request_statements.observe(state["statements"], endpoint=endpoint)
+            self.db_statements.inc(state["statements"], endpoint=endpoint)
+            self.db_seconds.inc(state["db_seconds"], endpoint=endpoint)
+            if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds:
+                statements = "\n".join(f"  {seconds * 1000:.1f} ms  {' '.join(sql.split())}"
+                                       for seconds, sql in state["log"])
+                logger.warning("Slow request %s %s: %.1f ms, %d SQL statements (%.1f ms)\n%s",
+                               method, endpoint, elapsed * 1000, state["statements"],
+                               state["db_seconds"] * 1000, statements)
+            self._maybe_flush()
+
+        response.call_on_close(record)
+        return response
+
+    def _maybe_flush(self) -> None:
+        if self.shared_store is None or time.monotonic() - self._flushed_at < self.flush_interval:
+            return
+        self._flushed_at = time.monotonic()
+        try:
+            self.shared_store.publish(self.registry.snapshot())
+        except sqlite3.Error as e:
+            logger.warning("Could not publish metrics: %s", e)
+
+    def render(self) -> str:
+        """Prometheus text of this worker's metrics plus those published by the others"""
+        own = self.registry.snapshot()
+        snapshots = [own]
+        if self.shared_store is not None:
+            try:
+                self.shared_store.publish(own)
+                self._flushed_at = time.monotonic()
+                snapshots.extend(self.shared_store.collect())
+            except sqlite3.Error as e:
+                logger.warning("Could not read shared metrics: %s", e)
+        return render_prometheus(merge_snapshots(snapshots))
@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional, Tuple
+
+from .movie_import import parse_year, validate_row
+
+MAX_ITEMS = 5000  # add + update + remove items per request
+OPERATIONS = ('add', 'update', 'remove')
+
+
+class BatchRejected(Exception):
+    """Raised inside the transaction of an atomic batch that had failing items, to roll it back"""
+
+    def __init__(self, report: Dict):
+        super().__init__("batch rejected")
+        self.report = report
+
+
+def validate_add(raw) -> Tuple[Optional[Dict], Optional[str]]:
+    """An existing movie ({"movie_id": 7}) or the details of a new one; missing details are enriched later"""
+    if not isinstance(raw, dict):
+        return None, "item must be an object"
+    if 'movie_id' in raw:
+        try:
+            return {'movie_id': int(raw['movie_id'])}, None
+        except (TypeError, ValueError):
+            return None, f"invalid movie_id {raw['movie_id']!r}"
+    movie, error = validate_row(dict(raw, user_id=0), allow_missing=True)
+    if error:
+        return None, error
+    del movie['user_id']
+    movie['director'] = movie['director'] or 'Unknown'
+    movie['year'] = movie['year'] or 0
+    movie['rating'] = movie['rating'] if movie['rating'] is not None else 0.0
+    return movie, None
+
+
+def validate_update(raw) -> Tuple[Optional[Dict], Optional[str]]:
+    if not isinstance(raw, dict) or 'movie_id' not in raw:
+        return None, "update needs a movie_id"
+    try:
+        update = {'movie_id': int(raw['movie_id'])}
+        if raw.get('name') is not None:
+            update['name'] = str(raw['name']).strip()[:200]
+        if raw.get('director') is not None:
+            update['director'] = str(raw['director']).strip()[:100]
+        if raw.get('year') is not None:
+            update['year'] = parse_year(raw['year'])
+        if raw.get('rating') is not None:
+            update['rating'] = float(raw['rating'])
+        if raw.get('poster') is not None:
+            update['poster'] = str(raw['poster']).strip()
+    except (TypeError, ValueError) as e:
+        return None, str(e)
+    if len(update) == 1:
+        return None, "nothing to update"
+    if update.get('name') == '':
+        return None, "name must not be empty"
+    if 'rating' in update and not 0 <= update['rating'] <= 10:
+        return None, f"rating {update['rating']} out of range"
+    return update, None
+
+
+def validate_remove(raw) -> Tuple[Optional[int], Optional[str]]:
+    value = raw.get('movie_id') if isinstance(raw, dict) else raw
+    try:
+        return int(value), None
+    except (TypeError, ValueError):
+        return None, f"invalid movie_id {value!r}"
+
+
+VALIDATORS = {'add': validate_add, 'update': validate_update, 'remove': validate_remove}
+
+
+def apply_batch(data_manager, user_id: int, payload: Dict, atomic: bool = False) -> Dict:
+    """
+    Apply {"add": [...], "update": [...], "remove": [...]} to a user's list in one transaction.
+    Returns per-item results in request order for each operation plus a summary of
+    statuses. Invalid items get {"status": "invalid", "error": ...} and the valid ones
+    are still applied, unless atomic is set: then any failing item rolls back the
+    whole batch and BatchRejected (carrying the report) is raised.
+    """
+    results: Dict[str, List[Dict]] = {}
+    valid: Dict[str, List] = {}
+    for operation in OPERATIONS:
+        results[operation] = []
+        valid[operation] = []
+        for raw in payload.get(operation) or []:
+            item, error = VALIDATORS[operation](raw)
+            if error:
+                results[operation].append({'status': 'invalid', 'error': error})
+            else:
+                results[operation].append(None)
+                valid[operation].append(item)
+
+    def merge(operation, outcomes):
+        outcomes = iter(outcomes)
+        results[operation] = [result or next(outcomes) for result in results[operation]]
+
+    with data_manager.group_commit():
+        if valid['add']:
+            merge('add', data_manager.add_user_movies(user_id, valid['add']))
+        if valid['update']:
+            merge('update', data_manager.update_user_movies(user_id, valid['update']))
+        if valid['remove']:
+            # Removing a movie the updates just copied removes the user's copy
+            copies = {result['movie_id']: result['copied_to'] for result in results['update'] if 'copied_to' in result}
+            removed = data_manager.remove_user_movies(user_id, [copies.get(movie_id, movie_id)
+                                                                for movie_id in valid['remove']])
+            merge('remove', [dict(result, movie_id=movie_id) for result, movie_id in zip(removed, valid['remove'])])
+
+        summary: Dict[str, int] = {}
+        for operation in OPERATIONS:
+            for result in results[operation]:
+                summary[result['status']] = summary.get(result['status'], 0) + 1
+        report = {'results': results, 'summary': summary}
+        if atomic and any(status in summary for status in ('invalid', 'not_found', 'not_in_list')):
+            raise BatchRejected(report)
+    return report
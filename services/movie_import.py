@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+import re
+import time
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+REQUIRED_FIELDS = ('user_id', 'name', 'director', 'year', 'rating')
+ENRICHABLE_FIELDS = ('director', 'year', 'rating', 'poster')
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_rows(stream: IO[str], fmt: str) -> Iterator[Dict]:
+    """Stream raw rows from a CSV (with header) or JSONL text stream"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            # Hand invalid lines on as empty rows so they are reported as validation errors
+            yield row if isinstance(row, dict) else {}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def detect_format(filename: str) -> str:
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def parse_year(value) -> int:
+    # OMDB years look like "1999" or "2005–2010"
+    match = re.match(r'\s*(\d{4})', str(value))
+    if not match:
+        raise ValueError(f"invalid year {value!r}")
+    return int(match.group(1))
+
+
+def validate_row(raw: Dict, allow_missing: bool = False) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Validate and convert one raw row.
+    Returns (row, None) on success or (None, error message).
+    With allow_missing, director/year/rating may be empty (to be filled in from OMDB).
+    """
+    row = {key: (str(value).strip() if value is not None else '') for key, value in raw.items()}
+    missing = [field for field in REQUIRED_FIELDS
+               if not row.get(field) and not (allow_missing and field in ENRICHABLE_FIELDS)]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+
+    try:
+        movie = {
+            'user_id': int(row['user_id']),
+            'name': row['name'][:200],
+            'director': row.get('director', '')[:100] or None,
+            'year': parse_year(row['year']) if row.get('year') else None,
+            'rating': float(row['rating']) if row.get('rating') else None,
+            'poster': row.get('poster') or None,
+            'imdb_id': row.get('imdb_id') or None
+        }
+    except ValueError as e:
+        return None, str(e)
+
+    if movie['rating'] is not None and not 0 <= movie['rating'] <= 10:
+        return None, f"rating {movie['rating']} out of range"
+    return movie, None
+
+
+def _enrich(batch: List[Dict], omdb_service) -> List[Dict]:
+    """Fill missing fields from OMDB in one concurrent batch lookup; drop rows that stay incomplete"""
+    incomplete = [row for row in batch if any(row.get(field) is None for field in ENRICHABLE_FIELDS)]
+    if incomplete:
+        results = omdb_service.search_movies_batch([row['name'] for row in incomplete])
+        for row, movie_data in zip(incomplete, results):
+            if not movie_data:
+                continue
+            if row['director'] is None:
+                row['director'] = movie_data['director']
+            if row['year'] is None:
+                try:
+                    row['year'] = parse_year(movie_data['year'])
+                except ValueError:
+                    pass
+            if row['rating'] is None:
+                row['rating'] = movie_data['rating']
+            if row['poster'] is None and movie_data['poster'] != 'N/A':
+                row['poster'] = movie_data['poster']
+            if row['imdb_id'] is None:
+                row['imdb_id'] = movie_data.get('imdb_id')
+    return [row for row in batch if None not in (row['director'], row['year'], row['rating'])]
+
+
+def import_movies(data_manager, stream: IO[str], fmt: str, batch_size: int = 5000,
+                  omdb_service=None) -> Dict:
+    """
+    Import movies for one or more users from a CSV/JSONL stream.
+    Rows are validated and inserted in batches of batch_size, one transaction each,
+    so memory stays bounded regardless of file size. If an OMDB service is given,
+    missing director/year/rating/poster fields are looked up before inserting.
+    Returns a report with counts, the first errors and the throughput.
+    """
+    start = time.perf_counter()
+    report = {'read': 0, 'imported': 0, 'skipped': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        rows = _enrich(batch, omdb_service) if omdb_service is not None else batch
+        imported = data_manager.import_movies(rows) if rows else 0
+        report['imported'] += imported
+        report['skipped'] += len(batch) - imported
+        if imported < len(batch) and len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append(
+                f"{len(batch) - imported} row(s) up to row {report['read']} "
+                f"skipped: unknown user or incomplete after enrichment")
+        batch.clear()
+
+    for line_number, raw in enumerate(iter_rows(stream, fmt), start=1):
+        report['read'] += 1
+        row, error = validate_row(raw, allow_missing=omdb_service is not None)
+        if error:
+            report['skipped'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append(f"row {line_number}: {error}")
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    report['rows_per_sec'] = round(report['imported'] / report['seconds']) if report['seconds'] else 0
+    return report
+
+
+def open_text(binary_stream: IO[bytes]) -> IO[str]:
+    """Wrap an uploaded binary stream for line-by-line text reading"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
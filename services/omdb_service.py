@@ -1,46 +1,180 @@
 import os
+import logging
+import time
 import requests
-from typing import Optional, Dict
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .cache import LookupCache, SingleFlight, SQLiteStore, normalize_title
+from .quota import QuotaScheduler
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PAUSE = 1.0  # seconds to hold back after a 429 without Retry-After
 
 class OMDBService:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: Optional[LookupCache] = None,
+                 base_url: str = "https://www.omdbapi.com/", max_workers: int = 8,
+                 retries: int = 3, backoff_factor: float = 0.3, timeout: float = 10, metrics=None,
+                 scheduler: Optional[QuotaScheduler] = None):
         """
         Initialize the OMDB service with an API key.
         The key can be passed directly or read from OMDB_API_KEY environment variable.
+        If a cache is given, lookups are served from it before going to the network.
+        All requests share one pooled keep-alive session that retries with exponential
+        backoff on connection errors and 5xx responses. A 429 is not retried: the lookup
+        fails and the scheduler, if any, is paused for the Retry-After time, so the
+        retry goes through it (and the daily budget) like any other call.
+        If metrics (services.metrics.Metrics) is given, each request's latency and outcome is recorded.
+        Concurrent lookups of the same title share one upstream call; if a scheduler is given,
+        upstream calls are admitted by it and lookups it sheds fail like a network error.
         """
         self.api_key = api_key or os.getenv('OMDB_API_KEY')
         if not self.api_key:
             raise ValueError("OMDB API key is required. Set it in .env file or pass it directly.")
 
-        self.base_url = "https://www.omdbapi.com/"
+        self.base_url = base_url
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = self._create_session(retries, backoff_factor, pool_size=max_workers)
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.in_flight = SingleFlight()
+
+    @staticmethod
+    def _create_session(retries: int, backoff_factor: float, pool_size: int) -> requests.Session:
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            # Otherwise urllib3 also retries any 429 that carries a Retry-After header
+            respect_retry_after_header=False,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def search_movie(self, title: str) -> Optional[Dict]:
         """
         Search for a movie by title and return its details.
         Returns None if the movie is not found.
         """
+        return self._lookup(title) or None
+
+    def search_movie_by_imdb_id(self, imdb_id: str) -> Optional[Dict]:
+        """
+        Look up a movie by its IMDb id (e.g. "tt0111161") and return its details.
+        Returns None if OMDB has no such movie.
+        """
+        return self._lookup_imdb_id(imdb_id) or None
+
+    def _lookup(self, title: str):
+        """Like search_movie, but returns False if the lookup failed"""
+        return self._cached_lookup(normalize_title(title), {'t': title}, title)
+
+    def _lookup_imdb_id(self, imdb_id: str):
+        """Like search_movie_by_imdb_id, but returns False if the lookup failed"""
+        # Prefixed, so id and title lookups get separate cache entries
+        return self._cached_lookup(f"imdb:{imdb_id.lower()}", {'i': imdb_id}, imdb_id)
+
+    def _cached_lookup(self, key: str, query: Dict, label: str):
+        if self.cache is None:
+            return self.in_flight.do(key, lambda: self._fetch_movie(query, label))
+
+        found, movie_data = self.cache.get(key)
+        if found:
+            return movie_data
+        return self.in_flight.do(key, lambda: self._fetch_and_cache(key, query, label))
+
+    def _fetch_and_cache(self, key: str, query: Dict, label: str):
+        # The previous leader for this key may have finished between our cache miss and
+        # in_flight.do(); its result is in the local tier (checked without counting a miss)
+        found, movie_data = self.cache.local.get(key)
+        if found:
+            return movie_data
+        movie_data = self._fetch_movie(query, label)
+        if movie_data is not False:
+            # Cached before the in-flight call is released, so later callers find it
+            self.cache.set(key, movie_data)
+        return movie_data
+
+    def search_movies_batch(self, titles: List[str], report_failures: bool = False) -> List[Optional[Dict]]:
+        """
+        Look up many titles concurrently on a bounded thread pool.
+        Each distinct (normalized) title is fetched once; results are returned
+        in the same order as the input, with None for titles that were not found.
+        With report_failures, titles whose lookup failed (and may succeed later) get False.
+        """
+        lookup = self._lookup if report_failures else self.search_movie
+        return self._batch(titles, normalize_title, lookup)
+
+    def search_imdb_ids_batch(self, imdb_ids: List[str], report_failures: bool = False) -> List[Optional[Dict]]:
+        """Like search_movies_batch, for IMDb ids"""
+        lookup = self._lookup_imdb_id if report_failures else self.search_movie_by_imdb_id
+        return self._batch(imdb_ids, str.lower, lookup)
+
+    def _batch(self, values: List[str], normalize, lookup) -> List:
+        unique_values = {}
+        for value in values:
+            unique_values.setdefault(normalize(value), value)
+        if not unique_values:
+            return []
+
+        workers = min(self.max_workers, len(unique_values))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip(unique_values, executor.map(lookup, unique_values.values())))
+        return [results[normalize(value)] for value in values]
+
+    def _fetch_movie(self, query: Dict, label: str):
+        if self.scheduler is not None and not self.scheduler.acquire():
+            logger.warning("OMDB lookup for %s shed: rate limit or daily budget reached", label)
+            if self.metrics is not None:
+                self.metrics.observe_external("omdb", "shed", 0)
+            return False
+        started = time.perf_counter()
+        result = self._request_movie(query, label)
+        if self.metrics is not None:
+            outcome = "error" if result is False else ("not_found" if result is None else "found")
+            self.metrics.observe_external("omdb", outcome, time.perf_counter() - started)
+        return result
+
+    def _rate_limited(self, response) -> None:
+        try:
+            seconds = float(response.headers.get('Retry-After', RATE_LIMIT_PAUSE))
+        except ValueError:  # an HTTP date instead of seconds
+            seconds = RATE_LIMIT_PAUSE
+        logger.warning("OMDB rate limit hit, pausing lookups for %.0fs", seconds)
+        if self.scheduler is not None:
+            self.scheduler.pause(seconds)
+
+    def _request_movie(self, query: Dict, label: str):
+        """
+        Look up a movie on OMDB by title ({'t': ...}) or IMDb id ({'i': ...}).
+        Returns the movie details, None if OMDB has no such movie,
+        or False if the request failed (failures must not be cached).
+        """
         params = {
             'apikey': self.api_key,
-            't': title,
+            **query,
             'type': 'movie',
             'r': 'json'  # Explizit JSON-Response anfordern
         }
 
         try:
-            print(f"Making request to OMDB for {title} with API key: {self.api_key}")  # Debug
-            response = requests.get(
+            response = self.session.get(
                 self.base_url,
                 params=params,
-                timeout=10,
+                timeout=self.timeout,
                 verify=True
             )
-            print(f"Response status code: {response.status_code}")  # Debug
-            print(f"Response content: {response.text}")  # Debug
-
+            if response.status_code == 429:
+                self._rate_limited(response)
             response.raise_for_status()
             data = response.json()
 
@@ -50,32 +184,57 @@ class OMDBService:
                 except ValueError:
                     rating = 0.0
 
-                movie_data = {
-                    'title': data.get('Title', title),
+                return {
+                    'title': data.get('Title', label),
                     'director': data.get('Director', 'Unknown'),
                     'year': data.get('Year', 'N/A'),
                     'rating': rating,
-                    'poster': data.get('Poster', 'N/A')
+                    'poster': data.get('Poster', 'N/A'),
+                    'imdb_id': data.get('imdbID')
                 }
-                print(f"Processed movie data: {movie_data}")  # Debug
-                return movie_data
 
-            print(f"No data found for movie: {title}, Response: {data}")  # Debug
+            logger.debug("No OMDB data found for movie: %s", label)
             return None
 
         except requests.RequestException as e:
-            print(f"Error making request for {title}: {str(e)}")  # Debug
-            return None
+            logger.warning("OMDB request for %s failed: %s", label, e)
+            return False
         except Exception as e:
-            print(f"Unexpected error for {title}: {str(e)}")  # Debug
-            return None
+            logger.exception("Unexpected error looking up %s: %s", label, e)
+            return False
 
     @classmethod
-    def create_from_env(cls) -> 'OMDBService':
+    def create_from_env(cls, cache_path: str = None) -> 'OMDBService':
         """
-        Factory method to create an OMDBService from environment variables
+        Factory method to create an OMDBService from environment variables.
+        Lookups are cached in memory; if a cache path is given (or OMDB_CACHE_PATH is set),
+        the cache is also kept in a SQLite file shared by all workers.
+        TTLs and size can be tuned with OMDB_CACHE_TTL, OMDB_CACHE_NEGATIVE_TTL and OMDB_CACHE_SIZE,
+        the batch concurrency with OMDB_MAX_WORKERS.
+        Upstream calls are limited to OMDB_RATE per second (bursts of OMDB_BURST) and
+        OMDB_DAILY_BUDGET per day, counted in the cache file when there is one;
+        calls wait up to OMDB_QUEUE_TIMEOUT seconds for their turn before being shed.
         """
         api_key = os.getenv('OMDB_API_KEY')
         if not api_key:
             raise ValueError("OMDB_API_KEY must be set in .env file")
-        return cls(api_key)
+
+        cache_path = os.getenv('OMDB_CACHE_PATH', cache_path)
+        cache = LookupCache(
+            ttl=float(os.getenv('OMDB_CACHE_TTL', 24 * 3600)),
+            negative_ttl=float(os.getenv('OMDB_CACHE_NEGATIVE_TTL', 15 * 60)),
+            max_entries=int(os.getenv('OMDB_CACHE_SIZE', 1024)),
+            shared_store=SQLiteStore(cache_path) if cache_path else None
+        )
+        daily_budget = int(os.getenv('OMDB_DAILY_BUDGET', 1000))
+        scheduler = QuotaScheduler(
+            rate=float(os.getenv('OMDB_RATE', 10)),
+            burst=int(os.getenv('OMDB_BURST', 10)),
+            daily_budget=daily_budget if daily_budget > 0 else None,
+            max_wait=float(os.getenv('OMDB_QUEUE_TIMEOUT', 2)),
+            budget_path=cache_path
+        )
+        return cls(api_key, cache=cache,
+                   base_url=os.getenv('OMDB_BASE_URL', "https://www.omdbapi.com/"),
+                   max_workers=int(os.getenv('OMDB_MAX_WORKERS', 8)),
+                   scheduler=scheduler)
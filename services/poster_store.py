@@ -0,0 +1,139 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it thumbnails are served at full size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Hosts OMDB serves posters from
+DEFAULT_ALLOWED_HOSTS = ('m.media-amazon.com', 'ia.media-imdb.com', 'img.omdbapi.com')
+
+# Bounding boxes (width, height) for generated sizes; "full" is the original download
+POSTER_SIZES = {
+    'thumb': (300, 450),
+    'small': (120, 180),
+}
+
+
+class PosterStore:
+    """
+    Content-addressed on-disk cache of poster images.
+
+    Each poster URL is downloaded once; the bytes are stored under their SHA-256
+    digest (so identical images are stored once) and a small index file maps the
+    URL to that digest. Thumbnails are generated on first use and kept next to
+    the originals. All files are written atomically, so several workers can share
+    one directory.
+    """
+
+    MAX_BYTES = 5 * 1024 * 1024
+    RETRY_FAILED_AFTER = 3600  # seconds before a failed download is attempted again
+
+    def __init__(self, root: str, allowed_hosts: Iterable[str] = DEFAULT_ALLOWED_HOSTS,
+                 session: Optional[requests.Session] = None, timeout: float = 10):
+        self.root = root
+        self.allowed_hosts = set(allowed_hosts)
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def is_allowed(self, url: str) -> bool:
+        parsed = urlparse(url or '')
+        return parsed.scheme in ('http', 'https') and parsed.hostname in self.allowed_hosts
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _url_index_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self._path('urls', key[:2], key)
+
+    def _original_path(self, digest: str) -> str:
+        return self._path('originals', digest[:2], digest)
+
+    def _size_path(self, digest: str, size: str) -> str:
+        return self._path(size, digest[:2], digest + '.jpg')
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def fetch(self, url: str) -> Optional[str]:
+        """Make sure the poster at url is stored; returns its digest or None if unavailable"""
+        index_path = self._url_index_path(url)
+        try:
+            with open(index_path) as index:
+                return index.read().strip()
+        except FileNotFoundError:
+            pass
+
+        if not self.is_allowed(url):
+            return None
+        with self._lock:
+            failed_at = self._failed.get(url)
+        if failed_at and time.time() - failed_at < self.RETRY_FAILED_AFTER:
+            return None
+
+        try:
+            response = self.session.get(url, timeout=self.timeout, stream=True)
+            response.raise_for_status()
+            data = response.raw.read(self.MAX_BYTES + 1, decode_content=True)
+            if len(data) > self.MAX_BYTES or not data:
+                raise ValueError(f"poster size {len(data)} bytes not accepted")
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Poster download failed for %s: %s", url, e)
+            with self._lock:
+                self._failed[url] = time.time()
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self._original_path(digest)):
+            self._write_atomic(self._original_path(digest), data)
+        self._write_atomic(index_path, digest.encode())
+        return digest
+
+    def get(self, url: str, size: str = 'full') -> Optional[Tuple[str, str]]:
+        """
+        Return (file path, etag) for the poster in the given size, downloading
+        and resizing it on first use. Returns None if the poster is unavailable.
+        """
+        if size != 'full' and size not in POSTER_SIZES:
+            raise ValueError(f"Unknown poster size: {size}")
+        digest = self.fetch(url)
+        if digest is None:
+            return None
+
+        original = self._original_path(digest)
+        if size == 'full' or Image is None:
+            return original, digest
+
+        path = self._size_path(digest, size)
+        if not os.path.exists(path):
+            try:
+                with Image.open(original) as image:
+                    image = image.convert('RGB')
+                    image.thumbnail(POSTER_SIZES[size])
+                    buffer = io.BytesIO()
+                    image.save(buffer, 'JPEG', quality=85, optimize=True)
+                self._write_atomic(path, buffer.getvalue())
+            except OSError as e:
+                logger.warning("Could not resize poster %s: %s", digest, e)
+                return original, digest
+        return path, f"{digest}-{size}"
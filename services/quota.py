@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+
+class QuotaScheduler:
+    """
+    Admission control for calls to a metered upstream API.
+
+    A token bucket limits this process to `rate` calls per second (bursts up to
+    `burst`); callers wait in line for a token for at most `max_wait` seconds,
+    with at most `max_queue` callers waiting. Every admitted call also takes one
+    unit of the daily budget (reset at midnight UTC). If a budget_path is given
+    the budget is counted in a SQLite file, so all workers sharing an API key
+    share one budget. Calls that would exceed any limit are shed: acquire()
+    returns False and the caller should treat the lookup as failed. When the
+    upstream answers 429 anyway, pause() holds back all calls for a while.
+    """
+
+    def __init__(self, rate: float = 10, burst: int = 10, daily_budget: Optional[int] = 1000,
+                 max_wait: float = 2, max_queue: int = 50, budget_path: Optional[str] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive; use daily_budget to stop calls altogether")
+        self.rate = rate
+        self.burst = burst
+        self.daily_budget = daily_budget
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.budget_path = budget_path
+
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._used = {}  # day -> calls, when the budget isn't shared
+        self.admitted = 0
+        self.shed_rate = 0
+        self.shed_budget = 0
+        self.pauses = 0
+
+        if budget_path:
+            with self._connection() as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS quota (
+                    day TEXT PRIMARY KEY,
+                    used INTEGER NOT NULL
+                )""")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.budget_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _take_token(self) -> bool:
+        deadline = time.monotonic() + self.max_wait
+        queued = False
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    wait = (1 - self._tokens) / self.rate
+                    if now + wait > deadline or (not queued and self._waiting >= self.max_queue):
+                        self.shed_rate += 1
+                        return False
+                    if not queued:
+                        self._waiting += 1
+                        queued = True
+                time.sleep(wait)
+        finally:
+            if queued:
+                with self._lock:
+                    self._waiting -= 1
+
+    def _take_budget(self) -> bool:
+        if self.daily_budget is None:
+            return True
+        day = self._today()
+        if not self.budget_path:
+            with self._lock:
+                if self._used.get(day, 0) >= self.daily_budget:
+                    return False
+                self._used = {day: self._used.get(day, 0) + 1}
+                return True
+        with self._connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO quota (day, used) VALUES (?, 0)", (day,))
+            return conn.execute("UPDATE quota SET used = used + 1 WHERE day = ? AND used < ?",
+                                (day, self.daily_budget)).rowcount == 1
+
+    def acquire(self) -> bool:
+        """Wait for permission to make one upstream call; False if the call must be shed"""
+        if not self._take_token():
+            return False
+        if not self._take_budget():
+            with self._lock:
+                self.shed_budget += 1
+            return False
+        with self._lock:
+            self.admitted += 1
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """Admit no calls for the next `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # The bucket refills from below zero, so callers wait (or are shed) until then
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self.pauses += 1
+
+    def used_today(self) -> int:
+        day = self._today()
+        if not self.budget_path:
+            return self._used.get(day, 0)
+        row = self._connection().execute("SELECT used FROM quota WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self) -> Dict:
+        used = self.used_today()
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "tokens": round(self._tokens, 2),
+                "waiting": self._waiting,
+                "daily_budget": self.daily_budget,
+                "used_today": used,
+                "remaining_today": None if self.daily_budget is None else max(self.daily_budget - used, 0),
+                "admitted": self.admitted,
+                "shed_rate": self.shed_rate,
+                "shed_budget": self.shed_budget,
+                "pauses": self.pauses,
+            }
@@ -0,0 +1,67 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarityRefresher:
+    """
+    Background thread that rebuilds the similar-movies and recommendation tables
+    (see datamanager/similarity.py) every `interval` seconds, but only if something
+    was written since the last build. The first check runs right after start, so a
+    fresh database gets its tables without waiting. Requests only read the tables.
+    """
+
+    def __init__(self, app, data_manager, interval: float = 3600, top_k: int = 20,
+                 min_common: int = 1, per_user: int = 20):
+        self.app = app
+        self.data_manager = data_manager
+        self.interval = interval
+        self.top_k = top_k
+        self.min_common = min_common
+        self.per_user = per_user
+
+        self.builds = 0
+        self.last_report: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "SimilarityRefresher":
+        self._thread = threading.Thread(target=self._run, name="similarity-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception("Similarity rebuild failed")
+            self._stop.wait(self.interval)
+
+    def run_once(self, force: bool = False) -> Optional[Dict]:
+        """Rebuild if anything changed (always with force); needs an app context. Returns the build report"""
+        report = self.data_manager.rebuild_similarities(self.top_k, self.min_common, self.per_user,
+                                                        if_changed=not force)
+        if report:
+            self.builds += 1
+            self.last_report = report
+            logger.info("Rebuilt similar movies for %d movies (%d pairs) in %.2fs with %s",
+                        report["movies"], report["pairs"], report["seconds"], report["engine"])
+        return report
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._thread is not None,
+            "interval": self.interval,
+            "builds": self.builds,
+            "last_build": self.data_manager.get_similarity_build(),
+        }
@@ -0,0 +1,264 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from .cache import normalize_title
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over movie titles and directors for typeahead.
+
+    Every word-start suffix of a title or director ("the dark knight",
+    "dark knight", "knight") is stored case-folded in one sorted list, so a
+    lookup is a binary search plus a short scan of the matching range.
+    Matches on the first word rank before matches inside the text; ties are
+    broken by rating. Lookups never touch the database.
+
+    Short prefixes match a large part of the index, so their ranked top
+    suggestions are kept per prefix: the one- and two-letter prefixes when the
+    index is built, others once a lookup had to rank more than CACHE_MIN_MATCHES
+    entries. Added movies are ranked into the kept lists; a list that loses an
+    entry is dropped and ranked again by the next lookup.
+    """
+
+    TOP_K = 20  # suggestions kept per prefix; lookups with a larger limit rank the whole range
+    CACHE_MIN_MATCHES = 500
+    WARM_PREFIX_LENGTH = 2
+
+    def __init__(self):
+        self._keys: List[str] = []
+        # (not at_start, -rating, value, movie_id, kind): entries compare in rank order
+        self._entries: List[Tuple[bool, float, str, int, str]] = []
+        self._movies: Dict[int, Tuple[str, str, float]] = {}  # movie_id -> (name, director, rating)
+        # prefix -> its best TOP_K entries, one per suggestion, in rank order; all of them if fewer
+        self._top: Dict[str, List[Tuple[bool, float, str, int, str]]] = {}
+        self._generation = 0  # changes with every write, so a lookup doesn't keep a list ranked before it
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys_for(movie_id: int, name: str, director: str, rating: float):
+        for kind, value in (('title', name), ('director', director)):
+            words = normalize_title(value or '').split()
+            for i in range(len(words)):
+                yield ' '.join(words[i:]), (i != 0, -(rating or 0), value, movie_id, kind)
+
+    @staticmethod
+    def _rank(matches: List[Tuple], limit: int) -> List[Tuple]:
+        """The best entry of each of the first `limit` distinct suggestions among matches"""
+        # All matches are ranked, but only as far as needed: a heap is popped in rank
+        # order until there are enough distinct suggestions
+        heapq.heapify(matches)
+        ranked, seen = [], set()
+        while matches and len(ranked) < limit:
+            entry = heapq.heappop(matches)
+            if (entry[4], entry[2].casefold()) in seen:
+                continue
+            seen.add((entry[4], entry[2].casefold()))
+            ranked.append(entry)
+        return ranked
+
+    def build(self, movies: Iterable[Dict]) -> None:
+        """Replace the index contents with the given movie dicts"""
+        records, pairs = {}, []
+        for movie in movies:
+            records[movie['id']] = (movie['name'], movie['director'], movie['rating'] or 0)
+            pairs.extend(self._keys_for(movie['id'], movie['name'], movie['director'], movie['rating']))
+        pairs.sort(key=lambda pair: pair[0])
+        keys = [key for key, _ in pairs]
+        entries = [entry for _, entry in pairs]
+        top = {}
+        for length in range(1, self.WARM_PREFIX_LENGTH + 1):
+            # Keys sharing a prefix are adjacent: jump from one prefix's run to the next
+            start = 0
+            while start < len(keys):
+                prefix = keys[start][:length]
+                if len(prefix) < length:
+                    start += 1  # a shorter key sorts before the longer keys it prefixes
+                    continue
+                end = bisect.bisect_left(keys, prefix + '\uffff', start)
+                top[prefix] = self._rank(entries[start:end], self.TOP_K)
+                start = end
+        with self._lock:
+            self._movies = records
+            self._keys = keys
+            self._entries = entries
+            self._top = top
+            self._generation += 1
+
+    def add(self, movie_id: int, name: str, director: str, rating: float) -> None:
+        """Insert or replace one movie"""
+        with self._lock:
+            self._remove(movie_id)
+            self._movies[movie_id] = (name, director, rating or 0)
+            for key, entry in self._keys_for(movie_id, name, director, rating):
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._entries.insert(position, entry)
+                for length in range(1, len(key) + 1):
+                    top = self._top.get(key[:length])
+                    if top is not None:
+                        self._offer(top, entry)
+            self._generation += 1
+
+    def _offer(self, top: List[Tuple], entry: Tuple) -> None:
+        suggestion = (entry[4], entry[2].casefold())
+        for position, kept in enumerate(top):
+            if (kept[4], kept[2].casefold()) == suggestion:
+                if kept <= entry:
+                    return
+                del top[position]
+                break
+        bisect.insort(top, entry)
+        del top[self.TOP_K:]
+
+    def remove(self, movie_id: int) -> None:
+        with self._lock:
+            self._remove(movie_id)
+            self._generation += 1
+
+    def _remove(self, movie_id: int) -> None:
+        record = self._movies.pop(movie_id, None)
+        if record is None:
+            return
+        for key, _ in self._keys_for(movie_id, *record):
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._entries[position][3] == movie_id:
+                    del self._keys[position]
+                    del self._entries[position]
+                    break
+                position += 1
+            for length in range(1, len(key) + 1):
+                top = self._top.get(key[:length])
+                # The entry that would take its place isn't known; rank again on the next lookup
+                if top is not None and any(kept[3] == movie_id for kept in top):
+                    del self._top[key[:length]]
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Return up to limit suggestions for a prefix, each a dict with
+        'kind' ("title" or "director"), 'value' and 'movie_id'.
+        A director appears once, however many of their movies match.
+        """
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            ranked = self._top.get(prefix) if limit <= self.TOP_K else None
+            if ranked is not None:
+                ranked = ranked[:limit]
+            else:
+                start = bisect.bisect_left(self._keys, prefix)
+                end = bisect.bisect_left(self._keys, prefix + '\uffff', start)
+                matches = self._entries[start:end]
+                generation = self._generation
+
+        if ranked is None:
+            keep = limit <= self.TOP_K and len(matches) >= self.CACHE_MIN_MATCHES
+            ranked = self._rank(matches, self.TOP_K if keep else limit)
+            if keep:
+                with self._lock:
+                    if self._generation == generation:
+                        self._top[prefix] = ranked
+                ranked = ranked[:limit]
+        return [{'kind': kind, 'value': value, 'movie_id': movie_id}
+                for _, _, value, movie_id, kind in ranked]
+
+
+class SuggestService:
+    """
+    A SuggestIndex kept in step with the catalog. This worker's writes are applied
+    as they commit, and the version bumps they made are counted; writes from other
+    workers are picked up by a background rebuild once the version of `scope` (the
+    catalog's data version) has moved further than our own bumps account for,
+    checked at most every recheck_seconds. Nothing is loaded until start() or the
+    first lookup, which build the index in the background; lookups made before the
+    build finishes return no suggestions.
+    """
+
+    BUILD_ATTEMPTS = 3
+
+    def __init__(self, app, data_manager, scope: str, recheck_seconds: float = 30):
+        self.app = app
+        self.data_manager = data_manager
+        self.scope = scope
+        self.recheck_seconds = recheck_seconds
+        self.index = SuggestIndex()
+        self.version = None
+        self._own_bumps = 0  # bumps of scope committed by this worker since version was read
+        self._checked_at = None
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        data_manager.subscribe(self._on_write)
+
+    def start(self) -> "SuggestService":
+        self.schedule_rebuild()
+        return self
+
+    def rebuild(self) -> None:
+        """Build the index from the catalog in the calling thread"""
+        with self.app.app_context():
+            try:
+                for _ in range(self.BUILD_ATTEMPTS):
+                    with self._lock:
+                        version, _ = self.data_manager.get_data_version(self.scope)
+                        self._own_bumps = 0
+                    self.index.build(self.data_manager.iter_all_movies())
+                    # The catalog isn't read in one transaction, and the build replaces whatever
+                    # write events added meanwhile: if the version moved, build again
+                    if self.data_manager.get_data_version(self.scope)[0] == version:
+                        break
+                else:
+                    with self._lock:
+                        # Still changing: forget the bumps, so the next refresh() rebuilds
+                        self._own_bumps = 0
+                        self._checked_at = None
+                self.version = version
+            except Exception:
+                logger.exception("Could not build suggest index")
+            finally:
+                self._rebuilding = False
+
+    def schedule_rebuild(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self.rebuild, name="suggest-rebuild", daemon=True).start()
+
+    def refresh(self) -> None:
+        """Rebuild in the background if another worker changed the catalog; needs an app context"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.recheck_seconds:
+            return
+        self._checked_at = now
+        with self._lock:
+            version, _ = self.data_manager.get_data_version(self.scope)
+            if self.version is not None and version == self.version + self._own_bumps:
+                self.version, self._own_bumps = version, 0
+                return
+        self.schedule_rebuild()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        self.refresh()
+        return self.index.suggest(prefix, limit)
+
+    def _on_write(self, event: str, data: Dict) -> None:
+        if event == 'movie_saved':
+            self.index.add(data['id'], data['name'], data['director'], data['rating'])
+        elif event == 'movie_deleted':
+            self.index.remove(data['id'])
+        elif event == 'catalog_changed':
+            self.schedule_rebuild()
+        elif event == 'versions_bumped':
+            with self._lock:
+                self._own_bumps += data.get(self.scope, 0)
@@ -19,12 +19,13 @@ async function searchMovie() {
             document.getElementById('year').value = data.year || '';
             document.getElementById('rating').value = data.rating || '';
             document.getElementById('poster').value = data.poster || '';
+            document.getElementById('imdb_id').value = data.imdb_id || '';
 
             // Show search results with movie cover
             resultsDiv.innerHTML = `
                 <div class="movie-result">
                     <div class="movie-poster">
-                        <img src="${data.poster !== 'N/A' ? data.poster : '/static/images/no-poster.jpg'}"
+                        <img src="${data.poster && data.poster !== 'N/A' ? `/posters/thumb?url=${encodeURIComponent(data.poster)}` : '/static/images/no-poster.jpg'}"
                              alt="${data.title} poster">
                     </div>
                     <div class="movie-info">
@@ -42,3 +43,54 @@ async function searchMovie() {
         resultsDiv.innerHTML = '<p class="error">An error occurred during the search</p>';
     }
 }
+
+// Typeahead: fill the input's <datalist> from /api/suggest while the user types.
+// Requests are debounced, a newer keystroke cancels the request in flight,
+// and answers are kept per prefix so backspacing doesn't hit the server again.
+function attachSuggest(input, delay = 150) {
+    const list = document.getElementById(input.getAttribute('list'));
+    const answers = new Map();
+    let timer = null;
+    let controller = null;
+
+    function show(suggestions) {
+        list.innerHTML = '';
+        for (const suggestion of suggestions) {
+            const option = document.createElement('option');
+            option.value = suggestion.value;
+            option.label = suggestion.kind === 'director' ? 'Director' : 'Movie';
+            list.appendChild(option);
+        }
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const prefix = input.value.trim().toLowerCase();
+        if (prefix.length < 2) {
+            show([]);
+            return;
+        }
+        if (answers.has(prefix)) {
+            show(answers.get(prefix));
+            return;
+        }
+        timer = setTimeout(async () => {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            try {
+                const response = await fetch(`/api/suggest?q=${encodeURIComponent(prefix)}`,
+                                             {signal: controller.signal});
+                if (!response.ok) return;
+                const suggestions = await response.json();
+                answers.set(prefix, suggestions);
+                if (input.value.trim().toLowerCase() === prefix) show(suggestions);
+            } catch (error) {
+                if (error.name !== 'AbortError') console.error('Error:', error);
+            }
+        }, delay);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('input[data-suggest]').forEach(input => attachSuggest(input));
+});
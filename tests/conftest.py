@@ -0,0 +1,41 @@
+import pytest
+
+from app import create_app, shutdown
+
+BACKENDS = ("sqlite", "memory")
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    """DATA_BACKEND of the app; modules that test one backend override this fixture"""
+    return request.param
+
+
+@pytest.fixture
+def app(tmp_path, backend):
+    """A fresh app on its own database file, without background threads"""
+    application = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'movieweb.db'}",
+        "DATA_BACKEND": backend,
+        "BACKGROUND_THREADS": False,
+        "METRICS_PATH": str(tmp_path / "metrics.db"),
+        "POSTER_CACHE_PATH": str(tmp_path / "posters"),
+    })
+    yield application
+    shutdown(application)
+
+
+@pytest.fixture
+def data_manager(app):
+    """
+    The app's data manager, inside an app context. Not for tests that use the client:
+    requests reuse a pushed app context, so they would share its g.
+    """
+    with app.app_context():
+        yield app.extensions["movieweb"]["data_manager"]
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
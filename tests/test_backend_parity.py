@@ -0,0 +1,139 @@
+"""
+Every read must give the same answer on both backends. Each test writes through
+the app's data manager (or, for another worker's writes, a separate connection)
+and compares all reads with a plain SQLiteDataManager on the same database, so
+the memory backend's incremental updates and reloads are checked against SQL.
+"""
+import random
+
+import pytest
+from sqlalchemy import text
+
+from benchmarks.backend_parity import outcome, read_calls
+from benchmarks.datagen import seed
+from datamanager import versions
+from datamanager.models import db
+from datamanager.sqlite_data_manager import MovieNotFoundError, SQLiteDataManager
+from services import movie_batch
+
+
+@pytest.fixture
+def counts(data_manager):
+    with db.engine.begin() as connection:
+        return seed(connection, users=20, movies=300, links_per_user=10)
+
+
+@pytest.fixture
+def calls(counts):
+    return read_calls(counts, random.Random(1), samples=10)
+
+
+def assert_same_reads(data_manager, calls):
+    reference = SQLiteDataManager()
+    for description, call in calls:
+        assert outcome(call, data_manager) == outcome(call, reference), description
+
+
+def test_seeded_by_another_worker(data_manager, calls):
+    assert_same_reads(data_manager, calls)
+
+
+def test_add_user_movie_and_links(data_manager, counts, calls):
+    user_id = counts["first_user_id"]
+    new_user = data_manager.add_user("Parity User")
+    new_movie = data_manager.add_movie("Parity Movie", "Someone", 1999, 7.5)
+    data_manager.add_user_movie(new_user, new_movie)
+    data_manager.add_user_movie(user_id, new_movie)
+
+    user, movies = data_manager.get_user_with_movies(new_user)
+    assert user["name"] == "Parity User"
+    assert [movie["name"] for movie in movies] == ["Parity Movie"]
+    calls.append(("new movie", lambda dm: dm.get_user_and_movie(user_id, new_movie)))
+    assert_same_reads(data_manager, calls)
+
+
+def test_update_unlink_delete(data_manager, counts, calls):
+    user_id, movie_id = counts["first_user_id"], counts["first_movie_id"]
+    linked = data_manager.get_user_movies(user_id)[0]["id"]
+    data_manager.update_movie(movie_id, "Renamed", "Other", 2001, 3.0)
+    data_manager.remove_user_movie(user_id, linked)
+    data_manager.delete_movie(movie_id + 1)
+
+    assert data_manager.get_movie(movie_id)["name"] == "Renamed"
+    assert linked not in [movie["id"] for movie in data_manager.get_user_movies(user_id)]
+    with pytest.raises(MovieNotFoundError):
+        data_manager.get_movie(movie_id + 1)
+    assert_same_reads(data_manager, calls)
+
+
+def test_edit_shared_user_movie(data_manager, counts, calls):
+    user_id = counts["first_user_id"]
+    movie_id = data_manager.get_user_movies(user_id)[0]["id"]
+    data_manager.add_user_movie(user_id + 1, movie_id)
+    own_id = data_manager.update_user_movie(user_id, movie_id, "Mine", "Me", 2001, 2.0)
+
+    assert own_id != movie_id
+    assert data_manager.get_movie(movie_id)["name"] != "Mine"
+    calls.append(("edited copy", lambda dm: dm.get_user_and_movie(user_id, own_id)))
+    assert_same_reads(data_manager, calls)
+
+
+def test_batch(data_manager, counts, calls):
+    user_id, movie_id = counts["first_user_id"], counts["first_movie_id"]
+    movie_batch.apply_batch(data_manager, user_id, {
+        "add": [{"movie_id": movie_id + 2}, {"name": "Batch Movie"}],
+        "update": [{"movie_id": movie_id + 2, "rating": 9.0}],
+        "remove": [movie_id + 3]})
+    assert_same_reads(data_manager, calls)
+
+
+def test_import(data_manager, counts, calls):
+    data_manager.import_movies([{"user_id": counts["first_user_id"], "name": f"Imported {i}",
+                                 "director": "Someone", "year": 2000, "rating": 5.0, "poster": None,
+                                 "imdb_id": None} for i in range(50)])
+    assert_same_reads(data_manager, calls)
+
+
+def test_import_past_the_largest_rowid(data_manager, counts, calls):
+    # Once the largest rowid is taken SQLite picks new rowids at random, so they are neither
+    # max(id) + 1 nor in insertion order; links and enrichment jobs must follow the real ids
+    user_id = counts["first_user_id"]
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO movie (id, name, director, year, rating, poster) "
+                                "VALUES (9223372036854775807, 'Last', 'Someone', 2000, 5.0, 'x.jpg')"))
+        versions.bump(connection, versions.CATALOG)
+    data_manager.import_movies([{"user_id": user_id, "name": f"Imported {i}", "director": "Someone",
+                                 "year": 2000, "rating": 5.0, "poster": None if i % 2 else "x.jpg",
+                                 "imdb_id": None} for i in range(20)])
+
+    imported = {movie["name"]: movie["id"] for movie in data_manager.get_user_movies(user_id)
+                if movie["name"].startswith("Imported ")}
+    assert len(imported) == 20
+    with db.engine.connect() as connection:
+        queued = set(connection.execute(text("SELECT movie_id FROM enrichment_job")).scalars())
+    assert queued == {imported[f"Imported {i}"] for i in range(1, 20, 2)}
+    assert_same_reads(data_manager, calls)
+
+
+def test_write_by_another_worker(data_manager, counts, calls):
+    movie_id = counts["first_movie_id"]
+    assert_same_reads(data_manager, calls)  # the memory backend has loaded its copy
+    with db.engine.begin() as connection:
+        connection.execute(text("UPDATE movie SET name = 'Changed elsewhere' WHERE id = :id"), {"id": movie_id})
+        connection.execute(text("DELETE FROM user_movies WHERE movie_id = :id"), {"id": movie_id + 5})
+        versions.bump(connection, versions.CATALOG)
+
+    assert data_manager.get_movie(movie_id)["name"] == "Changed elsewhere"
+    assert_same_reads(data_manager, calls)
+
+
+def test_link_to_missing_movie(data_manager, counts, calls):
+    # A link whose movie row is gone (foreign keys are not enforced) is skipped, not an error
+    user_id = counts["first_user_id"]
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO user_movies (user_id, movie_id) VALUES (:user_id, 10000000)"),
+                           {"user_id": user_id})
+        versions.bump(connection, versions.user_scope(user_id))
+
+    assert 10_000_000 not in [movie["id"] for movie in data_manager.get_user_movies(user_id)]
+    assert_same_reads(data_manager, calls)
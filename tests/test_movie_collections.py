@@ -0,0 +1,60 @@
+"""
+/movie_collections links a fixed window of pages, and Previous/Next seek by
+keyset cursor in both directions.
+"""
+import re
+from html import unescape
+
+import pytest
+from sqlalchemy import text
+
+from datamanager.models import db
+
+MOVIES = 500  # 50 pages of 10
+
+
+@pytest.fixture
+def movie_ids(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("INSERT INTO movie (name, director, year, rating, poster) "
+                                    "VALUES (:name, 'Director', 2000, 7.0, 'x.jpg')"),
+                               [{"name": f"Movie {i}"} for i in range(MOVIES)])
+            return list(connection.execute(text("SELECT id FROM movie ORDER BY id")).scalars())
+
+
+def links(html):
+    return {unescape(label).strip(): unescape(href) for href, label in
+            re.findall(r'<a href="(/movie_collections[^"]*)"[^>]*>\s*([^<]+?)\s*</a>', html)}
+
+
+def shown(html):
+    return re.findall(r"<h2>(Movie \d+)</h2>", html)
+
+
+def test_only_a_window_of_pages_is_linked(client, movie_ids):
+    html = client.get("/movie_collections?page=25").get_data(as_text=True)
+    numbers = sorted(int(label) for label in links(html) if label.isdigit())
+    assert numbers == [1, 23, 24, 25, 26, 27, 50]
+
+
+def test_previous_and_next_use_keyset_cursors(client, movie_ids):
+    page_2 = client.get("/movie_collections?page=2").get_data(as_text=True)
+    assert shown(page_2) == [f"Movie {i}" for i in range(10, 20)]
+    assert f"after={movie_ids[19]}" in links(page_2)["Next »"]
+    assert f"before={movie_ids[10]}" in links(page_2)["« Previous"]
+
+    page_3 = client.get(links(page_2)["Next »"]).get_data(as_text=True)
+    assert shown(page_3) == [f"Movie {i}" for i in range(20, 30)]
+    page_2_again = client.get(links(page_3)["« Previous"]).get_data(as_text=True)
+    assert shown(page_2_again) == shown(page_2)
+
+    page_1 = client.get(links(page_2)["« Previous"]).get_data(as_text=True)
+    assert shown(page_1) == [f"Movie {i}" for i in range(10)]
+    assert "« Previous" not in links(page_1)
+
+
+def test_previous_past_the_start_shows_the_first_page(client, movie_ids):
+    html = client.get(f"/movie_collections?page=4&before={movie_ids[3]}").get_data(as_text=True)
+    assert shown(html) == [f"Movie {i}" for i in range(10)]
+    assert "« Previous" not in links(html)
@@ -0,0 +1,43 @@
+import pytest
+
+from benchmarks.omdb_stub import OMDBStubServer
+from services.cache import LookupCache, normalize_title
+from services.omdb_service import OMDBService
+from services.quota import QuotaScheduler
+
+
+@pytest.fixture
+def stub():
+    server = OMDBStubServer(latency=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def service(stub):
+    return OMDBService("test", cache=LookupCache(), base_url=stub.url)
+
+
+def test_lookups_are_cached(service, stub):
+    assert service.search_movie("Heat")["title"] == "Heat"
+    assert service.search_movie(" heat ")["title"] == "Heat"
+    assert stub.request_count == 1
+
+
+def test_leader_after_a_finished_leader_does_not_fetch_again(service, stub):
+    # A caller that missed the cache just before the previous leader stored its result
+    # becomes the next leader; it must find that result instead of calling OMDB again
+    key = normalize_title("Heat")
+    service.search_movie("Heat")
+    result = service.in_flight.do(key, lambda: service._fetch_and_cache(key, {"t": "Heat"}, "Heat"))
+    assert result["title"] == "Heat"
+    assert stub.request_count == 1
+
+
+def test_imdb_id_lookup(service, stub):
+    assert service.search_movie_by_imdb_id("tt0113277")["imdb_id"] == "tt0113277"
+
+
+def test_scheduler_rejects_zero_rate():
+    with pytest.raises(ValueError):
+        QuotaScheduler(rate=0)
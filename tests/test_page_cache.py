@@ -0,0 +1,23 @@
+from sqlalchemy import text
+
+from datamanager import versions
+from datamanager.models import db
+
+
+def test_restored_database_does_not_serve_stale_pages(app, client):
+    with app.app_context():
+        user_id = app.extensions["movieweb"]["data_manager"].add_user("Ann")
+    assert b"Ann" in client.get(f"/users/{user_id}").data
+
+    # A database restored from a backup: same version counter, different contents and timestamp
+    scope = versions.user_scope(user_id)
+    with app.app_context(), db.engine.begin() as connection:
+        version, updated_at = versions.get_version(connection, scope)
+        connection.execute(text('UPDATE "user" SET name = \'Bob\' WHERE id = :id'), {"id": user_id})
+        connection.execute(text("INSERT OR REPLACE INTO data_version (scope, version, updated_at) "
+                                "VALUES (:scope, :version, :updated_at)"),
+                           {"scope": scope, "version": version, "updated_at": (updated_at or 0) + 3600})
+        versions.bump(connection, versions.ALL)  # so the memory backend reloads its copy
+
+    page = client.get(f"/users/{user_id}").data
+    assert b"Bob" in page and b"Ann" not in page
@@ -0,0 +1,82 @@
+"""
+SQL statements per request, counted on the test app's engine. The budgets are
+upper bounds for both backends and don't depend on the length of the list, so an
+extra lookup or a per-movie query (N+1) on one of these routes fails here.
+"""
+import pytest
+from sqlalchemy import event
+
+from datamanager.models import db
+
+MOVIES = 30
+
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        data_manager = app.extensions["movieweb"]["data_manager"]
+        user_id = data_manager.add_user("Ann")
+        movie_ids = [data_manager.add_movie(f"Movie {i}", "Director", 2000 + i, 7.0, "http://example.com/p.jpg")
+                     for i in range(MOVIES)]
+        for movie_id in movie_ids:
+            data_manager.add_user_movie(user_id, movie_id)
+        data_manager.get_all_users()  # bring the memory backend's copy up to date, as any earlier request would
+    return {"user_id": user_id, "movie_id": movie_ids[0], "missing": 10 ** 6}
+
+
+@pytest.fixture
+def queries(app):
+    """The statements the app sends to its database; cleared by each request() below"""
+    statements = []
+
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def request(client, queries, method, url, data=None, headers=None):
+    queries.clear()
+    response = client.open(url, method=method, data=data, headers=headers)
+    response.close()
+    return response
+
+
+@pytest.mark.parametrize("method, url, data, status, budget", [
+    ("GET", "/users/{user_id}", None, 200, 2),  # version check, user and movies in one query
+    ("GET", "/users/{missing}", None, 404, 2),
+    ("GET", "/users/{user_id}/add_movie", None, 200, 1),
+    # user check, movie, link, two version bumps and the enrichment job for the missing poster
+    ("POST", "/users/{user_id}/add_movie",
+     {"name": "New", "director": "Someone", "year": "2001", "rating": "7", "poster": ""}, 302, 6),
+    ("GET", "/users/{user_id}/update_movie/{movie_id}", None, 200, 2),
+    ("POST", "/users/{user_id}/update_movie/{movie_id}",
+     {"name": "Renamed", "director": "Director", "year": "2000", "rating": "8"}, 302, 6),
+    ("GET", "/users/{user_id}/delete_movie/{movie_id}", None, 302, 2),
+    ("GET", "/users", None, 200, 2),
+    # user check (so a missing user is never a 304), version check, data
+    ("GET", "/api/users/{user_id}/movies", None, 200, 3),
+    ("GET", "/api/users/{user_id}/stats", None, 200, 3),
+])
+def test_route_query_budget(client, ids, queries, method, url, data, status, budget):
+    response = request(client, queries, method, url.format(**ids), data)
+    assert response.status_code == status
+    assert len(queries) <= budget, "\n".join(queries)
+
+
+def test_cached_user_page_checks_only_the_version(client, ids, queries):
+    url = f"/users/{ids['user_id']}"
+    request(client, queries, "GET", url)
+    assert request(client, queries, "GET", url).status_code == 200
+    assert len(queries) == 1, "\n".join(queries)
+
+
+def test_not_modified_user_stats_skip_the_stats(client, ids, queries):
+    url = f"/api/users/{ids['user_id']}/stats"
+    etag = request(client, queries, "GET", url).headers["ETag"]
+    assert request(client, queries, "GET", url, headers={"If-None-Match": etag}).status_code == 304
+    assert len(queries) <= 2, "\n".join(queries)  # user check and version check
@@ -0,0 +1,87 @@
+"""EXPLAIN QUERY PLAN checks that lookups by name, director, year, imdb id and movie use the schema's indexes"""
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from benchmarks.datagen import seed
+from datamanager import versions
+from datamanager.migrations import SCHEMA_VERSION
+from datamanager.models import db
+
+
+@pytest.fixture
+def backend():
+    return "sqlite"
+
+
+@pytest.fixture
+def seeded(data_manager):
+    with db.engine.begin() as connection:
+        seed(connection, users=20, movies=500, links_per_user=20)
+        connection.execute(text("ANALYZE"))
+
+
+def query_plan(sql, **params):
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("sql, step", [
+    ("SELECT id FROM movie WHERE name = :name COLLATE NOCASE",
+     "SEARCH movie USING COVERING INDEX ix_movie_name_nocase (name=?)"),
+    ("SELECT id FROM movie WHERE name LIKE :pattern",
+     "SEARCH movie USING COVERING INDEX ix_movie_name_nocase (name>? AND name<?)"),
+    ("SELECT id, name FROM movie ORDER BY name COLLATE NOCASE LIMIT 20",
+     "SCAN movie USING COVERING INDEX ix_movie_name_nocase"),
+    ("SELECT id FROM movie WHERE director = :director",
+     "SEARCH movie USING COVERING INDEX ix_movie_director (director=?)"),
+    ("SELECT id FROM movie WHERE year BETWEEN :first AND :last",
+     "SEARCH movie USING COVERING INDEX ix_movie_year (year>? AND year<?)"),
+    ("SELECT id FROM movie WHERE imdb_id = :imdb_id",
+     "SEARCH movie USING COVERING INDEX ux_movie_imdb_id (imdb_id=?)"),
+    ("SELECT user_id FROM user_movies WHERE movie_id = :movie_id",
+     "SEARCH user_movies USING COVERING INDEX ix_user_movies_movie_user (movie_id=?)"),
+])
+def test_lookup_uses_index(seeded, sql, step):
+    plan = query_plan(sql, name="Heat", pattern="the%", director="Michael Mann", first=1990, last=1999,
+                      imdb_id="tt0113277", movie_id=1)
+    assert step in plan.split(" | ")
+    assert "TEMP B-TREE" not in plan  # no separate sort either
+
+
+def test_bumping_a_movies_users_uses_the_reverse_index(seeded):
+    plan = query_plan(versions._BUMP_MOVIE_USERS.text, now=0, movie_id=1)
+    assert "ix_user_movies_movie_user" in plan
+
+
+@pytest.fixture
+def legacy_app(tmp_path, request):
+    """An app opened on a database file with the original, unversioned schema"""
+    connection = sqlite3.connect(tmp_path / "movieweb.db")
+    connection.executescript("""
+        CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(100) NOT NULL);
+        CREATE TABLE movie (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(200) NOT NULL,
+                            director VARCHAR(100) NOT NULL, year INTEGER NOT NULL,
+                            rating FLOAT NOT NULL, poster VARCHAR(500));
+        CREATE TABLE user_movies (user_id INTEGER NOT NULL REFERENCES user (id),
+                                  movie_id INTEGER NOT NULL REFERENCES movie (id),
+                                  PRIMARY KEY (user_id, movie_id));
+        INSERT INTO user (id, name) VALUES (1, 'Ann');
+        INSERT INTO movie (id, name, director, year, rating) VALUES (1, 'Heat', 'Michael Mann', 1995, 8.3);
+        INSERT INTO user_movies (user_id, movie_id) VALUES (1, 1);
+    """)
+    connection.close()
+    return request.getfixturevalue("app")
+
+
+def test_existing_database_is_upgraded_in_place(legacy_app):
+    with legacy_app.app_context():
+        assert db.session.execute(text("PRAGMA user_version")).scalar() == SCHEMA_VERSION
+        indexes = set(db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        assert {"ix_movie_name_nocase", "ix_movie_director", "ix_movie_year", "ux_movie_imdb_id",
+                "ix_user_movies_movie_user"} <= indexes
+        data_manager = legacy_app.extensions["movieweb"]["data_manager"]
+        user, movies = data_manager.get_user_with_movies(1)
+        assert user["name"] == "Ann" and [movie["name"] for movie in movies] == ["Heat"]
+        assert "ix_movie_director" in query_plan("SELECT id FROM movie WHERE director = 'Michael Mann'")
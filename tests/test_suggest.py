@@ -0,0 +1,74 @@
+"""
+The suggest index keeps ranked suggestions for short prefixes; they must always
+match ranking the whole range, and a rebuild must not lose writes made while it ran.
+"""
+import random
+
+from sqlalchemy import text
+
+from datamanager import versions
+from datamanager.models import db
+from services.cache import normalize_title
+from services.suggest import SuggestIndex
+
+WORDS = ["a", "ab", "abc", "b", "ba", "bab", "c", "ca", "cab"]
+
+
+def random_movie(rng, movie_id):
+    return {"id": movie_id, "name": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))),
+            "director": rng.choice(WORDS), "rating": rng.choice([0, 5.0, 7.5, 9.0])}
+
+
+def ranked_by_scan(movies, prefix, limit):
+    prefix = normalize_title(prefix)
+    matches = [entry for movie in movies.values()
+               for key, entry in SuggestIndex._keys_for(movie["id"], movie["name"], movie["director"], movie["rating"])
+               if key.startswith(prefix)]
+    return [{"kind": kind, "value": value, "movie_id": movie_id}
+            for _, _, value, movie_id, kind in SuggestIndex._rank(matches, limit)]
+
+
+def test_kept_suggestions_match_a_full_scan():
+    rng = random.Random(1)
+    movies = {movie_id: random_movie(rng, movie_id) for movie_id in range(300)}
+    index = SuggestIndex()
+    index.CACHE_MIN_MATCHES = 5
+    index.build(movies.values())
+    assert "a" in index._top and "ab" in index._top
+
+    for step in range(2000):
+        if rng.random() < 0.3:
+            movie = random_movie(rng, rng.randint(0, 400))
+            movies[movie["id"]] = movie
+            index.add(movie["id"], movie["name"], movie["director"], movie["rating"])
+        elif rng.random() < 0.15 and movies:
+            movie_id = rng.choice(list(movies))
+            del movies[movie_id]
+            index.remove(movie_id)
+        prefix, limit = rng.choice(["a", "b", "ab", "a b", "bab", "c c"]), rng.choice([1, 5, 20, 30])
+        assert index.suggest(prefix, limit) == ranked_by_scan(movies, prefix, limit), (step, prefix, limit)
+
+
+def test_rebuild_keeps_writes_made_during_the_build(app, monkeypatch):
+    service = app.extensions["movieweb"]["suggest"]
+    data_manager = service.data_manager
+    with app.app_context():
+        data_manager.add_movie("Alien", "Ridley Scott", 1979, 8.5, "x.jpg")
+    read_catalog = data_manager.iter_all_movies
+    builds = []
+
+    def iter_all_movies_then_write(*args, **kwargs):
+        movies = list(read_catalog(*args, **kwargs))
+        if not builds:
+            # Another worker adds a movie after the build has read the catalog
+            with db.engine.begin() as connection:
+                connection.execute(text("INSERT INTO movie (name, director, year, rating, poster) "
+                                        "VALUES ('Aliens', 'James Cameron', 1986, 8.4, 'x.jpg')"))
+                versions.bump(connection, versions.CATALOG)
+        builds.append(len(movies))
+        return movies
+
+    monkeypatch.setattr(data_manager, "iter_all_movies", iter_all_movies_then_write)
+    service.rebuild()
+    assert builds == [1, 2]
+    assert [suggestion["value"] for suggestion in service.index.suggest("alien")] == ["Alien", "Aliens"]
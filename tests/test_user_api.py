@@ -0,0 +1,38 @@
+"""JSON endpoints of a single user: a user that doesn't exist is a 404 with a JSON body"""
+import pytest
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        data_manager = app.extensions["movieweb"]["data_manager"]
+        user_id = data_manager.add_user("Ann")
+        data_manager.add_user_movie(user_id, data_manager.add_movie("Heat", "Michael Mann", 1995, 8.3))
+    return user_id
+
+
+@pytest.mark.parametrize("url", [
+    "/api/users/999/movies",
+    "/api/users/999/movies?stream=1",
+    "/api/users/999/movies?fields=id,name",
+    "/api/users/999/stats",
+    "/api/users/999/recommendations",
+])
+def test_missing_user_is_a_json_404(client, url):
+    response = client.get(url)
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "User not found"}
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_user_movies(client, user_id, query):
+    response = client.get(f"/api/users/{user_id}/movies{query}")
+    assert response.status_code == 200
+    assert [movie["name"] for movie in response.get_json()] == ["Heat"]
+
+
+@pytest.mark.parametrize("url", ["/api/users/999/movies", "/api/users/999/stats"])
+def test_missing_user_is_never_not_modified(client, url):
+    # The ETag a never-written user scope would have
+    response = client.get(url, headers={"If-None-Match": '"user:999-0.0-json"'})
+    assert response.status_code == 404
@@ -0,0 +1,89 @@
+"""
+Edits from a user's list change that list only: a movie other users have too (or a
+canonical movie with an imdb_id) is copied on the first edit, and compaction doesn't
+merge the copies back while they differ.
+"""
+import pytest
+
+from datamanager.compaction import compact_movies
+from datamanager.models import db
+
+FORM = {"name": "Heat (director's cut)", "director": "Michael Mann", "year": "1995", "rating": "9"}
+
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        data_manager = app.extensions["movieweb"]["data_manager"]
+        ann, bob = data_manager.add_user("Ann"), data_manager.add_user("Bob")
+        shared = data_manager.add_movie("Heat", "Michael Mann", 1995, 8.3, "http://example.com/heat.jpg")
+        private = data_manager.add_movie("Ronin", "John Frankenheimer", 1998, 7.2, "http://example.com/ronin.jpg")
+        for user_id, movie_id in ((ann, shared), (bob, shared), (ann, private)):
+            data_manager.add_user_movie(user_id, movie_id)
+    return {"ann": ann, "bob": bob, "shared": shared, "private": private}
+
+
+def user_movies(app, user_id):
+    with app.app_context():
+        return {movie["id"]: movie for movie in app.extensions["movieweb"]["data_manager"].get_user_movies(user_id)}
+
+
+def test_editing_a_shared_movie_copies_it(app, client, ids):
+    response = client.post(f"/users/{ids['ann']}/update_movie/{ids['shared']}", data=FORM)
+    assert response.status_code == 302
+
+    ann = user_movies(app, ids["ann"])
+    assert ids["shared"] not in ann
+    copy = next(movie for movie in ann.values() if movie["id"] != ids["private"])
+    assert (copy["name"], copy["rating"], copy["poster"]) == (FORM["name"], 9.0, "http://example.com/heat.jpg")
+    bob = user_movies(app, ids["bob"])
+    assert (bob[ids["shared"]]["name"], bob[ids["shared"]]["rating"]) == ("Heat", 8.3)
+
+
+def test_editing_a_private_movie_updates_it_in_place(app, client, ids):
+    response = client.post(f"/users/{ids['ann']}/update_movie/{ids['private']}", data=dict(FORM, name="Ronin"))
+    assert response.status_code == 302
+    assert user_movies(app, ids["ann"])[ids["private"]]["rating"] == 9.0
+
+
+def test_movies_outside_the_list_cannot_be_edited(app, client, ids):
+    assert client.get(f"/users/{ids['bob']}/update_movie/{ids['private']}").status_code == 404
+    assert client.post(f"/users/{ids['bob']}/update_movie/{ids['private']}", data=FORM).status_code == 404
+    assert user_movies(app, ids["ann"])[ids["private"]]["name"] == "Ronin"
+
+
+def test_compaction_keeps_edited_copies(app, client, ids):
+    client.post(f"/users/{ids['ann']}/update_movie/{ids['shared']}", data=dict(FORM, name="Heat"))
+    with app.app_context():
+        data_manager = app.extensions["movieweb"]["data_manager"]
+        carl = data_manager.add_user("Carl")
+        duplicate = data_manager.add_movie(" Heat", "Michael Mann", 1995, 8.3, "http://example.com/heat.jpg")
+        data_manager.add_user_movie(carl, duplicate)
+        with db.engine.begin() as connection:
+            report = compact_movies(connection)
+
+    # Carl's duplicate differs only in whitespace and is merged; Ann's edited copy is not
+    assert report["merged"] == 1
+    assert sorted(movie["rating"] for movie in user_movies(app, ids["ann"]).values()) == [7.2, 9.0]
+    assert list(user_movies(app, ids["bob"])) == [ids["shared"]]
+    assert list(user_movies(app, carl)) == [ids["shared"]]
+
+
+def test_batch_updates_copy_shared_movies(app, client, ids):
+    response = client.post(f"/api/users/{ids['ann']}/movies/batch", json={"update": [
+        {"movie_id": ids["shared"], "rating": 9}, {"movie_id": ids["private"], "rating": 6}]})
+    shared, private = response.get_json()["results"]["update"]
+    assert private == {"status": "updated", "movie_id": ids["private"]}
+    assert shared["status"] == "updated" and shared["copied_to"] != ids["shared"]
+
+    assert {movie_id: movie["rating"] for movie_id, movie in user_movies(app, ids["ann"]).items()} == \
+        {shared["copied_to"]: 9.0, ids["private"]: 6.0}
+    assert user_movies(app, ids["bob"])[ids["shared"]]["rating"] == 8.3
+
+
+def test_batch_removal_follows_the_copy(app, client, ids):
+    response = client.post(f"/api/users/{ids['bob']}/movies/batch", json={
+        "update": [{"movie_id": ids["shared"], "rating": 1}], "remove": [ids["shared"]]})
+    assert response.get_json()["results"]["remove"] == [{"status": "removed", "movie_id": ids["shared"]}]
+    assert user_movies(app, ids["bob"]) == {}
+    assert user_movies(app, ids["ann"])[ids["shared"]]["rating"] == 8.3